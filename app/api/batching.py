@@ -0,0 +1,202 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable
+
+import numpy as np
+
+from app.api.inference import InferenceOverloadedError
+
+
+class BatchingMetrics:
+    """
+    Метрики микро-батчинга: размеры батчей и время ожидания запросов в очереди
+    """
+    def __init__(self, window: int = 10_000):
+        """
+        - **window(default=10_000)**: количество последних наблюдений для расчёта перцентилей
+        """
+        self.batches_total = 0
+        self.requests_total = 0
+        self.rejected_total = 0
+        self.max_batch_size = 0
+        self.batch_size_histogram = {}
+        self._batch_sizes = deque(maxlen=window)
+        self._queue_waits_ms = deque(maxlen=window)
+
+    def observe_batch(self, batch_size: int, queue_waits_ms: list):
+        """Регистрация обработанного батча"""
+        self.batches_total += 1
+        self.requests_total += batch_size
+        self.max_batch_size = max(self.max_batch_size, batch_size)
+
+        bucket = 1
+        while bucket < batch_size:
+            bucket *= 2
+        self.batch_size_histogram[bucket] = self.batch_size_histogram.get(bucket, 0) + 1
+
+        self._batch_sizes.append(batch_size)
+        self._queue_waits_ms.extend(queue_waits_ms)
+
+    @staticmethod
+    def _summary(values) -> dict:
+        if not values:
+            return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+        array = np.fromiter(values, dtype=np.float64)
+        p50, p95, p99 = np.percentile(array, [50, 95, 99])
+        return {
+            'mean': float(array.mean()),
+            'p50': float(p50),
+            'p95': float(p95),
+            'p99': float(p99),
+            'max': float(array.max())
+        }
+
+    def to_dict(self) -> dict:
+        """Снимок метрик в виде словаря"""
+        return {
+            'batches_total': self.batches_total,
+            'requests_total': self.requests_total,
+            'rejected_total': self.rejected_total,
+            'max_batch_size': self.max_batch_size,
+            'batch_size_histogram': {
+                f"<={bucket}": count for bucket, count in sorted(self.batch_size_histogram.items())
+            },
+            'batch_size': self._summary(self._batch_sizes),
+            'queue_wait_ms': self._summary(self._queue_waits_ms)
+        }
+
+
+class MicroBatcher:
+    """
+    Asyncio микро-батчер: собирает запросы, пришедшие в течение короткого окна,
+    и обрабатывает их одним вызовом модели, после чего отдаёт каждому
+    вызывающему его результат.
+
+    Если задан executor, батчи обрабатываются в его пуле потоков, и несколько
+    батчей могут выполняться одновременно. Если в очереди max_queue_size записей,
+    новые записи отклоняются с InferenceOverloadedError.
+    """
+    def __init__(self, predict_batch: Callable[[list], list],
+                 max_batch_size: int = 64, max_wait_ms: float = 2.0, executor=None, max_queue_size: int = 1024):
+        """
+        - **predict_batch**: функция, принимающая список записей и возвращающая список результатов в том же порядке;
+        - **max_batch_size(default=64)**: максимальное количество записей в одном батче;
+        - **max_wait_ms(default=2.0)**: окно ожидания новых запросов после первого запроса в батче, мс;
+        - **executor(default=None)**: InferenceExecutor, в котором выполняется predict_batch;
+        - **max_queue_size(default=1024)**: максимальное количество записей, ожидающих формирования батча
+        """
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self.max_queue_size = max_queue_size
+        self.metrics = BatchingMetrics()
+        self._queue = None
+        self._worker = None
+        self._in_flight = set()
+
+    async def start(self):
+        """Запуск фоновой задачи, формирующей батчи"""
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка фоновой задачи. Ожидающие запросы завершаются с ошибкой"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        for task in list(self._in_flight):
+            task.cancel()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+        while self._queue is not None and not self._queue.empty():
+            self._fail([self._queue.get_nowait()], RuntimeError("Микро-батчер остановлен"))
+
+    @staticmethod
+    def _fail(batch: list, error: Exception):
+        """Завершение всех ожидающих запросов батча с ошибкой"""
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def submit(self, record: Any) -> Any:
+        """
+        Постановка записи в очередь (InferenceOverloadedError, если очередь заполнена)
+
+        **return**: результат предсказания для записи
+        """
+        if self._worker is None:
+            raise RuntimeError("Микро-батчер не запущен")
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((record, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.metrics.rejected_total += 1
+            raise InferenceOverloadedError(
+                f"Очередь микро-батчинга заполнена ({self._queue.qsize()}/{self.max_queue_size})"
+            )
+        return await future
+
+    async def _collect_batch(self) -> list:
+        """Сбор батча: ждём первый запрос, затем добираем до окна или лимита размера"""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _process_batch(self, batch: list):
+        """Обработка батча одним вызовом модели и раздача результатов"""
+        started = time.perf_counter()
+        records = [record for record, _, _ in batch]
+        self.metrics.observe_batch(
+            len(batch), [(started - enqueued) * 1000 for _, _, enqueued in batch]
+        )
+
+        try:
+            if self.executor is not None:
+                results = await self.executor.run(self.predict_batch, records)
+            else:
+                results = self.predict_batch(records)
+        except asyncio.CancelledError:
+            self._fail(batch, RuntimeError("Микро-батчер остановлен"))
+            raise
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            if self.executor is None:
+                await self._process_batch(batch)
+                continue
+
+            task = asyncio.create_task(self._process_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
@@ -0,0 +1,103 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+
+class InferenceOverloadedError(Exception):
+    """Очередь инференса заполнена, запрос отклонён"""
+
+
+class InferenceExecutor:
+    """
+    Ограниченный пул потоков для блокирующего инференса модели.
+
+    Вызовы модели выполняются вне event loop, поэтому медленное предсказание не
+    блокирует health-check и другие запросы. CatBoost отпускает GIL во время
+    предсказания, поэтому пропускная способность растёт с количеством ядер.
+    Если количество задач в работе и в очереди достигает лимита, новые задачи
+    отклоняются с InferenceOverloadedError. Задача занимает место в пуле, пока
+    её поток не завершился, даже если ожидавший её запрос уже отменён.
+    """
+    def __init__(self, max_workers: int = None, max_queue_depth: int = 32):
+        """
+        - **max_workers(default=None)**: количество потоков инференса (по умолчанию - количество ядер);
+        - **max_queue_depth(default=32)**: максимальное количество задач, ожидающих свободного потока
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue_depth = max_queue_depth
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._pending = 0
+        self.completed_total = 0
+        self.rejected_total = 0
+
+    @property
+    def capacity(self) -> int:
+        """Максимальное количество задач в работе и в очереди"""
+        return self.max_workers + self.max_queue_depth
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Выполнение функции в пуле потоков
+
+        **return**: результат функции
+        """
+        if self._pending >= self.capacity:
+            self.rejected_total += 1
+            raise InferenceOverloadedError(
+                f"Очередь инференса заполнена ({self._pending}/{self.capacity})"
+            )
+
+        loop = asyncio.get_running_loop()
+        future = self._pool.submit(partial(func, *args, **kwargs))
+        self._pending += 1
+        future.add_done_callback(partial(self._on_done, loop))
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, loop, future):
+        """Освобождение места в пуле после завершения потока (вызывается из потока пула)"""
+        try:
+            loop.call_soon_threadsafe(self._finish, future)
+        except RuntimeError:
+            # event loop уже закрыт (остановка приложения)
+            pass
+
+    def _finish(self, future):
+        self._pending -= 1
+        if not future.cancelled():
+            self.completed_total += 1
+
+    async def map(self, func: Callable[[Any], Any], items: list) -> list:
+        """
+        Выполнение функции для каждого элемента волнами не больше max_workers задач, чтобы
+        большой запрос не занимал всю очередь пула и не отклонялся на свободном сервере.
+        При ошибке задачи волны оставшиеся задачи волны отменяются, следующие волны не запускаются
+
+        **return**: результаты в порядке items
+        """
+        results = []
+        for start in range(0, len(items), self.max_workers):
+            tasks = [asyncio.ensure_future(self.run(func, item)) for item in items[start:start + self.max_workers]]
+            try:
+                results.extend(await asyncio.gather(*tasks))
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+        return results
+
+    def get_metrics(self) -> dict:
+        """Снимок состояния пула"""
+        return {
+            'max_workers': self.max_workers,
+            'max_queue_depth': self.max_queue_depth,
+            'in_flight': min(self._pending, self.max_workers),
+            'queued': max(self._pending - self.max_workers, 0),
+            'completed_total': self.completed_total,
+            'rejected_total': self.rejected_total
+        }
+
+    def shutdown(self):
+        """Остановка пула потоков"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
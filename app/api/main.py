@@ -1,37 +1,129 @@
-from pathlib import Path
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from typing import Any
+from fastapi import Body, FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ValidationError
 from contextlib import asynccontextmanager
+import asyncio
+import pandas as pd
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src'))
 
-from app.api.schemas import CustomerData, PredictionResponse
+from app.api.batching import MicroBatcher
+from app.api.inference import InferenceExecutor, InferenceOverloadedError
+from app.api.model_cache import ModelCache, ModelWatcher
+from app.api.warmup import Warmup, synthetic_customers
+from app.api.schemas import CustomerData, PredictionResponse, BatchPredictionItem, BatchPredictionResponse
 from src.predict_churn import CustomerChurnPredictor
+from src.model_registry import ModelRegistry
+from src.native_inference import process_memory
+from src.feature_transformer import apply_dtype_plan
 
 
-predictor = None
+model_cache = None
+model_watcher = None
+model_loading = None
+# Прогревы загружаемых версий модели; состояние прогрева активной модели - её атрибут warmup
+warmups = set()
+batcher = None
+executor = None
+
+# Путь к модели; если не задан, обслуживается production-модель из реестра models/registry.json
+MODEL_PATH = os.getenv("CHURN_API_MODEL_PATH")
+# Имя модели в реестре, production-версия которой обслуживается (по умолчанию - последняя продвинутая)
+MODEL_NAME = os.getenv("CHURN_API_MODEL_NAME")
+# Максимальное количество загруженных версий модели в кэше
+MODEL_CACHE_SIZE = int(os.getenv("CHURN_API_MODEL_CACHE_SIZE", "2"))
+# Период проверки реестра (или файла CHURN_API_MODEL_PATH) на новую модель, секунды (0 - без обновления)
+MODEL_RELOAD_INTERVAL_S = float(os.getenv("CHURN_API_MODEL_RELOAD_INTERVAL_S", "5"))
+
+# Максимальное количество раундов прогрева модели синтетическими батчами (0 - без прогрева)
+WARMUP_MAX_ROUNDS = int(os.getenv("CHURN_API_WARMUP_MAX_ROUNDS", "20"))
+# Допустимое относительное отклонение времени раунда прогрева, при котором задержка считается стабильной
+WARMUP_TOLERANCE = float(os.getenv("CHURN_API_WARMUP_TOLERANCE", "0.2"))
+
+# Количество потоков инференса (по умолчанию - количество ядер)
+INFERENCE_WORKERS = int(os.getenv("CHURN_API_INFERENCE_WORKERS", "0")) or None
+# Максимальное количество задач инференса в очереди, после которого API отвечает 503
+INFERENCE_QUEUE_DEPTH = int(os.getenv("CHURN_API_INFERENCE_QUEUE_DEPTH", "32"))
+
+# Окно сбора запросов /predict в один батч, мс
+MICRO_BATCH_WINDOW_MS = float(os.getenv("CHURN_API_MICRO_BATCH_WINDOW_MS", "2"))
+# Максимальное количество запросов /predict в одном батче
+MICRO_BATCH_MAX_SIZE = int(os.getenv("CHURN_API_MICRO_BATCH_MAX_SIZE", "64"))
+# Максимальное количество запросов /predict в очереди микро-батчинга, после которого API отвечает 503
+MICRO_BATCH_QUEUE_SIZE = int(os.getenv("CHURN_API_MICRO_BATCH_QUEUE_SIZE", "1024"))
+# Максимальное количество клиентов в одном запросе /predict/batch
+MAX_BATCH_SIZE = int(os.getenv("CHURN_API_MAX_BATCH_SIZE", "10000"))
+# Количество клиентов, обрабатываемых моделью за один вызов
+BATCH_CHUNK_SIZE = int(os.getenv("CHURN_API_BATCH_CHUNK_SIZE", "1000"))
+
+# Значения инженерных признаков для моделей, сохранённых без ChurnFeatureTransformer
+ADDITIONAL_FEATURES = {
+    'Is_Senior_Active': 0,
+    'Active_With_Multiple_Products': 0,
+    'Value_Client': 0,
+    'New_HighRisk': 0,
+    'German_Female_Risk': 0,
+    'AgeGroup_18-30': 0,
+    'AgeGroup_31-40': 0,
+    'AgeGroup_41-50': 0,
+    'AgeGroup_51-60': 0,
+    'AgeGroup_60+': 0
+}
+
+model_registry = ModelRegistry(os.path.join(os.path.dirname(__file__), '../../models'))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Lifespan context manager для управления жиненным циклом приложения
-    - startup: загрузка модели при запуске
+    - startup: запуск фоновой загрузки и прогрева модели, проверки реестра на новую модель,
+    пула инференса и микро-батчера. API сразу отвечает на /health/live, а /health/ready
+    сообщает о готовности после прогрева модели
     - shutdown: очистка ресурсов при остановке
     """
-    global predictor
-    try:
-        project_root = Path(__file__).parent.parent.parent
-        model_path = project_root / "models" / "catboost_tuned_20251010_190010.pkl"
-        predictor = CustomerChurnPredictor(model_path=str(model_path))
-        print("ML модель успешно загружена")
-    except Exception as e:
-        print(f"Ошибка загрузки модели: {e}")
-        predictor = None
+    global model_cache, model_watcher, model_loading, batcher, executor
+    model_cache = ModelCache(loader=load_predictor, max_models=MODEL_CACHE_SIZE)
+    model_loading = asyncio.create_task(load_initial_model())
+
+    if MODEL_RELOAD_INTERVAL_S > 0:
+        model_watcher = ModelWatcher(model_cache, resolve_model_path, interval_s=MODEL_RELOAD_INTERVAL_S)
+        await model_watcher.start()
+
+    executor = InferenceExecutor(
+        max_workers=INFERENCE_WORKERS,
+        max_queue_depth=INFERENCE_QUEUE_DEPTH
+    )
+    batcher = MicroBatcher(
+        predict_batch=score_chunk,
+        max_batch_size=MICRO_BATCH_MAX_SIZE,
+        max_wait_ms=MICRO_BATCH_WINDOW_MS,
+        executor=executor,
+        max_queue_size=MICRO_BATCH_QUEUE_SIZE
+    )
+    await batcher.start()
 
     yield
 
+    for warmup in list(warmups):
+        warmup.stop()
+    await model_loading
+
+    if model_watcher is not None:
+        await model_watcher.stop()
+        model_watcher = None
+
+    if batcher is not None:
+        await batcher.stop()
+        batcher = None
+
+    if executor is not None:
+        await asyncio.to_thread(executor.shutdown)
+        executor = None
+
     print("Приложение останавливается")
 
 app = FastAPI(
@@ -45,13 +137,47 @@ class HealthResponse(BaseModel):
     status: str
     message: str
 
+def is_ready() -> bool:
+    """Модель загружена и прогрета (в кэш попадают только прогретые модели)"""
+    return model_cache is not None and model_cache.current is not None
+
 @app.get('/', response_model=HealthResponse)
 async def root():
     """
     Корневой эндпоинт для проверки работы API
     """
+    if not is_ready():
+        return {"status": "unavailable", "message": "Bank Churn Prediction API is running, ML модель не готова"}
     return {"status": "healthy", "message": "Bank Churn Prediction API is running!"}
 
+@app.get('/health/live')
+async def health_live():
+    """
+    Liveness: процесс API работает и обслуживает event loop
+    """
+    return {"status": "alive"}
+
+@app.get('/health/ready')
+async def health_ready():
+    """
+    Readiness: модель загружена и прогрета, задержка предсказаний стабилизировалась.
+    До этого возвращает 503
+    """
+    current = model_cache.current if model_cache is not None else None
+    if current is not None:
+        warmup = current.warmup
+    else:
+        # До активации первой модели - прогресс её прогрева
+        warmup = next(iter(warmups), None)
+    body = {
+        "status": "ready" if is_ready() else "not_ready",
+        "model": model_cache.current_path if model_cache is not None else None,
+        "warmup": warmup.to_dict() if warmup is not None else None
+    }
+    if not is_ready():
+        return JSONResponse(status_code=503, content=body)
+    return body
+
 @app.post("/predict", response_model=PredictionResponse)
 async def predict_churn(customer: CustomerData):
     """
@@ -59,45 +185,228 @@ async def predict_churn(customer: CustomerData):
 
     - **customer**: Данные клиента для анализа
     """
-    global predictor
+    global batcher
 
-    if predictor is None:
-        raise HTTPException(status_code=500, detail="ML модель не загружена!")
+    if model_cache.current is None or batcher is None:
+        raise HTTPException(status_code=503, detail="ML модель не загружена или ещё прогревается", headers={"Retry-After": "1"})
     
     try:
-        customer_dict = customer.model_dump()
-
-        customer_dict.update({
-            'Gender': 1 if customer_dict['Gender'] == 'Male' else 0,
-            'Geo_Germany': 1 if customer_dict['Geography'] == "Germany" else 0,
-            'Geo_France': 1 if customer_dict['Geography'] == 'France' else 0,
-            'Geo_Spain': 1 if customer_dict['Geography'] == 'Spain' else 0,
-            'HasCrCard': 1.0 if customer_dict['HasCrCard'] else 0.0,
-            'IsActiveMember': 1.0 if customer_dict['IsActiveMember'] else 0.0,
-        })
-
-        customer_dict.pop('Geography', None)
-
-        additional_features = {
-            'Is_Senior_Active': 0,
-            'Active_With_Multiple_Products': 0,
-            'Value_Client': 0,
-            'New_HighRisk': 0,
-            'German_Female_Risk': 0,
-            'AgeGroup_18-30': 0,
-            'AgeGroup_31-40': 0,
-            'AgeGroup_41-50': 0,
-            'AgeGroup_51-60': 0,
-            'AgeGroup_60+': 0
-        }
-        
-        customer_dict.update(additional_features)
-    
-        result = predictor.predict_churn(customer_dict)
+        result = await batcher.submit(customer.model_dump())
         
         return result
     
+    except InferenceOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка предсказания: {str(e)}")
 
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_churn_batch(customers: list[Any] = Body(...)):
+    """
+    Пакетное предсказание оттока для списка клиентов
+
+    - **customers**: список данных клиентов (не более CHURN_API_MAX_BATCH_SIZE)
+
+    Клиенты, не прошедшие валидацию, возвращаются с ошибками, остальные получают прогноз
+    """
+    global executor
+
+    if model_cache.current is None or executor is None:
+        raise HTTPException(status_code=503, detail="ML модель не загружена или ещё прогревается", headers={"Retry-After": "1"})
+
+    if len(customers) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Размер батча {len(customers)} превышает максимально допустимый {MAX_BATCH_SIZE}"
+        )
+
+    results = [None] * len(customers)
+    valid_indices = []
+    valid_customers = []
+
+    for index, raw_customer in enumerate(customers):
+        try:
+            valid_customers.append(CustomerData.model_validate(raw_customer).model_dump())
+            valid_indices.append(index)
+        except ValidationError as e:
+            results[index] = BatchPredictionItem(
+                index=index,
+                success=False,
+                errors=e.errors(include_url=False, include_context=False)
+            )
+
+    starts = range(0, len(valid_customers), BATCH_CHUNK_SIZE)
+
+    try:
+        chunk_predictions = await executor.map(
+            score_chunk, [valid_customers[start:start + BATCH_CHUNK_SIZE] for start in starts]
+        )
+
+        for start, predictions in zip(starts, chunk_predictions):
+            for index, prediction in zip(valid_indices[start:start + BATCH_CHUNK_SIZE], predictions):
+                results[index] = BatchPredictionItem(index=index, success=True, prediction=prediction)
+
+    except InferenceOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка предсказания: {str(e)}")
+
+    succeeded = len(valid_indices)
+
+    return {
+        "success": succeeded == len(customers),
+        "total": len(customers),
+        "succeeded": succeeded,
+        "failed": len(customers) - succeeded,
+        "results": results
+    }
+
+@app.get("/metrics/batching")
+async def batching_metrics():
+    """
+    Метрики микро-батчинга запросов /predict: размеры батчей и время ожидания в очереди
+    """
+    global batcher
+
+    if batcher is None:
+        raise HTTPException(status_code=500, detail="ML модель не загружена!")
+
+    return batcher.metrics.to_dict()
+
+@app.get("/metrics/inference")
+async def inference_metrics():
+    """
+    Состояние пула инференса: потоки, очередь и количество отклонённых задач
+    """
+    global executor
+
+    if executor is None:
+        raise HTTPException(status_code=500, detail="ML модель не загружена!")
+
+    return executor.get_metrics()
+
+@app.get("/metrics/models")
+async def model_metrics():
+    """
+    Состояние кэша моделей: обслуживаемая модель, загруженные версии, загрузки и смены модели
+    """
+    metrics = model_cache.get_metrics()
+    metrics['reload_errors_total'] = model_watcher.reload_errors_total if model_watcher is not None else 0
+    return metrics
+
+@app.get("/metrics/memory")
+async def memory_metrics():
+    """
+    Память процесса воркера: RSS, частная память, общие страницы файлов и размер весов модели,
+    отображённых в память (эти веса не дублируются в каждом воркере uvicorn)
+    """
+    predictor = model_cache.current
+    memory = {name: round(value, 1) for name, value in process_memory().items()}
+    memory['pid'] = os.getpid()
+    memory['model_mapped_mb'] = round(getattr(predictor.model, 'mapped_bytes', 0) / 2 ** 20, 1) if predictor else 0.0
+    return memory
+
+async def load_initial_model():
+    """
+    Загрузка и прогрев модели при запуске (в отдельном потоке, пока API отвечает на /health/live)
+    """
+    try:
+        model_path = MODEL_PATH or CustomerChurnPredictor.default_model_path(MODEL_NAME)
+        await asyncio.to_thread(model_cache.activate, model_path)
+        print(f"ML модель успешно загружена и прогрета: {model_path}")
+    except Exception as e:
+        print(f"Ошибка загрузки модели: {e}")
+
+def load_predictor(model_path: str) -> CustomerChurnPredictor:
+    """
+    Загрузка модели для кэша моделей. Модель прогревается синтетическими батчами
+    CustomerGenerator через полный путь предсказания до того, как начнёт обслуживать
+    запросы (при ошибке прогрева модель не используется). Состояние прогрева сохраняется
+    в predictor.warmup, поэтому прогрев кандидата не подменяет данные обслуживаемой модели
+    """
+    memory_before = process_memory()
+    predictor = CustomerChurnPredictor(model_path=model_path)
+    memory_after = process_memory()
+
+    private_mb = memory_after.get('rss_anon', 0.0) - memory_before.get('rss_anon', 0.0)
+    mapped_mb = getattr(predictor.model, 'mapped_bytes', 0) / 2 ** 20
+    print(f"Модель {model_path} загружена в процесс {os.getpid()}: +{private_mb:.1f} МБ частной памяти, "
+          f"{mapped_mb:.1f} МБ весов отображено из файла (общие для всех воркеров)")
+    if predictor.transformer is None:
+        print(f"ChurnFeatureTransformer для модели {model_path} не найден: инженерные признаки будут равны 0")
+
+    customers = synthetic_customers(max(MICRO_BATCH_MAX_SIZE, BATCH_CHUNK_SIZE), predictor.transformer)
+    warmup = Warmup(
+        lambda batch: predict_records(batch, predictor),
+        customers,
+        batch_sizes=(1, MICRO_BATCH_MAX_SIZE, BATCH_CHUNK_SIZE),
+        max_rounds=WARMUP_MAX_ROUNDS,
+        tolerance=WARMUP_TOLERANCE
+    )
+    warmups.add(warmup)
+    try:
+        warmed_up = warmup.run()
+    finally:
+        warmups.discard(warmup)
+    if not warmed_up:
+        raise RuntimeError(f"Ошибка прогрева модели {model_path}: {warmup.error}")
+    state = warmup.to_dict()
+    print(f"Модель {model_path} прогрета: раундов {state['rounds']}, время раундов {state['round_latencies_ms']} мс")
+    predictor.warmup = warmup
+    return predictor
+
+def predict_records(customers: list[dict], predictor: CustomerChurnPredictor) -> list[PredictionResponse]:
+    """
+    Полный путь предсказания для прогрева: валидация данных клиентов, подготовка признаков,
+    предсказание и сборка ответов
+    """
+    records = [CustomerData.model_validate(customer).model_dump() for customer in customers]
+    return [PredictionResponse.model_validate(result) for result in score_chunk(records, predictor)]
+
+def resolve_model_path() -> str | None:
+    """
+    Путь к модели, которую должен обслуживать API: CHURN_API_MODEL_PATH или
+    production-версия модели из реестра (None, если в реестре её нет)
+    """
+    if MODEL_PATH:
+        return MODEL_PATH
+
+    entry = model_registry.get_production(MODEL_NAME)
+    return model_registry.path_of(entry) if entry is not None else None
+
+def score_chunk(customers: list[dict], predictor: CustomerChurnPredictor = None) -> list:
+    """
+    Преобразование признаков и предсказание для чанка клиентов (выполняется в пуле инференса).
+    Весь чанк обрабатывается одной моделью (по умолчанию - обслуживаемой), даже если во время
+    обработки она сменилась
+    """
+    predictor = predictor or model_cache.current
+    return predictor.predict_churn_batch(prepare_batch_features(predictor, customers), chunk_size=BATCH_CHUNK_SIZE)
+
+def prepare_batch_features(predictor: CustomerChurnPredictor, customers: list[dict]) -> pd.DataFrame:
+    """
+    Векторное преобразование данных батча клиентов в признаки модели.
+
+    Используется ChurnFeatureTransformer, сохранённый вместе с моделью. Для моделей
+    без него признаки кодируются напрямую, а инженерные признаки заполняются нулями
+    """
+    if predictor.transformer is not None:
+        return predictor.prepare_features(customers)
+
+    df = pd.DataFrame.from_records(customers)
+
+    df['Gender'] = (df['Gender'] == 'Male').astype(int)
+    df['Geo_Germany'] = (df['Geography'] == 'Germany').astype(int)
+    df['Geo_France'] = (df['Geography'] == 'France').astype(int)
+    df['Geo_Spain'] = (df['Geography'] == 'Spain').astype(int)
+    df['HasCrCard'] = df['HasCrCard'].astype(float)
+    df['IsActiveMember'] = df['IsActiveMember'].astype(float)
+
+    df = df.drop(columns=['Geography'])
+
+    for feature, value in ADDITIONAL_FEATURES.items():
+        df[feature] = value
+
+    return apply_dtype_plan(df)
+
 # uvicorn main:app --reload
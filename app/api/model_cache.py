@@ -0,0 +1,199 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+
+class ModelCache:
+    """
+    LRU-кэш загруженных версий модели с атомарной сменой обслуживаемой модели.
+
+    Версия модели определяется путём к файлу и временем его изменения, поэтому
+    перезапись файла модели на месте тоже считается новой версией. В кэше
+    хранится не больше max_models версий; обслуживаемая модель не вытесняется.
+
+    Загрузка версии выполняется один раз: потоки, запросившие версию, которая
+    уже загружается, ждут результата той же загрузки. Смена обслуживаемой модели -
+    замена одной ссылки, поэтому запросы, уже получившие модель через current,
+    дорабатывают на ней, а новые запросы получают новую модель.
+    """
+    def __init__(self, loader: Callable[[str], Any], max_models: int = 2):
+        """
+        - **loader**: функция, загружающая модель (CustomerChurnPredictor) по пути к файлу;
+        - **max_models(default=2)**: максимальное количество загруженных версий
+        """
+        self.loader = loader
+        self.max_models = max(max_models, 1)
+        self._models = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._current = None
+        self.current_key = None
+        self.loads_total = 0
+        self.hits_total = 0
+        self.evictions_total = 0
+        self.swaps_total = 0
+
+    @staticmethod
+    def version_key(model_path: str) -> tuple:
+        """Ключ версии модели: абсолютный путь и время изменения файла"""
+        path = os.path.abspath(str(model_path))
+        return path, os.stat(path).st_mtime_ns
+
+    @property
+    def current(self) -> Any:
+        """Обслуживаемая модель (None, если модель ещё не загружена)"""
+        return self._current
+
+    @property
+    def current_path(self) -> Optional[str]:
+        """Путь к обслуживаемой модели"""
+        return self.current_key[0] if self.current_key is not None else None
+
+    def get(self, model_path: str) -> Any:
+        """
+        Загруженная версия модели (загружается при первом обращении)
+
+        **return**: модель
+        """
+        return self._get(self.version_key(model_path))
+
+    def _get(self, key: tuple) -> Any:
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits_total += 1
+                return self._models[key]
+
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._loading[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            model = self.loader(key[0])
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._loading[key]
+            self.loads_total += 1
+            self._models[key] = model
+            self._evict(keep=key)
+        future.set_result(model)
+        return model
+
+    def _evict(self, keep=None):
+        """Вытеснение давно не использованных версий (кроме обслуживаемой и только что загруженной keep)"""
+        for key in list(self._models):
+            if len(self._models) <= self.max_models:
+                break
+            if key != self.current_key and key != keep:
+                del self._models[key]
+                self.evictions_total += 1
+
+    def activate(self, model_path: str) -> bool:
+        """
+        Делает версию модели обслуживаемой (загружает её, если нужно)
+
+        **return**: True, если обслуживаемая модель сменилась
+        """
+        key = self.version_key(model_path)
+        if key == self.current_key:
+            return False
+
+        model = self._get(key)
+        with self._lock:
+            if key == self.current_key:
+                return False
+            self._current = model
+            self.current_key = key
+            if key in self._models:
+                self._models.move_to_end(key)
+            self._evict()
+            self.swaps_total += 1
+        return True
+
+    def get_metrics(self) -> dict:
+        """Снимок состояния кэша"""
+        with self._lock:
+            return {
+                'current_model': self.current_path,
+                'loaded_models': [path for path, _ in self._models],
+                'max_models': self.max_models,
+                'loads_total': self.loads_total,
+                'hits_total': self.hits_total,
+                'evictions_total': self.evictions_total,
+                'swaps_total': self.swaps_total
+            }
+
+
+class ModelWatcher:
+    """
+    Фоновая задача, которая периодически определяет, какую модель нужно обслуживать
+    (реестр моделей или файл модели), и при изменении переключает на неё ModelCache.
+
+    Новая версия загружается в отдельном потоке, пока запросы обслуживает текущая;
+    при ошибке загрузки продолжает работать текущая модель.
+    """
+    def __init__(self, cache: ModelCache, resolve_model_path: Callable[[], Optional[str]],
+                 interval_s: float = 5.0):
+        """
+        - **cache**: кэш моделей API;
+        - **resolve_model_path**: функция, возвращающая путь к модели, которую нужно обслуживать
+        (None - оставить текущую);
+        - **interval_s(default=5.0)**: период проверки, секунды
+        """
+        self.cache = cache
+        self.resolve_model_path = resolve_model_path
+        self.interval_s = interval_s
+        self.reload_errors_total = 0
+        self._task = None
+
+    async def check(self) -> bool:
+        """
+        Однократная проверка и, при необходимости, смена обслуживаемой модели
+
+        **return**: True, если модель сменилась
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            model_path = await loop.run_in_executor(None, self.resolve_model_path)
+            if model_path is None:
+                return False
+            swapped = await loop.run_in_executor(None, self.cache.activate, model_path)
+        except Exception as e:
+            self.reload_errors_total += 1
+            print(f"Ошибка обновления модели: {e}")
+            return False
+
+        if swapped:
+            print(f"Обслуживаемая модель обновлена: {self.cache.current_path}")
+        return swapped
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            await self.check()
+
+    async def start(self):
+        """Запуск фоновой проверки"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка фоновой проверки"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
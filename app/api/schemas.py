@@ -1,3 +1,4 @@
+from typing import Any
 from pydantic import BaseModel, Field
 
 class CustomerData(BaseModel):
@@ -24,3 +25,18 @@ class PredictionResponse(BaseModel):
     risk_factors: list[str] = Field(..., description="Факторы риска")
     recommendations: list[str] = Field(..., description="Список рекомендаций")
     key_metrics: dict | None = Field(None, description="Ключевые метрики клиента")
+
+class BatchPredictionItem(BaseModel):
+    """Результат по одному клиенту из батча"""
+    index: int = Field(..., description="Позиция клиента во входном списке")
+    success: bool
+    prediction: PredictionResponse | None = Field(None, description="Прогноз для клиента")
+    errors: list[dict[str, Any]] | None = Field(None, description="Ошибки валидации данных клиента")
+
+class BatchPredictionResponse(BaseModel):
+    """Модель для ответа с прогнозами по батчу клиентов"""
+    success: bool
+    total: int = Field(..., description="Количество клиентов в запросе")
+    succeeded: int = Field(..., description="Количество успешно обработанных клиентов")
+    failed: int = Field(..., description="Количество клиентов с ошибками валидации")
+    results: list[BatchPredictionItem] = Field(..., description="Результаты в порядке входного списка")
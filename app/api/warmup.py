@@ -0,0 +1,129 @@
+import statistics
+import time
+from typing import Callable
+
+import numpy as np
+
+from src.customer_generator import CustomerGenerator
+
+GEOGRAPHY_FLAGS = {'Geo_France': 'France', 'Geo_Germany': 'Germany', 'Geo_Spain': 'Spain'}
+
+
+def synthetic_customers(n_customers: int, transformer=None, seed: int = 42) -> list[dict]:
+    """
+    Синтетические клиенты CustomerGenerator в формате запроса API (CustomerData)
+
+    ### Arguments:
+        n_customers: количество клиентов
+        transformer(default=None): ChurnFeatureTransformer модели (медиана баланса для генератора)
+        seed(default=42): сид генератора
+
+    **return**: список словарей с сырыми данными клиентов
+    """
+    # Собственный генератор: глобальные random и np.random процесса не пересеиваются
+    rng = np.random.default_rng(seed)
+
+    customers = []
+    for customer in CustomerGenerator(transformer, rng=rng).generate_batch(n_customers):
+        customers.append({
+            'CreditScore': int(customer['CreditScore']),
+            'Geography': next(country for flag, country in GEOGRAPHY_FLAGS.items() if customer[flag]),
+            'Gender': 'Male' if customer['Gender'] else 'Female',
+            'Age': min(int(customer['Age']), 90),
+            'Tenure': int(customer['Tenure']),
+            'Balance': float(customer['Balance']),
+            'NumOfProducts': int(customer['NumOfProducts']),
+            'HasCrCard': bool(customer['HasCrCard']),
+            'IsActiveMember': bool(customer['IsActiveMember']),
+            'EstimatedSalary': float(customer['EstimatedSalary'])
+        })
+    return customers
+
+
+class Warmup:
+    """
+    Прогрев пути предсказания синтетическими батчами.
+
+    Каждый раунд прогоняет батчи всех размеров batch_sizes через predict (валидация,
+    подготовка признаков, модель, сборка ответа), чтобы до первых реальных запросов
+    были выполнены ленивые импорты, построены валидаторы pydantic и прогреты ветки
+    кода модели. Прогрев завершается, когда время раунда стабилизировалось:
+    отклонение от медианы предыдущих раундов не больше tolerance (но не раньше
+    min_rounds), либо по достижении max_rounds.
+
+    Статусы: 'pending' -> 'warming' -> 'ready' или 'failed'
+    """
+    def __init__(self, predict: Callable[[list], list], customers: list[dict],
+                 batch_sizes=(1, 64, 1000), min_rounds: int = 3, max_rounds: int = 20, tolerance: float = 0.2):
+        """
+        - **predict**: функция полного пути предсказания для списка клиентов;
+        - **customers**: синтетические клиенты (см. synthetic_customers), не меньше max(batch_sizes);
+        - **batch_sizes(default=(1, 64, 1000))**: размеры батчей каждого раунда;
+        - **min_rounds(default=3)**: минимальное количество раундов;
+        - **max_rounds(default=20)**: максимальное количество раундов (0 - без прогрева);
+        - **tolerance(default=0.2)**: допустимое относительное отклонение времени раунда от медианы предыдущих
+        """
+        self.predict = predict
+        self.customers = customers
+        self.batch_sizes = [size for size in batch_sizes if size <= len(customers)]
+        self.min_rounds = min_rounds
+        self.max_rounds = max_rounds
+        self.tolerance = tolerance
+        self.status = 'pending'
+        self.settled = False
+        self.round_latencies_ms = []
+        self.error = None
+        self._stopped = False
+
+    @property
+    def ready(self) -> bool:
+        """Прогрев завершён успешно"""
+        return self.status == 'ready'
+
+    def _is_settled(self) -> bool:
+        latencies = self.round_latencies_ms
+        if len(latencies) < max(self.min_rounds, 2):
+            return False
+        previous = statistics.median(latencies[-self.min_rounds - 1:-1])
+        return abs(latencies[-1] - previous) <= self.tolerance * previous
+
+    def run(self) -> bool:
+        """
+        Прогрев (блокирующий, выполняется вне event loop)
+
+        **return**: True, если прогрев завершён успешно
+        """
+        self.status = 'warming'
+        try:
+            for _ in range(self.max_rounds):
+                if self._stopped:
+                    raise RuntimeError("Прогрев остановлен")
+                started = time.perf_counter()
+                for size in self.batch_sizes:
+                    self.predict(self.customers[:size])
+                self.round_latencies_ms.append((time.perf_counter() - started) * 1000)
+
+                if self._is_settled():
+                    self.settled = True
+                    break
+        except Exception as e:
+            self.status = 'failed'
+            self.error = str(e)
+            return False
+
+        self.status = 'ready'
+        return True
+
+    def stop(self):
+        """Прерывание прогрева перед следующим раундом (при остановке приложения)"""
+        self._stopped = True
+
+    def to_dict(self) -> dict:
+        """Состояние прогрева"""
+        return {
+            'status': self.status,
+            'settled': self.settled,
+            'rounds': len(self.round_latencies_ms),
+            'round_latencies_ms': [round(latency, 2) for latency in self.round_latencies_ms],
+            'error': self.error
+        }
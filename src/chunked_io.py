@@ -0,0 +1,77 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+def read_chunks(input_path: str, chunk_size: int, columns=None):
+    """
+    Чтение CSV или Parquet чанками по chunk_size строк
+
+    ### Arguments:
+        input_path: путь к CSV или Parquet
+        chunk_size: количество строк в чанке
+        columns(default=None): читаемые столбцы (по умолчанию - все)
+
+    **return**: генератор pd.DataFrame
+    """
+    input_path = str(input_path)
+    if input_path.endswith('.parquet'):
+        parquet_file = pq.ParquetFile(input_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(input_path, chunksize=chunk_size, usecols=columns)
+
+
+class ParquetChunkWriter:
+    """
+    Потоковая запись чанков pd.DataFrame в один Parquet-файл.
+
+    Схема берётся из объявленной schema и, для необъявленных столбцов, из первого чанка;
+    следующие чанки приводятся к ней. Приведение без потерь проходит (целые значения
+    в столбце float), а потеря данных - ошибка pyarrow.ArrowInvalid: дробные значения
+    в столбце, который в первом чанке был целым, или значения в столбце, который в первом
+    чанке был пустым (тип null). Типы столбцов, которые могут различаться между чанками,
+    нужно объявить в schema.
+    """
+    def __init__(self, output_path: str, schema: pa.Schema = None):
+        """
+        - **output_path**: путь к выходному Parquet-файлу;
+        - **schema(default=None)**: объявленные типы столбцов (вся схема или её часть). Типы
+        остальных столбцов определяются по первому чанку. Если не записано ни одного чанка,
+        создаётся пустой файл с объявленной схемой
+        """
+        self.output_path = str(output_path)
+        self.schema = schema
+        self.rows_written = 0
+        self._writer = None
+
+    def _resolve_schema(self, df: pd.DataFrame) -> pa.Schema:
+        inferred = pa.Schema.from_pandas(df, preserve_index=False)
+        if self.schema is None:
+            return inferred
+        fields = [self.schema.field(field.name) if field.name in self.schema.names else field
+                  for field in inferred]
+        return pa.schema(fields, metadata=inferred.metadata)
+
+    def write(self, df: pd.DataFrame):
+        """Запись чанка"""
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.output_path, self._resolve_schema(df))
+        table = pa.Table.from_pandas(df, schema=self._writer.schema, preserve_index=False)
+        self._writer.write_table(table)
+        self.rows_written += len(df)
+
+    def close(self):
+        """Завершение записи файла"""
+        if self._writer is None and self.schema is not None:
+            pq.write_table(self.schema.empty_table(), self.output_path)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
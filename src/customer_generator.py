@@ -2,11 +2,20 @@ import random
 import pandas as pd
 from typing import Dict, List
 import numpy as np
+from feature_transformer import ENGINEERED_FEATURES, AGE_GROUP_FEATURES, add_engineered_features
 
 class CustomerGenerator:
     """Генератор реалистичных тестовых клиентов"""
     
-    def __init__(self):
+    def __init__(self, transformer=None, rng=None):
+        """
+        - **transformer(default=None)**: обученный ChurnFeatureTransformer; если передан,
+        порог Value_Client берётся из выученной медианы баланса;
+        - **rng(default=None)**: генератор np.random.Generator; если не передан,
+        используются глобальные генераторы random и np.random
+        """
+        self.rng = rng
+        self.balance_median = transformer.balance_median_ if transformer is not None else 100000
         self.distributions = {
             'CreditScore': {'min': 350, 'max': 850, 'mean': 650},
             'Age': {'min': 18, 'max': 92, 'mean': 38},
@@ -22,23 +31,38 @@ class CustomerGenerator:
             'NumOfProducts': {1: 0.5, 2: 0.35, 3: 0.1, 4: 0.05}
         }
     
+    def _normal(self, mean: float, std: float) -> float:
+        """Нормально распределённое значение"""
+        generator = self.rng if self.rng is not None else np.random
+        return float(generator.normal(mean, std))
+
+    def _randint(self, low: int, high: int) -> int:
+        """Случайное целое из отрезка [low, high]"""
+        if self.rng is not None:
+            return int(self.rng.integers(low, high + 1))
+        return random.randint(low, high)
+
+    def _random(self) -> float:
+        """Случайное число из [0, 1)"""
+        return float(self.rng.random()) if self.rng is not None else random.random()
+
     def generate_random_customer(self) -> Dict:
         """Генерация случайного клиента"""
-        credit_score = int(np.random.normal(650, 100))
+        credit_score = int(self._normal(650, 100))
         credit_score = max(350, min(850, credit_score))
         
-        age = int(np.random.normal(38, 10))
+        age = int(self._normal(38, 10))
         age = max(18, min(92, age))
         
-        tenure = random.randint(0, 10)
-        balance = max(0, np.random.normal(76485, 50000))
-        estimated_salary = max(0, np.random.normal(100000, 30000))
+        tenure = self._randint(0, 10)
+        balance = max(0, self._normal(76485, 50000))
+        estimated_salary = max(0, self._normal(100000, 30000))
         
-        gender = 1 if random.random() < self.probabilities['Gender'][1] else 0
-        has_cr_card = 1.0 if random.random() < self.probabilities['HasCrCard'] else 0.0
-        is_active_member = 1.0 if random.random() < self.probabilities['IsActiveMember'] else 0.0
+        gender = 1 if self._random() < self.probabilities['Gender'][1] else 0
+        has_cr_card = 1.0 if self._random() < self.probabilities['HasCrCard'] else 0.0
+        is_active_member = 1.0 if self._random() < self.probabilities['IsActiveMember'] else 0.0
         
-        geo_choice = random.random()
+        geo_choice = self._random()
         if geo_choice < 0.5:
             geography = {'Geo_France': 1, 'Geo_Germany': 0, 'Geo_Spain': 0}
         elif geo_choice < 0.75:
@@ -46,7 +70,7 @@ class CustomerGenerator:
         else:
             geography = {'Geo_France': 0, 'Geo_Germany': 0, 'Geo_Spain': 1}
         
-        products_choice = random.random()
+        products_choice = self._random()
         if products_choice < 0.5:
             num_products = 1
         elif products_choice < 0.85:
@@ -56,8 +80,6 @@ class CustomerGenerator:
         else:
             num_products = 4
         
-        age_groups = self._get_age_groups(age)
-        
         customer = {
             'CreditScore': credit_score,
             'Gender': gender,
@@ -68,14 +90,9 @@ class CustomerGenerator:
             'HasCrCard': has_cr_card,
             'IsActiveMember': is_active_member,
             'EstimatedSalary': float(estimated_salary),
-            'Is_Senior_Active': 1 if age > 40 and is_active_member == 1 else 0,
-            'Active_With_Multiple_Products': 1 if is_active_member == 1 and num_products >= 2 else 0,
-            'Value_Client': 1 if balance > 100000 else 0,
-            'New_HighRisk': 1 if num_products == 1 and is_active_member == 0 else 0,
-            'German_Female_Risk': 1 if geography['Geo_Germany'] == 1 and gender == 0 else 0,
-            **geography,
-            **age_groups
+            **geography
         }
+        customer.update(self._update_derived_features(customer))
         
         return customer
     
@@ -87,7 +104,7 @@ class CustomerGenerator:
             'high_risk': {
                 'NumOfProducts': 1,
                 'IsActiveMember': 0.0,
-                'Age': random.randint(45, 70),
+                'Age': self._randint(45, 70),
                 'Geo_Germany': 1,
                 'Geo_France': 0,
                 'Geo_Spain': 0
@@ -95,18 +112,18 @@ class CustomerGenerator:
             'low_risk': {
                 'NumOfProducts': 3,
                 'IsActiveMember': 1.0,
-                'Age': random.randint(18, 35),
+                'Age': self._randint(18, 35),
                 'Geo_France': 1,
                 'Geo_Germany': 0,
                 'Geo_Spain': 0
             },
             'premium_high_balance': {
-                'Balance': random.randint(150000, 250000),
+                'Balance': self._randint(150000, 250000),
                 'NumOfProducts': 2,
-                'Age': random.randint(40, 65)
+                'Age': self._randint(40, 65)
             },
             'young_inactive': {
-                'Age': random.randint(18, 25),
+                'Age': self._randint(18, 25),
                 'IsActiveMember': 0.0,
                 'NumOfProducts': 1
             }
@@ -118,25 +135,10 @@ class CustomerGenerator:
         
         return base_customer
     
-    def _get_age_groups(self, age: int) -> Dict:
-        """Определение возрастных групп"""
-        return {
-            'AgeGroup_18-30': 1 if 18 <= age <= 30 else 0,
-            'AgeGroup_31-40': 1 if 31 <= age <= 40 else 0,
-            'AgeGroup_41-50': 1 if 41 <= age <= 50 else 0,
-            'AgeGroup_51-60': 1 if 51 <= age <= 60 else 0,
-            'AgeGroup_60+': 1 if age > 60 else 0
-        }
-    
     def _update_derived_features(self, customer: Dict) -> Dict:
-        """Обновление производных признаков"""
-        return {
-            'Is_Senior_Active': 1 if customer['Age'] > 40 and customer['IsActiveMember'] == 1 else 0,
-            'Active_With_Multiple_Products': 1 if customer['IsActiveMember'] == 1 and customer['NumOfProducts'] >= 2 else 0,
-            'Value_Client': 1 if customer['Balance'] > 100000 else 0,
-            'New_HighRisk': 1 if customer['NumOfProducts'] == 1 and customer['IsActiveMember'] == 0 else 0,
-            'German_Female_Risk': 1 if customer.get('Geo_Germany', 0) == 1 and customer['Gender'] == 0 else 0,
-        }
+        """Обновление производных признаков (теми же правилами, что и при обучении)"""
+        features = add_engineered_features(pd.DataFrame([customer]), self.balance_median)
+        return {name: int(features[name].iloc[0]) for name in ENGINEERED_FEATURES + AGE_GROUP_FEATURES}
     
     def generate_batch(self, n_customers: int = 10, profile: str = None) -> List[Dict]:
         """Генерация батча клиентов"""
@@ -1,11 +1,14 @@
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import RobustScaler
 from imblearn.under_sampling import RandomUnderSampler
+import numpy as np
 import joblib
 import os
+from dataset_store import DatasetStore
+from pipeline_profiler import PipelineProfiler
 
 class PrepareData:
-    def __init__(self, df):
+    def __init__(self, df, profiler=None):
         """
         Класс для подготовки данных к моделированию. Включает следующие методы 
 
@@ -14,9 +17,16 @@ class PrepareData:
             - **scaling()**: масштабирование данных с помощью RobustScaler
             - **balancing_classes**(random_state=42): балансировка тренировочного набора данных
             - **save_to_pickle**(output_dir='../data/processed'): сохраняет выборки, scaler и название фичей по указанному пути
-            - **preparing()**: объединяет вышеперечисленные методы, совершает полную подготовку данных
+            - **save_dataset**(output_dir='../data/processed/dataset'): то же в колоночном формате DatasetStore (.npy + manifest.json)
+            - **preparing**(output_format='pickle'): объединяет вышеперечисленные методы, совершает полную подготовку данных
+
+        **Argument**:
+
+            profiler=None: PipelineProfiler для событий шагов preparing() (время, пиковая память, количество строк);
+            по умолчанию создаётся новый, события доступны в self.profiler
         """
         self.df = df.copy()
+        self.profiler = profiler if profiler is not None else PipelineProfiler()
         self.X_train = None
         self.X_test = None
         self.y_train = None
@@ -45,7 +55,8 @@ class PrepareData:
     
     def scaling(self):
         """
-        Метод для масштабирования данных с помощью RobustScaler
+        Метод для масштабирования данных с помощью RobustScaler. Масштабированные
+        признаки сохраняются во float32, остальные сохраняют компактные типы препроцессинга
 
             **return**: X_train, X_test
         """
@@ -56,9 +67,9 @@ class PrepareData:
         numeric_features = [col for col in self.X_train.columns if self.X_train[col].nunique() > 2 
                             & self.X_train[col].nunique() !=4]
 
-        self.X_train[numeric_features] = self.scaler.fit_transform(self.X_train[numeric_features])
+        self.X_train[numeric_features] = self.scaler.fit_transform(self.X_train[numeric_features]).astype(np.float32)
 
-        self.X_test[numeric_features] = self.scaler.transform(self.X_test[numeric_features])
+        self.X_test[numeric_features] = self.scaler.transform(self.X_test[numeric_features]).astype(np.float32)
 
         return self.X_train, self.X_test
     
@@ -99,17 +110,61 @@ class PrepareData:
         joblib.dump(self.X_train.columns.tolist(), f'{output_dir}/feature_names.pkl')
         
         print(f"Данные и объекты сохранены в {output_dir}")
+
+    def save_dataset(self, output_dir='../data/processed/dataset'):
+        """
+        Метод для сохранения выборок, scaler и списка фичей в колоночном формате DatasetStore:
+        каждый столбец - отдельный .npy-файл, который при загрузке отображается в память
+        без копирования (DatasetStore.load, TrainModels.from_dataset, HyperparametrTuner.from_dataset)
+
+        **Argument**:
+
+            output_dir='../data/processed/dataset': каталог хранилища
+
+        **return**: DatasetStore
+        """
+        store = DatasetStore(output_dir)
+        store.save(
+            {
+                'X_train': self.X_train_balanced,
+                'X_test': self.X_test,
+                'y_train': self.y_train_balanced,
+                'y_test': self.y_test
+            },
+            objects={'scaler': self.scaler},
+            feature_names=self.X_train.columns.tolist()
+        )
+
+        print(f"Данные и объекты сохранены в {output_dir}")
+        return store
     
-    def preparing(self):
+    def preparing(self, output_format='pickle'):
         """
         Метод, который объединяет вышеперечисленные методы, совершает полную подготовку данных
 
+        **Argument**:
+
+            output_format='pickle': формат сохранения - 'pickle' (save_to_pickle), 'npy' (save_dataset) или None (не сохранять)
+
         **return**: X_train_balanced, X_test, y_train_balanced, y_test
         """
-
-        self.splitting()
-        self.scaling()
-        self.balancing_classes()
-        self.save_to_pickle()
+        if output_format not in ('pickle', 'npy', None):
+            raise ValueError(f"Неизвестный формат сохранения: {output_format}")
+
+        with self.profiler.step('splitting', rows_in=len(self.df)) as event:
+            self.splitting()
+            event['rows_out'] = len(self.X_train) + len(self.X_test)
+        with self.profiler.step('scaling', rows_in=len(self.X_train) + len(self.X_test)) as event:
+            self.scaling()
+            event['rows_out'] = event['rows_in']
+        with self.profiler.step('balancing_classes', rows_in=len(self.X_train)) as event:
+            self.balancing_classes()
+            event['rows_out'] = len(self.X_train_balanced)
+
+        save = {'pickle': self.save_to_pickle, 'npy': self.save_dataset}.get(output_format)
+        if save is not None:
+            with self.profiler.step(f'save_{output_format}', rows_in=len(self.X_train_balanced) + len(self.X_test)) as event:
+                save()
+                event['rows_out'] = event['rows_in']
 
         return self.X_train_balanced, self.X_test, self.y_train_balanced, self.y_test
@@ -0,0 +1,180 @@
+import json
+import os
+import shutil
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from versioned_directory import create_version, publish_version
+
+
+class DatasetStore:
+    """
+    Колоночное хранилище выборок (X_train, X_test, y_train, y_test) в каталоге.
+
+    Каждый столбец выборки хранится отдельным .npy-файлом, индекс - в index.npy,
+    а состав выборок, типы столбцов и вспомогательные объекты (scaler, названия
+    признаков) описаны в manifest.json. Загрузка отображает файлы в память
+    (np.load(mmap_mode='r')) и строит pd.DataFrame без копирования данных,
+    поэтому выборки открываются мгновенно, а читаются только нужные столбцы.
+
+    Структура каталога:
+
+        manifest.json
+        X_train/index.npy, X_train/0.npy, X_train/1.npy, ...
+        y_train/index.npy, y_train/0.npy
+        scaler.pkl
+
+    Каталог хранилища - символическая ссылка на каталог версии (см. save), поэтому
+    перезапись не прерывает читателей: они продолжают читать версию своего манифеста.
+    """
+    MANIFEST = 'manifest.json'
+    FORMAT_VERSION = 1
+
+    def __init__(self, directory):
+        """
+        - **directory**: каталог хранилища
+        """
+        self.directory = str(directory)
+        self._manifest = None
+        self._version_dir = None
+
+    @property
+    def manifest(self) -> dict:
+        """Манифест хранилища (читается заново только после перезаписи хранилища)"""
+        return self._version()[0]
+
+    def _version(self):
+        """Манифест и каталог текущей версии хранилища: файлы выборок читаются из той же версии, что и манифест"""
+        version_dir = os.path.realpath(self.directory)
+        if self._manifest is None or version_dir != self._version_dir:
+            with open(os.path.join(version_dir, self.MANIFEST), 'r', encoding='utf-8') as file:
+                self._manifest = json.load(file)
+            self._version_dir = version_dir
+        return self._manifest, self._version_dir
+
+    def exists(self) -> bool:
+        """Сохранено ли хранилище в каталоге"""
+        return os.path.exists(os.path.join(self.directory, self.MANIFEST))
+
+    @staticmethod
+    def _write_split(directory, data):
+        """Запись столбцов выборки (pd.DataFrame или pd.Series) в .npy-файлы"""
+        os.makedirs(directory, exist_ok=True)
+        frame = data.to_frame() if isinstance(data, pd.Series) else data
+
+        columns = []
+        for i, (name, values) in enumerate(frame.items()):
+            values = values.to_numpy()
+            if values.dtype == object or not (np.issubdtype(values.dtype, np.number) or values.dtype == bool):
+                raise ValueError(f"Столбец {name} нечисловой ({values.dtype}): хранилище поддерживает только числовые столбцы")
+            np.save(os.path.join(directory, f'{i}.npy'), np.ascontiguousarray(values))
+            columns.append({'name': name, 'file': f'{i}.npy', 'dtype': str(values.dtype)})
+
+        np.save(os.path.join(directory, 'index.npy'), frame.index.to_numpy())
+        return {
+            'kind': 'series' if isinstance(data, pd.Series) else 'frame',
+            'n_rows': len(frame),
+            'index_name': frame.index.name,
+            'columns': columns
+        }
+
+    def save(self, splits: dict, objects: dict = None, feature_names=None) -> str:
+        """
+        Сохранение выборок. Хранилище заменяется целиком: данные пишутся в новый каталог версии,
+        а directory - символическая ссылка, которая атомарно переключается на него
+        (см. versioned_directory.publish_version). Путь хранилища существует всё время перезаписи,
+        читатели не видят частично записанное хранилище, а сбой во время записи оставляет прежнюю версию
+
+        ### Arguments:
+            splits: словарь {название выборки: pd.DataFrame или pd.Series}
+            objects(default=None): словарь {название: объект} для сохранения через joblib (например, scaler)
+            feature_names(default=None): названия признаков модели
+
+        **return**: путь к каталогу хранилища
+        """
+        version_dir = create_version(self.directory)
+        try:
+            manifest = {
+                'format_version': self.FORMAT_VERSION,
+                'created_at': datetime.now().strftime("%Y%m%d_%H%M%S"),
+                'feature_names': list(feature_names) if feature_names is not None else None,
+                'splits': {name: self._write_split(os.path.join(version_dir, name), data)
+                           for name, data in splits.items()},
+                'objects': {}
+            }
+            for name, obj in (objects or {}).items():
+                joblib.dump(obj, os.path.join(version_dir, f'{name}.pkl'))
+                manifest['objects'][name] = f'{name}.pkl'
+
+            with open(os.path.join(version_dir, self.MANIFEST), 'w', encoding='utf-8') as file:
+                json.dump(manifest, file, indent=2, ensure_ascii=False)
+
+            publish_version(self.directory, version_dir)
+        except BaseException:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+
+        self._manifest, self._version_dir = manifest, os.path.realpath(version_dir)
+        return self.directory
+
+    def load(self, split: str, columns=None, mmap: bool = True):
+        """
+        Загрузка выборки
+
+        ### Arguments:
+            split: название выборки ('X_train', 'y_test', ...)
+            columns(default=None): загружаемые столбцы (по умолчанию - все)
+            mmap(default=True): отобразить столбцы в память только для чтения без копирования;
+            False - прочитать в память процесса (изменяемые массивы)
+
+        **return**: pd.DataFrame или pd.Series (для выборки, сохранённой из pd.Series)
+        """
+        manifest, version_dir = self._version()
+        if split not in manifest['splits']:
+            raise KeyError(f"Выборка {split} не найдена в {self.directory}")
+        meta = manifest['splits'][split]
+        split_dir = os.path.join(version_dir, split)
+        mmap_mode = 'r' if mmap else None
+
+        available = {column['name']: column for column in meta['columns']}
+        if columns is not None:
+            missing = [name for name in columns if name not in available]
+            if missing:
+                raise KeyError(f"Столбцы {missing} отсутствуют в выборке {split}")
+            selected = [available[name] for name in columns]
+        else:
+            selected = meta['columns']
+
+        index = pd.Index(np.load(os.path.join(split_dir, 'index.npy'), mmap_mode=mmap_mode),
+                         name=meta['index_name'], copy=False)
+        arrays = {column['name']: np.load(os.path.join(split_dir, column['file']), mmap_mode=mmap_mode)
+                  for column in selected}
+
+        if meta['kind'] == 'series':
+            name, values = next(iter(arrays.items()))
+            return pd.Series(values, index=index, name=name, copy=False)
+        return pd.DataFrame(arrays, index=index, copy=False)
+
+    def load_splits(self, splits=('X_train', 'X_test', 'y_train', 'y_test'), columns=None, mmap: bool = True):
+        """
+        Загрузка нескольких выборок; проекция columns применяется к выборкам-таблицам (X_*)
+
+        **return**: кортеж выборок в порядке splits
+        """
+        return tuple(
+            self.load(split, columns if self.manifest['splits'][split]['kind'] == 'frame' else None, mmap)
+            for split in splits
+        )
+
+    def load_object(self, name: str):
+        """Загрузка вспомогательного объекта (например, scaler)"""
+        manifest, version_dir = self._version()
+        return joblib.load(os.path.join(version_dir, manifest['objects'][name]))
+
+    @property
+    def feature_names(self):
+        """Названия признаков модели"""
+        return self.manifest['feature_names']
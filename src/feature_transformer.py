@@ -0,0 +1,310 @@
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from quantile_sketch import KLLSketch
+
+
+TECHNICAL_COLUMNS = ['RowNumber', 'CustomerId', 'Surname']
+
+MEDIAN_FILL_COLUMNS = ['Age', 'HasCrCard', 'IsActiveMember']
+
+ENGINEERED_FEATURES = ['Is_Senior_Active', 'Active_With_Multiple_Products', 'Value_Client',
+                       'New_HighRisk', 'German_Female_Risk']
+
+AGE_BINS = [0, 30, 40, 50, 60, 100]
+AGE_LABELS = ['18-30', '31-40', '41-50', '51-60', '60+']
+AGE_GROUP_FEATURES = [f'AgeGroup_{label}' for label in AGE_LABELS]
+
+GENDER_MAPPING = {"Female": 0, "Male": 1}
+
+# Числовые столбцы, по которым ChurnFeatureTransformer считает медианы и квантили
+STATISTICS_COLUMNS = MEDIAN_FILL_COLUMNS + ['Balance']
+
+# Схема типов признаков: флаги и one-hot - uint8, целочисленные признаки - int16, денежные - float32
+FLAG_COLUMNS = ['Gender', 'HasCrCard', 'IsActiveMember', 'Exited'] + ENGINEERED_FEATURES + AGE_GROUP_FEATURES
+INTEGER_COLUMNS = ['CreditScore', 'Age', 'Tenure', 'NumOfProducts']
+MONEY_COLUMNS = ['Balance', 'EstimatedSalary']
+
+
+def dtype_plan(columns, transformer=None) -> dict:
+    """
+    Типы столбцов признаков по схеме (столбцы вне схемы не включаются).
+
+    Тип зависит только от имени столбца и выученных значений transformer, но не от данных,
+    поэтому все чанки одного файла получают одинаковую схему. Целочисленный столбец или флаг,
+    в который transformer записывает дробное значение (медиана при заполнении пропусков,
+    квантиль при обрезке Age), - float32
+
+    ### Arguments:
+        columns: столбцы признаков
+        transformer(default=None): обученный ChurnFeatureTransformer, которым получены признаки
+
+    **return**: словарь {столбец: dtype}
+    """
+    fractional = _fractional_columns(transformer) if transformer is not None else set()
+    plan = {}
+    for col in columns:
+        if col in fractional:
+            plan[col] = np.float32
+        elif col in FLAG_COLUMNS or col.startswith('Geo_'):
+            plan[col] = np.uint8
+        elif col in INTEGER_COLUMNS:
+            plan[col] = np.int16
+        elif col in MONEY_COLUMNS:
+            plan[col] = np.float32
+    return plan
+
+
+def _fractional_columns(transformer) -> set:
+    """Столбцы, в которые transformer записывает дробные значения (заполнение пропусков и обрезка Age)"""
+    values = {col: [value] for col, value in transformer.fill_values_.items()}
+    values.setdefault('Age', []).extend(transformer.age_bounds_)
+    return {col for col, col_values in values.items()
+            if any(not float(value).is_integer() for value in col_values)}
+
+
+def apply_dtype_plan(df: pd.DataFrame, transformer=None) -> pd.DataFrame:
+    """
+    Приведение столбцов df к компактным типам dtype_plan(df.columns, transformer) на месте.
+
+    Приведение без потерь для моделей: CatBoost, LightGBM и XGBoost сравнивают
+    признаки с порогами во float32, поэтому float32 не меняет предсказаний.
+    Значения, которые не представимы в целочисленном типе схемы (пропуски, дробные
+    значения или значения вне диапазона типа), - ошибка ValueError
+
+    **return**: df
+    """
+    for col, dtype in dtype_plan(df.columns, transformer).items():
+        if df[col].dtype == dtype:
+            continue
+
+        values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        converted = values.astype(dtype)
+        if np.issubdtype(dtype, np.integer) and not np.array_equal(converted, values):
+            raise ValueError(f"Значения столбца {col} не представимы в типе {np.dtype(dtype).name}")
+        df[col] = converted
+    return df
+
+
+def add_engineered_features(df: pd.DataFrame, balance_median: float) -> pd.DataFrame:
+    """
+    Векторное создание новых признаков, включая one-hot возрастные группы.
+    Работает как с исходными (Geography, Gender: "Female"/"Male"), так и с
+    закодированными (Geo_Germany, Gender: 0/1) данными. Признаки добавляются в df на месте.
+
+    ### Arguments:
+        df: данные клиентов
+        balance_median: медиана баланса, порог для Value_Client
+
+    **return**: df с новыми признаками
+    """
+    is_active = df['IsActiveMember'] == 1
+
+    df['Is_Senior_Active'] = ((df['Age'] > 40) & is_active).astype(np.uint8)
+    df['Active_With_Multiple_Products'] = (is_active & (df['NumOfProducts'] > 1)).astype(np.uint8)
+    df['Value_Client'] = ((df['Balance'] > balance_median) & (df['NumOfProducts'] >= 2)).astype(np.uint8)
+    df['New_HighRisk'] = ((df['Tenure'] < 2) & (df['NumOfProducts'] == 1)).astype(np.uint8)
+    if 'Geography' in df.columns:
+        is_german_female = (df['Geography'] == 'Germany') & (df['Gender'] == 'Female')
+    else:
+        is_german_female = (df['Geo_Germany'] == 1) & (df['Gender'] == 0)
+    df['German_Female_Risk'] = is_german_female.astype(np.uint8)
+
+    age_group = np.digitize(df['Age'].to_numpy(dtype=np.float64), AGE_BINS[1:-1], right=True)
+    age_in_range = ((df['Age'] > AGE_BINS[0]) & (df['Age'] <= AGE_BINS[-1])).to_numpy()
+    for i, feature in enumerate(AGE_GROUP_FEATURES):
+        df[feature] = ((age_group == i) & age_in_range).astype(np.uint8)
+
+    return df
+
+
+class ChurnStatistics:
+    """
+    Статистики сырых данных, по которым обучается ChurnFeatureTransformer,
+    накапливаемые по чанкам данных.
+
+    Частоты Geography считаются точно, медианы и квантили числовых столбцов -
+    по KLL-скетчам (см. quantile_sketch.KLLSketch) с ограниченной памятью и
+    ошибкой ранга. Статистики частей данных (процессов, дневных инкрементов)
+    объединяются через merge. При sketch_k=None скетчи хранят все значения,
+    и статистики совпадают с рассчитанными по всему датасету.
+    """
+    def __init__(self, sketch_k=2000, random_state=42):
+        """
+        - **sketch_k(default=2000)**: параметр точности KLL-скетчей (None - точные статистики);
+        - **random_state(default=42)**: сид скетчей
+        """
+        self.sketch_k = sketch_k
+        self.n_rows = 0
+        self.columns = None
+        self.geography_counts = {}
+        self.sketches = {col: KLLSketch(sketch_k, random_state=random_state + i)
+                         for i, col in enumerate(STATISTICS_COLUMNS)}
+
+    def update(self, chunk: pd.DataFrame) -> 'ChurnStatistics':
+        """
+        Добавление чанка сырых данных
+
+        **return**: self
+        """
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        self.n_rows += len(chunk)
+
+        for level, count in chunk['Geography'].value_counts().items():
+            self.geography_counts[level] = self.geography_counts.get(level, 0) + int(count)
+
+        for col, sketch in self.sketches.items():
+            sketch.update(chunk[col].to_numpy(dtype=np.float64))
+        return self
+
+    def merge(self, other: 'ChurnStatistics') -> 'ChurnStatistics':
+        """
+        Объединение со статистиками другой части данных (other не изменяется)
+
+        **return**: self
+        """
+        if self.columns is None:
+            self.columns = other.columns
+        self.n_rows += other.n_rows
+
+        for level, count in other.geography_counts.items():
+            self.geography_counts[level] = self.geography_counts.get(level, 0) + count
+
+        for col, sketch in self.sketches.items():
+            sketch.merge(other.sketches[col])
+        return self
+
+    def copy(self) -> 'ChurnStatistics':
+        """Независимая копия статистик"""
+        statistics = ChurnStatistics.__new__(ChurnStatistics)
+        statistics.sketch_k = self.sketch_k
+        statistics.n_rows = self.n_rows
+        statistics.columns = list(self.columns) if self.columns is not None else None
+        statistics.geography_counts = dict(self.geography_counts)
+        statistics.sketches = {col: sketch.copy() for col, sketch in self.sketches.items()}
+        return statistics
+
+    @property
+    def geography_mode(self):
+        """Самая частая категория Geography (при равенстве - первая по алфавиту, как pd.Series.mode)"""
+        return min(self.geography_counts.items(), key=lambda item: (-item[1], item[0]))[0]
+
+
+class ChurnFeatureTransformer(BaseEstimator, TransformerMixin):
+    """
+    Обученный преобразователь сырых данных клиентов в признаки модели.
+
+    Повторяет шаги ProprocessingData (заполнение пропусков, удаление технических
+    столбцов, обработка выбросов, новые признаки, кодирование категорий), но
+    сохраняет выученные статистики, поэтому одинаково применяется при обучении
+    и в API. Сохраняется вместе с моделью (ModelManager.save_model).
+
+    Выученные атрибуты:
+        - **geography_mode_**: мода Geography для заполнения пропусков;
+        - **fill_values_**: медианы для заполнения пропусков в Age, HasCrCard, IsActiveMember;
+        - **age_bounds_**: границы обрезки Age (квантили 1% и 99%);
+        - **balance_upper_**: верхняя граница обрезки Balance (квантиль 99%);
+        - **balance_median_**: медиана Balance после обрезки (порог Value_Client);
+        - **geography_levels_**: категории Geography;
+        - **feature_names_out_**: признаки модели на выходе в порядке обучения;
+        - **columns_out_**: столбцы на выходе с учётом целевой переменной Exited, если она была при обучении
+    """
+    def __init__(self, age_quantiles=(0.01, 0.99), balance_quantile=0.99):
+        """
+        - **age_quantiles(default=(0.01, 0.99))**: квантили для обрезки Age;
+        - **balance_quantile(default=0.99)**: квантиль для обрезки Balance сверху
+        """
+        self.age_quantiles = age_quantiles
+        self.balance_quantile = balance_quantile
+
+    def fit(self, X: pd.DataFrame, y=None):
+        """
+        Расчёт статистик по тренировочным данным
+
+        **return**: self
+        """
+        return self.fit_statistics(ChurnStatistics(sketch_k=None).update(X))
+
+    def fit_statistics(self, statistics: ChurnStatistics):
+        """
+        Расчёт выученных атрибутов по статистикам, накопленным по чанкам данных
+        (см. ChurnStatistics и ProprocessingData.preprocess_file)
+
+        **return**: self
+        """
+        sketches = statistics.sketches
+        self.geography_mode_ = statistics.geography_mode
+        self.fill_values_ = {col: sketches[col].quantile(0.5) for col in MEDIAN_FILL_COLUMNS}
+
+        # Квантили Age считаются после заполнения пропусков медианой
+        age = sketches['Age'].copy().update_weighted(self.fill_values_['Age'], sketches['Age'].n_nan)
+        self.age_bounds_ = (age.quantile(self.age_quantiles[0]), age.quantile(self.age_quantiles[1]))
+
+        self.balance_upper_ = sketches['Balance'].quantile(self.balance_quantile)
+        # Обрезка монотонна, поэтому медиана обрезанного Balance - обрезанная медиана Balance
+        self.balance_median_ = float(np.clip(sketches['Balance'].quantile(0.5), 0, self.balance_upper_))
+
+        self.geography_levels_ = sorted(statistics.geography_counts)
+
+        self._set_feature_names_out(statistics.columns)
+        return self
+
+    def _set_feature_names_out(self, input_columns):
+        """Порядок признаков на выходе, как после ProprocessingData.preprocessing()"""
+        base_columns = [col for col in input_columns
+                        if col not in TECHNICAL_COLUMNS and col != 'Geography']
+        self.columns_out_ = (
+            base_columns
+            + ENGINEERED_FEATURES
+            + [f'Geo_{level}' for level in self.geography_levels_]
+            + AGE_GROUP_FEATURES
+        )
+        self.feature_names_out_ = [col for col in self.columns_out_ if col != 'Exited']
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(self.feature_names_out_, dtype=object)
+
+    def fill_missing(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Заполнение пропусков модой (Geography) и медианами (числовые признаки)"""
+        df['Geography'] = df['Geography'].fillna(self.geography_mode_)
+        for col, value in self.fill_values_.items():
+            df[col] = df[col].astype(float).fillna(value)
+        return df
+
+    def clip_outliers(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Обрезка выбросов Age и Balance по выученным границам"""
+        df['Age'] = np.clip(df['Age'], *self.age_bounds_)
+        df['Balance'] = np.clip(df['Balance'], 0, self.balance_upper_)
+        return df
+
+    def encode_categorical(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Кодирование Geography (one-hot по выученным категориям) и Gender"""
+        geography = df.pop('Geography')
+        for level in self.geography_levels_:
+            df[f'Geo_{level}'] = (geography == level).astype(np.uint8)
+
+        if not pd.api.types.is_numeric_dtype(df['Gender']):
+            df['Gender'] = df['Gender'].map(GENDER_MAPPING)
+        return df
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        """
+        Векторное преобразование сырых данных клиентов в признаки модели
+        (типы столбцов - по apply_dtype_plan с выученными значениями transformer, одинаковые для всех чанков)
+
+        **return**: pd.DataFrame с признаками в порядке обучения (Exited сохраняется, если есть)
+        """
+        df = X.drop(columns=[col for col in TECHNICAL_COLUMNS if col in X.columns])
+
+        self.fill_missing(df)
+        self.clip_outliers(df)
+        self.encode_categorical(df)
+        add_engineered_features(df, self.balance_median_)
+        apply_dtype_plan(df, self)
+
+        if 'Exited' not in df.columns:
+            return df[self.feature_names_out_]
+        if 'Exited' in self.columns_out_:
+            return df[self.columns_out_]
+        return df[self.feature_names_out_ + ['Exited']]
@@ -0,0 +1,268 @@
+from collections import OrderedDict
+
+from catboost import CatBoostClassifier, Pool
+import lightgbm
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.utils.class_weight import compute_sample_weight
+import xgboost
+
+try:
+    from optuna_integration import CatBoostPruningCallback, LightGBMPruningCallback, XGBoostPruningCallback
+except ImportError:
+    CatBoostPruningCallback = LightGBMPruningCallback = XGBoostPruningCallback = None
+
+# Параметры CatBoost, от которых зависит квантование Pool
+CATBOOST_QUANTIZATION_PARAMS = ('border_count', 'feature_border_type')
+
+
+def take_rows(data, idx):
+    """Строки idx из pd.DataFrame/pd.Series или массива"""
+    return data.iloc[idx] if hasattr(data, 'iloc') else data[idx]
+
+
+class BoosterClassifier(ClassifierMixin, BaseEstimator):
+    """
+    Обёртка над нативной моделью LightGBM/XGBoost с интерфейсом sklearn-классификатора,
+    чтобы оценивать её теми же scorer'ами sklearn, что и остальные модели
+    """
+    def __init__(self, predict_positive=None):
+        """
+        - **predict_positive**: функция, возвращающая вероятность положительного класса для матрицы признаков
+        """
+        self.predict_positive = predict_positive
+        self.classes_ = np.array([0, 1])
+
+    def predict_proba(self, X):
+        positive = np.asarray(self.predict_positive(X), dtype=np.float64)
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        return (self.predict_positive(X) > 0.5).astype(int)
+
+
+class FoldCache:
+    """
+    Кэш фолдов кросс-валидации для подбора гиперпараметров.
+
+    Индексы фолдов и срезы данных фолдов вычисляются один раз и используются всеми
+    испытаниями. Для бустингов дополнительно кэшируются подготовленные датасеты
+    библиотек (CatBoost Pool, LightGBM Dataset, XGBoost QuantileDMatrix), поэтому
+    квантование признаков выполняется один раз на фолд, а не в каждом испытании.
+
+    Датасет зависит от параметров квантования (border_count CatBoost, max_bin LightGBM/XGBoost),
+    и каждое их значение - отдельная копия квантованных данных фолда. Поэтому кэш рассчитан
+    на фиксированные параметры квантования (HyperparametrTuner с кэшем их не перебирает):
+    перебор этих параметров даёт промах кэша почти в каждом испытании, а память ограничена
+    только max_datasets последних датасетов.
+
+    Части фолда:
+        - **fit**: данные для обучения (тренировочная часть фолда без выборки для ранней остановки);
+        - **eval**: выборка для ранней остановки (только при eval_size);
+        - **valid**: проверочная часть фолда, на которой считается score
+    """
+    NATIVE_MODELS = ('CatBoostClassifier', 'LGBMClassifier', 'XGBClassifier')
+
+    def __init__(self, X, y, cv=5, eval_size=None, random_state=42, max_datasets=32):
+        """
+        - **X**, **y**: тренировочная выборка;
+        - **cv(default=5)**: количество фолдов (StratifiedKFold без перемешивания, как в cross_val_score);
+        - **eval_size(default=None)**: доля тренировочной части фолда, отложенная для ранней остановки;
+        - **random_state(default=42)**: сид разбиения на fit и eval;
+        - **max_datasets(default=32)**: максимальное количество датасетов библиотек в кэше
+        (при переполнении удаляются давно не использованные)
+        """
+        self.X = X
+        self.y = y
+        self.cv = cv
+        self.eval_size = eval_size
+        self.random_state = random_state
+        self.max_datasets = max_datasets
+
+        self.folds = []
+        for train_idx, valid_idx in StratifiedKFold(n_splits=cv).split(X, y):
+            fold = {'fit': train_idx, 'valid': valid_idx}
+            if eval_size:
+                fold['fit'], fold['eval'] = train_test_split(
+                    train_idx, test_size=eval_size, stratify=take_rows(y, train_idx), random_state=random_state
+                )
+            self.folds.append(fold)
+
+        self._frames = {}
+        self._datasets = OrderedDict()
+
+    def __len__(self):
+        return len(self.folds)
+
+    def __getstate__(self):
+        # Датасеты библиотек не сериализуются и строятся заново в процессах пула
+        state = self.__dict__.copy()
+        state['_datasets'] = OrderedDict()
+        return state
+
+    def data(self, fold, part):
+        """
+        Срез данных части фолда (вычисляется один раз)
+
+        **return**: X, y части фолда
+        """
+        key = (fold, part)
+        if key not in self._frames:
+            idx = self.folds[fold][part]
+            self._frames[key] = (take_rows(self.X, idx), take_rows(self.y, idx))
+        return self._frames[key]
+
+    def dataset(self, model_class_name, fold, part, params=None, reference=None):
+        """
+        Подготовленный датасет библиотеки для части фолда
+
+        ### Arguments:
+            model_class_name: 'CatBoostClassifier', 'LGBMClassifier' или 'XGBClassifier'
+            fold: номер фолда
+            part: 'fit' или 'eval'
+            params(default=None): параметры модели, влияющие на подготовку датасета
+            reference(default=None): датасет fit, с которым eval должен разделять границы бинов
+
+        **return**: Pool, lightgbm.Dataset или xgboost.QuantileDMatrix
+        """
+        params = params or {}
+        if model_class_name == 'CatBoostClassifier':
+            settings = tuple((name, params[name]) for name in CATBOOST_QUANTIZATION_PARAMS
+                             if name in params and part == 'fit')
+        elif model_class_name == 'LGBMClassifier':
+            settings = (('max_bin', params.get('max_bin', 255)), ('class_weight', params.get('class_weight')))
+        else:
+            settings = (('max_bin', params.get('max_bin', 256)),)
+
+        key = (model_class_name, fold, part, settings)
+        if key in self._datasets:
+            self._datasets.move_to_end(key)
+            return self._datasets[key]
+
+        X, y = self.data(fold, part)
+        if model_class_name == 'CatBoostClassifier':
+            dataset = Pool(X, y)
+            if settings:
+                dataset.quantize(**dict(settings))
+        elif model_class_name == 'LGBMClassifier':
+            weight = None
+            if params.get('class_weight') == 'balanced':
+                weight = compute_sample_weight('balanced', y)
+            dataset = lightgbm.Dataset(
+                X, y, weight=weight, reference=reference, free_raw_data=False,
+                params={'max_bin': params.get('max_bin', 255), 'feature_pre_filter': False, 'verbose': -1}
+            ).construct()
+        else:
+            dataset = xgboost.QuantileDMatrix(X, y, ref=reference, max_bin=params.get('max_bin', 256))
+
+        self._datasets[key] = dataset
+        while len(self._datasets) > self.max_datasets:
+            self._datasets.popitem(last=False)
+        return dataset
+
+    def fit(self, model_class_name, params, fold, rounds=None, trial=None, use_auc=True):
+        """
+        Обучение бустинга на подготовленных датасетах фолда
+
+        ### Arguments:
+            model_class_name: 'CatBoostClassifier', 'LGBMClassifier' или 'XGBClassifier'
+            params: параметры модели в терминах sklearn-обёртки
+            fold: номер фолда
+            rounds(default=None): количество итераций без улучшения до ранней остановки по части eval
+            trial(default=None): испытание optuna, которому сообщается метрика на каждой итерации
+            (нужен пакет optuna-integration и ранняя остановка)
+            use_auc(default=True): останавливаться по AUC, иначе по функции потерь библиотеки
+
+        **return**: обученную модель с predict_proba и количество деревьев (до лучшей итерации при ранней остановке)
+        """
+        if model_class_name not in self.NATIVE_MODELS:
+            raise ValueError(f"Кэш датасетов не поддерживается для {model_class_name}")
+        if rounds and not self.eval_size:
+            raise ValueError("Для ранней остановки FoldCache создаётся с eval_size")
+
+        if model_class_name == 'CatBoostClassifier':
+            return self._fit_catboost(params, fold, rounds, trial, use_auc)
+        if model_class_name == 'LGBMClassifier':
+            return self._fit_lightgbm(params, fold, rounds, trial, use_auc)
+        return self._fit_xgboost(params, fold, rounds, trial, use_auc)
+
+    def _fit_catboost(self, params, fold, rounds, trial, use_auc):
+        train_pool = self.dataset('CatBoostClassifier', fold, 'fit', params)
+        # Квантование уже выполнено в Pool, параметры квантования модели не передаются
+        params = {name: value for name, value in params.items() if name not in CATBOOST_QUANTIZATION_PARAMS}
+        callbacks = []
+        fit_params = {}
+
+        if rounds:
+            if use_auc:
+                params['eval_metric'] = 'AUC'
+                if trial is not None and CatBoostPruningCallback is not None:
+                    callbacks.append(CatBoostPruningCallback(trial, 'AUC'))
+            fit_params = {
+                'eval_set': self.dataset('CatBoostClassifier', fold, 'eval'),
+                'early_stopping_rounds': rounds
+            }
+
+        model = CatBoostClassifier(**params)
+        model.fit(train_pool, callbacks=callbacks or None, verbose=False, **fit_params)
+        for callback in callbacks:
+            callback.check_pruned()
+
+        n_iterations = model.get_best_iteration() + 1 if rounds else model.tree_count_
+        return model, n_iterations
+
+    def _fit_lightgbm(self, params, fold, rounds, trial, use_auc):
+        train_set = self.dataset('LGBMClassifier', fold, 'fit', params)
+
+        native_params = {name: value for name, value in params.items()
+                         if name not in ('class_weight', 'n_estimators', 'random_state')}
+        native_params['objective'] = 'binary'
+        native_params.setdefault('verbose', -1)
+        if params.get('random_state') is not None:
+            native_params['seed'] = params['random_state']
+
+        callbacks = []
+        valid_sets = []
+        if rounds:
+            if use_auc:
+                native_params['metric'] = 'auc'
+                if trial is not None and LightGBMPruningCallback is not None:
+                    callbacks.append(LightGBMPruningCallback(trial, 'auc'))
+            valid_sets = [self.dataset('LGBMClassifier', fold, 'eval', params, reference=train_set)]
+            callbacks.append(lightgbm.early_stopping(rounds, verbose=False))
+
+        booster = lightgbm.train(
+            native_params, train_set, num_boost_round=params.get('n_estimators', 100),
+            valid_sets=valid_sets, callbacks=callbacks
+        )
+        n_iterations = booster.best_iteration if rounds else booster.current_iteration()
+        return BoosterClassifier(lambda X: booster.predict(X, num_iteration=n_iterations)), n_iterations
+
+    def _fit_xgboost(self, params, fold, rounds, trial, use_auc):
+        train_matrix = self.dataset('XGBClassifier', fold, 'fit', params)
+
+        native_params = {name: value for name, value in params.items()
+                         if name not in ('n_estimators', 'random_state', 'n_jobs', 'early_stopping_rounds')
+                         and value is not None}
+        native_params['objective'] = 'binary:logistic'
+        if params.get('random_state') is not None:
+            native_params['seed'] = params['random_state']
+        if params.get('n_jobs') is not None:
+            native_params['nthread'] = params['n_jobs']
+
+        callbacks = []
+        evals = []
+        if rounds:
+            if use_auc:
+                native_params['eval_metric'] = 'auc'
+                if trial is not None and XGBoostPruningCallback is not None:
+                    callbacks.append(XGBoostPruningCallback(trial, 'validation-auc'))
+            evals = [(self.dataset('XGBClassifier', fold, 'eval', params, reference=train_matrix), 'validation')]
+
+        booster = xgboost.train(
+            native_params, train_matrix, num_boost_round=params.get('n_estimators', 100),
+            evals=evals, early_stopping_rounds=rounds or None, callbacks=callbacks or None, verbose_eval=False
+        )
+        n_iterations = booster.best_iteration + 1 if rounds else booster.num_boosted_rounds()
+        return BoosterClassifier(lambda X: booster.inplace_predict(X, iteration_range=(0, n_iterations))), n_iterations
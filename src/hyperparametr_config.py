@@ -1,7 +1,8 @@
 MODEL_PARAMS_CONFIG = {
     'catboost': {
         'class': 'CatBoostClassifier',
-        'fixed_params': {'random_state': 42, 'verbose': False, 'auto_class_weights': 'Balanced'},
+        'fixed_params': {'random_state': 42, 'verbose': False, 'auto_class_weights': 'Balanced',
+                         'allow_writing_files': False},
         'grid_params': {
             'iterations': {'type': 'int', 'low': 200, 'high': 1000},
             'depth': {'type': 'int', 'low': 4, 'high': 8},
@@ -10,7 +11,9 @@ MODEL_PARAMS_CONFIG = {
             'border_count': {'type': 'int', 'low': 32, 'high': 255},
             'random_strength': {'type': 'float', 'low': 0.1, 'high': 10},
             'bagging_temperature': {'type': 'float', 'low': 0.0, 'high': 1.0}
-        }
+        },
+        'early_stopping': {'iterations_param': 'iterations', 'max_iterations': 2000, 'rounds': 50},
+        'successive_halving': {'fractions': [0.04, 0.2, 1.0], 'reduction_factor': 5, 'n_trials': 100}
     },
     'lightgbm': {
         'class': 'LGBMClassifier', 
@@ -25,7 +28,9 @@ MODEL_PARAMS_CONFIG = {
             'colsample_bytree': {'type': 'float', 'low': 0.6, 'high': 1.0},
             'reg_alpha': {'type': 'float', 'low': 0, 'high': 10},
             'reg_lambda': {'type': 'float', 'low': 0, 'high': 10}
-        }
+        },
+        'early_stopping': {'iterations_param': 'n_estimators', 'max_iterations': 2000, 'rounds': 50},
+        'successive_halving': {'fractions': [0.04, 0.2, 1.0], 'reduction_factor': 5, 'n_trials': 100}
     },
     'xgboost': {
         'class': 'XGBClassifier',
@@ -41,6 +46,8 @@ MODEL_PARAMS_CONFIG = {
             'gamma': {'type': 'float', 'low': 0, 'high': 10},
             'reg_alpha': {'type': 'float', 'low': 0, 'high': 10},
             'reg_lambda': {'type': 'float', 'low': 0, 'high': 10}
-        }
+        },
+        'early_stopping': {'iterations_param': 'n_estimators', 'max_iterations': 2000, 'rounds': 50},
+        'successive_halving': {'fractions': [0.04, 0.2, 1.0], 'reduction_factor': 5, 'n_trials': 100}
     }
 }
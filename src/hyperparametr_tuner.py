@@ -1,28 +1,225 @@
 from datetime import datetime
+import json
 import os
+import shutil
+import tempfile
 from catboost import CatBoostClassifier
 import joblib
+from joblib import Parallel, delayed, effective_n_jobs
+import lightgbm
 from lightgbm import LGBMClassifier
-from sklearn.model_selection import cross_val_score
+import numpy as np
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import train_test_split
 from xgboost import XGBClassifier
 import optuna
+from optuna.storages import JournalStorage
+from optuna.storages.journal import JournalFileBackend
+from fold_cache import CATBOOST_QUANTIZATION_PARAMS, FoldCache, take_rows
 from model_manager import ModelManager
+from dataset_store import DatasetStore
+
+try:
+    from optuna_integration import CatBoostPruningCallback, LightGBMPruningCallback, XGBoostPruningCallback
+except ImportError:
+    # Без optuna-integration ранняя остановка работает, но испытания прунятся только по фолдам
+    CatBoostPruningCallback = LightGBMPruningCallback = XGBoostPruningCallback = None
+
+# Параметр, ограничивающий количество потоков модели
+THREAD_PARAMS = {
+    'CatBoostClassifier': 'thread_count',
+    'LGBMClassifier': 'n_jobs',
+    'XGBClassifier': 'n_jobs'
+}
+
+FINISHED_STATES = (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+
+
+def make_storage(storage):
+    """
+    Хранилище optuna по пути или URL
+
+    ### Arguments:
+        storage: None (в памяти), путь к файлу журнала (.log), путь к SQLite (.db) или URL базы данных
+
+    **return**: хранилище для optuna.create_study / optuna.load_study
+    """
+    if storage is None or not isinstance(storage, str):
+        return storage
+    if storage.endswith('.log'):
+        return JournalStorage(JournalFileBackend(storage))
+    if '://' not in storage:
+        return f"sqlite:///{storage}"
+    return storage
+
+
+def make_pruner(pruner, n_warmup_steps=1):
+    """
+    Прунер optuna по имени
+
+    ### Arguments:
+        pruner: 'median', 'hyperband', None или готовый объект optuna.pruners.BasePruner
+        n_warmup_steps(default=1): количество первых шагов испытания, на которых MedianPruner не останавливает
+        испытание (по умолчанию - начиная со второго фолда)
+    """
+    if pruner is None:
+        return optuna.pruners.NopPruner()
+    if pruner == 'median':
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=n_warmup_steps)
+    if pruner == 'hyperband':
+        return optuna.pruners.HyperbandPruner(min_resource=1, max_resource='auto')
+    if isinstance(pruner, optuna.pruners.BasePruner):
+        return pruner
+    raise ValueError(f"Неизвестный прунер: {pruner}. Доступны: 'median', 'hyperband', None")
+
+
+def grid_distributions(grid_params):
+    """
+    Распределения optuna для сетки гиперпараметров из MODEL_PARAMS_CONFIG
+
+    **return**: словарь имя параметра -> optuna.distributions.BaseDistribution
+    """
+    distributions = {}
+    for param_name, param_config in grid_params.items():
+        if param_config['type'] == 'categorical':
+            distributions[param_name] = optuna.distributions.CategoricalDistribution(param_config['values'])
+        elif param_config['type'] == 'int':
+            distributions[param_name] = optuna.distributions.IntDistribution(
+                param_config['low'], param_config['high'], log=param_config.get('log', False)
+            )
+        elif param_config['type'] == 'float':
+            distributions[param_name] = optuna.distributions.FloatDistribution(
+                param_config['low'], param_config['high'],
+                log=param_config.get('log', False), step=param_config.get('step', None)
+            )
+    return distributions
+
+
+def trial_to_record(trial):
+    """Компактная JSON-запись завершённого испытания: параметры, распределения, значение и атрибуты"""
+    return {
+        'params': trial.params,
+        'distributions': {name: optuna.distributions.distribution_to_json(distribution)
+                          for name, distribution in trial.distributions.items()},
+        'value': trial.value,
+        'user_attrs': trial.user_attrs
+    }
+
+
+def halving_steps(fractions):
+    """
+    Шаги, о которых сообщают ступени successive halving: размер подвыборки в долях первой ступени.
+    При fractions, растущих в reduction_factor раз, ступень k достигает шага reduction_factor ** k
+    и попадает в k-ю ступень SuccessiveHalvingPruner(min_resource=1)
+    """
+    return [max(1, int(round(fraction / fractions[0]))) for fraction in fractions]
+
+
+def _optimize_worker(study_name, storage, sampler_seed, pruner, objective, n_trials):
+    """Запуск части испытаний исследования в отдельном процессе пула"""
+    study = optuna.load_study(
+        study_name=study_name,
+        storage=make_storage(storage),
+        sampler=optuna.samplers.TPESampler(seed=sampler_seed),
+        pruner=pruner
+    )
+    study.optimize(objective, n_trials=n_trials)
+
+
+def fit_with_early_stopping(model_class_name, params, X, y, X_eval, y_eval, rounds, trial=None, use_auc=True):
+    """
+    Обучение бустинга с ранней остановкой по отложенной выборке
+
+    ### Arguments:
+        model_class_name: 'CatBoostClassifier', 'LGBMClassifier' или 'XGBClassifier'
+        params: параметры модели (количество деревьев - верхняя граница)
+        X, y: данные для обучения
+        X_eval, y_eval: выборка для ранней остановки
+        rounds: количество итераций без улучшения до остановки
+        trial(default=None): испытание optuna, которому сообщается метрика на каждой итерации
+        (нужен пакет optuna-integration)
+        use_auc(default=True): останавливаться по AUC, иначе по функции потерь библиотеки
+
+    **return**: обученную модель и количество деревьев до лучшей итерации
+    """
+    params = dict(params)
+    callbacks = []
+
+    if model_class_name == 'CatBoostClassifier':
+        if use_auc:
+            params['eval_metric'] = 'AUC'
+            if trial is not None and CatBoostPruningCallback is not None:
+                callbacks.append(CatBoostPruningCallback(trial, 'AUC'))
+        model = CatBoostClassifier(**params)
+        model.fit(X, y, eval_set=(X_eval, y_eval), early_stopping_rounds=rounds,
+                  callbacks=callbacks or None, verbose=False)
+        for callback in callbacks:
+            callback.check_pruned()
+        return model, model.get_best_iteration() + 1
+
+    if model_class_name == 'LGBMClassifier':
+        if use_auc:
+            params['metric'] = 'auc'
+            if trial is not None and LightGBMPruningCallback is not None:
+                callbacks.append(LightGBMPruningCallback(trial, 'auc'))
+        model = LGBMClassifier(**params)
+        model.fit(X, y, eval_set=[(X_eval, y_eval)],
+                  callbacks=[lightgbm.early_stopping(rounds, verbose=False)] + callbacks)
+        return model, model.best_iteration_
+
+    if model_class_name == 'XGBClassifier':
+        params['early_stopping_rounds'] = rounds
+        if use_auc:
+            params['eval_metric'] = 'auc'
+            if trial is not None and XGBoostPruningCallback is not None:
+                callbacks.append(XGBoostPruningCallback(trial, 'validation_0-auc'))
+        model = XGBClassifier(callbacks=callbacks or None, **params)
+        model.fit(X, y, eval_set=[(X_eval, y_eval)], verbose=False)
+        return model, model.best_iteration + 1
+
+    raise ValueError(f"Ранняя остановка не поддерживается для {model_class_name}")
+
 
 class HyperparametrTuner:
     """
     Класс, позволяющий подобрать гиперпараметры модели с помощью **optuna**.
     """
     def __init__(self, X_train, y_train, params_config, 
-                 n_trials=30, cv=5, random_state=42, scoring='roc_auc', direction='maximize'):
+                 n_trials=None, cv=5, random_state=42, scoring='roc_auc', direction='maximize',
+                 n_jobs=1, storage=None, pruner='median', study_name='hyperparameter_tuning',
+                 early_stopping=False, eval_size=0.1, use_fold_cache=True, successive_halving=False,
+                 warm_start_top_k=5):
         """
         - **X_train**: train выборка;
         - **y_train**: тренировочные метки классов;
         - **params_config**: сетка гиперпараметров;
-        - **n_trials(default=30)**: количество испытаний подбора гиперпараметров;
+        - **n_trials(default=None)**: количество испытаний подбора гиперпараметров. По умолчанию -
+        n_trials секции successive_halving сетки (при successive_halving=True) или 30;
         - **cv(default=5)**: количество фолдов;
         - **random_state(default=42)**: сид генерации случайных чисел;
         - **scoring(default='roc_auc')**: метрика, которую будем оптимизировать;
-        - **direction(default='maximize')**: направление оптимизации
+        - **direction(default='maximize')**: направление оптимизации;
+        - **n_jobs(default=1)**: количество процессов, в которых параллельно выполняются испытания (-1 - все ядра).
+        При n_jobs=1 параллельно (в потоках) обучаются фолды кросс-валидации одного испытания;
+        - **storage(default=None)**: хранилище исследований - путь к файлу журнала (.log), к SQLite (.db) или URL.
+        С хранилищем подбор продолжается после сбоя с того же места. При n_jobs > 1 без хранилища
+        процессы используют временный журнал, который удаляется после подбора;
+        - **pruner(default='median')**: прунер optuna ('median', 'hyperband' или None), останавливающий
+        неудачные испытания по результатам первых фолдов;
+        - **study_name(default='hyperparameter_tuning')**: префикс имён исследований в хранилище;
+        - **early_stopping(default=False)**: для моделей с секцией early_stopping в сетке количество деревьев
+        не перебирается, а находится ранней остановкой внутри каждого фолда;
+        - **eval_size(default=0.1)**: доля тренировочной части фолда, отложенная для ранней остановки;
+        - **use_fold_cache(default=True)**: обучать бустинги на подготовленных один раз датасетах фолдов
+        (FoldCache), а не строить Pool/Dataset/DMatrix заново в каждом испытании. Параметры квантования
+        CatBoost (border_count) при этом не перебираются: Pool квантуется один раз на фолд со значением
+        из fixed_params (или значением CatBoost по умолчанию). Для перебора border_count - use_fold_cache=False
+        ценой квантования в каждом испытании;
+        - **successive_halving(default=False)**: для моделей с секцией successive_halving в сетке испытания
+        сначала оцениваются на стратифицированных подвыборках X_train, и только лучшие переходят
+        на большие доли и полную выборку (SuccessiveHalvingPruner);
+        - **warm_start_top_k(default=5)**: количество лучших испытаний из загруженных результатов
+        (load_tuning_results), которые заново оцениваются первыми в новом подборе
         """
         self.X_train = X_train
         self.y_train = y_train
@@ -32,6 +229,20 @@ class HyperparametrTuner:
         self.random_state = random_state
         self.scoring = scoring
         self.direction = direction
+        self.early_stopping = early_stopping
+        self.eval_size = eval_size
+        self.use_fold_cache = use_fold_cache
+        self.successive_halving = successive_halving
+        self.warm_start_top_k = warm_start_top_k
+        # Испытания прошлых подборов в компактном формате: имя модели -> список записей trial_to_record
+        self.prior_trials = {}
+        self.fold_caches = {}
+        self.n_jobs = effective_n_jobs(n_jobs)
+        # Без параллельных испытаний ядра отдаются фолдам кросс-валидации
+        self.fold_jobs = min(cv, os.cpu_count() or 1) if self.n_jobs == 1 else 1
+        self.storage = storage
+        self.pruner = pruner
+        self.study_name = study_name
         self.best_params = {}
         self.results = {}
         self.model_manager = ModelManager()
@@ -42,6 +253,63 @@ class HyperparametrTuner:
             'XGBClassifier': XGBClassifier
         }
 
+    @classmethod
+    def from_dataset(cls, directory, params_config, columns=None, mmap=True, **kwargs):
+        """
+        Создание тюнера по тренировочной выборке, сохранённой PrepareData.save_dataset
+
+        ### Arguments:
+            directory: каталог DatasetStore
+            params_config: сетка гиперпараметров
+            columns(default=None): признаки, которые нужно загрузить (по умолчанию - все)
+            mmap(default=True): отобразить выборку в память только для чтения без копирования
+            **kwargs: остальные параметры HyperparametrTuner
+
+        **return**: HyperparametrTuner
+        """
+        X_train, y_train = DatasetStore(directory).load_splits(('X_train', 'y_train'), columns=columns, mmap=mmap)
+        return cls(X_train, y_train, params_config, **kwargs)
+
+    def get_fold_cache(self, fraction=1.0):
+        """
+        Кэш фолдов кросс-валидации, общий для всех исследований тюнера
+
+        ### Arguments:
+            fraction(default=1.0): доля стратифицированной подвыборки X_train
+
+        **return**: FoldCache
+        """
+        if fraction not in self.fold_caches:
+            X, y = self.X_train, self.y_train
+            if fraction < 1.0:
+                idx, _ = train_test_split(
+                    np.arange(len(y)), train_size=fraction, stratify=y, random_state=self.random_state
+                )
+                idx = np.sort(idx)
+                X, y = take_rows(X, idx), take_rows(y, idx)
+
+            self.fold_caches[fraction] = FoldCache(
+                X, y, cv=self.cv,
+                eval_size=self.eval_size if self.early_stopping else None,
+                random_state=self.random_state
+            )
+        return self.fold_caches[fraction]
+
+    def _grid_params(self, model_config):
+        """
+        Перебираемые параметры модели: с ранней остановкой - без количества деревьев,
+        с кэшем фолдов - без параметров квантования CatBoost (Pool квантуется один раз на фолд)
+        """
+        excluded = set()
+        if self.early_stopping and model_config.get('early_stopping'):
+            excluded.add(model_config['early_stopping']['iterations_param'])
+        if self.use_fold_cache and model_config['class'] == 'CatBoostClassifier':
+            excluded.update(CATBOOST_QUANTIZATION_PARAMS)
+        return {name: config for name, config in model_config['grid_params'].items() if name not in excluded}
+
+    def _successive_halving_config(self, model_name):
+        return self.params_config[model_name].get('successive_halving') if self.successive_halving else None
+
     def gererate_objective(self, model_name, model_config):
         """
         Генерация функции objective для **optuna**.
@@ -53,8 +321,82 @@ class HyperparametrTuner:
         **return**: функцию objective для **optuna**
         """
         model_class = self.model_classes[model_config['class']]
-        grid_params = model_config['grid_params']
-        fixed_params = model_config['fixed_params']
+        grid_params = self._grid_params(model_config)
+        fixed_params = dict(model_config['fixed_params'])
+
+        # С ранней остановкой количество деревьев фиксируется верхней границей и не перебирается
+        early_stopping = model_config.get('early_stopping') if self.early_stopping else None
+        if early_stopping:
+            fixed_params[early_stopping['iterations_param']] = early_stopping['max_iterations']
+            # Шаги по фолдам идут после шагов по итерациям, которые сообщают колбэки optuna-integration
+            fold_step_offset = early_stopping['max_iterations']
+        else:
+            fold_step_offset = 0
+        use_auc = self.scoring == 'roc_auc'
+
+        # Ядра делятся между параллельными испытаниями (или фолдами), чтобы потоки бустингов не конкурировали
+        thread_param = THREAD_PARAMS.get(model_config['class'])
+        n_parallel = max(self.n_jobs, self.fold_jobs)
+        if n_parallel > 1 and thread_param and thread_param not in fixed_params:
+            fixed_params[thread_param] = max(1, (os.cpu_count() or 1) // n_parallel)
+
+        scorer = get_scorer(self.scoring)
+        native = self.use_fold_cache and model_config['class'] in FoldCache.NATIVE_MODELS
+        rounds = early_stopping['rounds'] if early_stopping else None
+
+        halving = self._successive_halving_config(model_name)
+        fractions = halving['fractions'] if halving else [1.0]
+        fold_caches = [self.get_fold_cache(fraction) for fraction in fractions]
+
+        def fit_fold(fold_cache, params, fold, iteration_trial=None):
+            """Обучение и оценка на одном фолде: score и лучшая итерация ранней остановки"""
+            n_iterations = None
+            if native:
+                model, n_iterations = fold_cache.fit(
+                    model_config['class'], params, fold, rounds, iteration_trial, use_auc
+                )
+            elif early_stopping:
+                model, n_iterations = fit_with_early_stopping(
+                    model_config['class'], params,
+                    *fold_cache.data(fold, 'fit'), *fold_cache.data(fold, 'eval'),
+                    rounds, iteration_trial, use_auc
+                )
+            else:
+                model = model_class(**params)
+                model.fit(*fold_cache.data(fold, 'fit'))
+            return scorer(model, *fold_cache.data(fold, 'valid')), n_iterations
+
+        def cross_validate(fold_cache, params, trial=None):
+            """
+            Средний score по фолдам и лучшие итерации ранней остановки.
+            Если передан trial, после каждого фолда прунер получает средний score
+            и может остановить испытание, не дожидаясь оставшихся фолдов.
+            При fold_jobs > 1 фолды обучаются параллельно в потоках, и прунер
+            получает средние score всех фолдов после их обучения
+            """
+            # Метрика по итерациям сообщается только на первом фолде, чтобы шаги не повторялись
+            if self.fold_jobs > 1:
+                results = Parallel(n_jobs=min(self.fold_jobs, len(fold_cache)), prefer='threads')(
+                    delayed(fit_fold)(fold_cache, params, fold, trial if fold == 0 else None)
+                    for fold in range(len(fold_cache))
+                )
+            else:
+                results = (fit_fold(fold_cache, params, fold, trial if fold == 0 else None)
+                           for fold in range(len(fold_cache)))
+
+            scores = []
+            best_iterations = []
+            for fold, (score, n_iterations) in enumerate(results):
+                if early_stopping:
+                    best_iterations.append(n_iterations)
+                scores.append(score)
+
+                if trial is not None:
+                    trial.report(float(np.mean(scores)), fold_step_offset + fold)
+                    if trial.should_prune():
+                        raise optuna.TrialPruned()
+
+            return float(np.mean(scores)), best_iterations
 
         def objective(trial):
             params = {}
@@ -81,17 +423,115 @@ class HyperparametrTuner:
 
             params.update(fixed_params)
 
-            model = model_class(**params)
+            if not halving:
+                score, best_iterations = cross_validate(fold_caches[0], params, trial)
+            else:
+                # Ступени successive halving: шаг - размер подвыборки в долях первой ступени,
+                # после каждой ступени SuccessiveHalvingPruner пропускает дальше только лучшие испытания
+                for fold_cache, step in zip(fold_caches, halving_steps(fractions)):
+                    score, best_iterations = cross_validate(fold_cache, params)
+                    trial.report(score, step)
+                    if trial.should_prune():
+                        raise optuna.TrialPruned()
 
-            scores = cross_val_score(
-                model, self.X_train, self.y_train, 
-                scoring=self.scoring, cv=self.cv, n_jobs=-1
-            )
-
-            return scores.mean()
+            if early_stopping:
+                trial.set_user_attr('best_iterations', best_iterations)
+            return score
         
         return objective
     
+    def _warm_start(self, study, model_name, n_trials):
+        """
+        Тёплый старт исследования по испытаниям прошлого подбора: все подходящие испытания
+        добавляются в историю сэмплера TPE, а top-k лучших ставятся в очередь на повторную оценку
+        на текущих данных. Испытания с параметрами вне текущей сетки пропускаются.
+        """
+        records = self.prior_trials.get(model_name)
+        if not records or study.trials:
+            return
+
+        distributions = grid_distributions(self._grid_params(self.params_config[model_name]))
+        prior_trials = []
+        for record in records:
+            params = {name: value for name, value in record['params'].items() if name in distributions}
+            if not params:
+                continue
+            # create_trial проверяет, что значения лежат в границах и вариантах текущей сетки
+            try:
+                prior_trials.append(optuna.trial.create_trial(
+                    params=params,
+                    distributions={name: distributions[name] for name in params},
+                    value=record['value'],
+                    user_attrs={**record.get('user_attrs', {}), 'warm_start': True}
+                ))
+            except ValueError:
+                continue
+        if not prior_trials:
+            return
+
+        study.add_trials(prior_trials)
+        top_trials = sorted(prior_trials, key=lambda trial: trial.value,
+                            reverse=self.direction == 'maximize')[:min(self.warm_start_top_k, n_trials)]
+        for trial in top_trials:
+            study.enqueue_trial(trial.params)
+        print(f"   Тёплый старт: {len(prior_trials)} прошлых испытаний, {len(top_trials)} поставлено в очередь")
+
+    def _optimize(self, study_name, objective, pruner, n_trials, model_name=None):
+        """
+        Запуск испытаний исследования: в текущем процессе или в пуле процессов с общим хранилищем.
+        Уже завершённые в хранилище self.storage испытания засчитываются, поэтому после сбоя подбор
+        продолжается. Без self.storage пул процессов использует временный журнал этого запуска,
+        и прошлые подборы на него не влияют.
+
+        **return**: исследование optuna
+        """
+        if self.storage is None and self.n_jobs > 1:
+            tmp_dir = tempfile.mkdtemp(prefix='optuna_')
+            try:
+                storage = os.path.join(tmp_dir, 'journal.log')
+                self._optimize_in(storage, study_name, objective, pruner, n_trials, model_name)
+                # Исследование копируется в память до удаления временного журнала
+                in_memory = optuna.storages.InMemoryStorage()
+                optuna.copy_study(from_study_name=study_name, from_storage=make_storage(storage),
+                                  to_storage=in_memory)
+                return optuna.load_study(study_name=study_name, storage=in_memory)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        return self._optimize_in(self.storage, study_name, objective, pruner, n_trials, model_name)
+
+    def _optimize_in(self, storage, study_name, objective, pruner, n_trials, model_name=None):
+        """Запуск испытаний исследования в хранилище storage (None - в памяти текущего процесса)"""
+        study = optuna.create_study(
+            study_name=study_name,
+            storage=make_storage(storage),
+            load_if_exists=storage is not None,
+            direction=self.direction,
+            sampler=optuna.samplers.TPESampler(seed=self.random_state),
+            pruner=pruner
+        )
+
+        self._warm_start(study, model_name, n_trials)
+
+        n_done = sum(trial.state in FINISHED_STATES for trial in study.trials
+                     if not trial.user_attrs.get('warm_start'))
+        n_remaining = max(0, n_trials - n_done)
+        if n_done:
+            print(f"   Найдено {n_done} завершённых испытаний, осталось {n_remaining}")
+
+        n_workers = min(self.n_jobs, n_remaining)
+        if n_workers <= 1:
+            study.optimize(objective, n_trials=n_remaining)
+            return study
+
+        # Испытания делятся между процессами, у каждого процесса свой сид сэмплера
+        shares = [len(part) for part in np.array_split(np.arange(n_remaining), n_workers)]
+        Parallel(n_jobs=n_workers)(
+            delayed(_optimize_worker)(study_name, storage, self.random_state + i, pruner, objective, share)
+            for i, share in enumerate(shares)
+        )
+        return optuna.load_study(study_name=study_name, storage=make_storage(storage))
+
     def tune_models(self, models_to_tune=None):
         """
         Подбор гиперпараметров с помощью **optuna**
@@ -105,20 +545,56 @@ class HyperparametrTuner:
             print(f"\nОптимизация {model_name}...")
             objective = self.gererate_objective(model_name, self.params_config[model_name])
             
-            study = optuna.create_study(
-                direction=self.direction,
-                sampler=optuna.samplers.TPESampler(seed=42)
-            )
+            early_stopping = self.params_config[model_name].get('early_stopping') if self.early_stopping else None
+            halving = self._successive_halving_config(model_name)
+            # Явно заданное количество испытаний важнее значения из сетки
+            n_trials = self.n_trials if self.n_trials is not None else (halving or {}).get('n_trials', 30)
+            if halving:
+                pruner = optuna.pruners.SuccessiveHalvingPruner(
+                    min_resource=1, reduction_factor=halving.get('reduction_factor', 3)
+                )
+            else:
+                # При прунинге по итерациям первые rounds деревьев не оцениваются
+                pruner = make_pruner(self.pruner, early_stopping['rounds'] if early_stopping else 1)
+
+            study = self._optimize(f"{self.study_name}_{model_name}", objective, pruner, n_trials, model_name)
+            best_trial = self.get_best_trial(study)
+            self.best_params[model_name] = dict(best_trial.params)
 
-            study.optimize(objective, n_trials=self.n_trials)
-            self.best_params[model_name] = study.best_params
+            # Итоговое количество деревьев - среднее лучших итераций по фолдам. У испытаний тёплого
+            # старта, сохранённых без ранней остановки, их нет - используется количество из сетки
+            if early_stopping:
+                iterations_param = early_stopping['iterations_param']
+                best_iterations = best_trial.user_attrs.get('best_iterations')
+                if best_iterations:
+                    n_iterations = int(round(np.mean(best_iterations)))
+                else:
+                    n_iterations = self.params_config[model_name]['fixed_params'].get(
+                        iterations_param, early_stopping['max_iterations']
+                    )
+                self.best_params[model_name][iterations_param] = n_iterations
             self.results[model_name] = study
 
-            print(f"{model_name}: лучший {self.scoring} = {study.best_value:.4f}")
-            print(f"   Лучшие параметры: {study.best_params}")
+            n_pruned = sum(trial.state == optuna.trial.TrialState.PRUNED for trial in study.trials)
+            print(f"{model_name}: лучший {self.scoring} = {best_trial.value:.4f} "
+                  f"(остановлено прунером: {n_pruned} из {len(study.trials)})")
+            print(f"   Лучшие параметры: {best_trial.params}")
 
         return self.best_params
     
+    def get_best_trial(self, study):
+        """
+        Лучшее испытание, оценённое в текущем подборе (испытания тёплого старта
+        из прошлых подборов оценены на других данных и не учитываются)
+        """
+        trials = [trial for trial in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+                  if not trial.user_attrs.get('warm_start')]
+        if not trials:
+            return study.best_trial
+        if self.direction == 'maximize':
+            return max(trials, key=lambda trial: trial.value)
+        return min(trials, key=lambda trial: trial.value)
+
     def get_tuned_models(self):
         """
         Получение модифицированных моделей
@@ -147,29 +623,53 @@ class HyperparametrTuner:
         
     def save_tuning_results(self, study_name="hyperparameter_tuning"):
         """
-        Сохранение результатов подбора гиперпараметров
+        Сохранение результатов подбора гиперпараметров в компактном JSON: лучшие параметры,
+        использованная сетка и завершённые испытания (параметры, распределения, значения) без объектов study
         """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{study_name}_{timestamp}.pkl"
+        filename = f"{study_name}_{timestamp}.json"
         filepath = os.path.join(self.model_manager.models_dir, filename)
         
         results = {
             'best_params': self.best_params,
-            'study_results': self.results,
+            'trials': {
+                model_name: [trial_to_record(trial) for trial in study.get_trials(
+                    deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)
+                ) if not trial.user_attrs.get('warm_start')]
+                for model_name, study in self.results.items()
+            },
+            'direction': self.direction,
+            'scoring': self.scoring,
             'config_used': self.params_config,
             'timestamp': timestamp
         }
         
-        joblib.dump(results, filepath)
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(results, file)
+        os.replace(tmp_path, filepath)
         print(f"Результаты тюнинга сохранены: {filepath}")
         return filepath
     
     def load_tuning_results(self, filepath):
         """
-        Загрузка тюнинга
+        Загрузка тюнинга. Испытания загруженных результатов используются для тёплого старта
+        следующего tune_models. Поддерживаются JSON (save_tuning_results) и прежний формат .pkl
         """
-        results = joblib.load(filepath)
+        if filepath.endswith('.json'):
+            with open(filepath, 'r') as file:
+                results = json.load(file)
+            self.prior_trials = results['trials']
+        else:
+            results = joblib.load(filepath)
+            self.results = results['study_results']
+            self.prior_trials = {
+                model_name: [trial_to_record(trial) for trial in study.get_trials(
+                    deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)
+                )]
+                for model_name, study in self.results.items()
+            }
+
         self.best_params = results['best_params']
-        self.results = results['study_results']
         print(f"Результаты тюнинга загружены из: {filepath}")
         return results
@@ -2,14 +2,24 @@ import os
 from datetime import datetime
 import joblib
 import json
+from model_registry import ModelRegistry
+from native_inference import ObliviousTreeModel
 
 class ModelManager:
     def __init__(self, models_dir='../models'):
         self.models_dir = models_dir
         os.makedirs(models_dir, exist_ok=True)
+        self.registry = ModelRegistry(models_dir)
 
-    def save_model(self, model, model_name, metadata=None):
-        """Сохраняет модель и метаданные"""
+    def save_model(self, model, model_name, metadata=None, transformer=None, stage='candidate', scaler=None):
+        """
+        Сохраняет модель и метаданные и регистрирует новую версию модели в реестре
+        (models_dir/registry.json). Если передан transformer (ChurnFeatureTransformer),
+        он сохраняется рядом с моделью как <model_file>_transformer.pkl, а scaler, на
+        признаках которого обучена модель (PrepareData.scaling), - как <model_file>_scaler.pkl
+
+        **return**: запись версии модели в реестре
+        """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         model_filename = f"{model_name}_{timestamp}.pkl"
         metadata_filename = f"{model_name}_{timestamp}_metadata.json"
@@ -26,25 +36,89 @@ class ModelManager:
             'model_file': model_filename
         })
 
+        if transformer is not None:
+            transformer_filename = f"{model_name}_{timestamp}_transformer.pkl"
+            joblib.dump(transformer, os.path.join(self.models_dir, transformer_filename))
+            metadata['transformer_file'] = transformer_filename
+
+        if scaler is not None:
+            scaler_filename = f"{model_name}_{timestamp}_scaler.pkl"
+            joblib.dump(scaler, os.path.join(self.models_dir, scaler_filename))
+            metadata['scaler_file'] = scaler_filename
+
         metadata_path = os.path.join(self.models_dir, metadata_filename)
 
         with open(metadata_path, 'w') as file:
             json.dump(metadata, file, indent=2)
 
-    def load_model(self, model_name_or_path):
-        """Загружает модель по имени или пути"""
+        entry = self.registry.register(
+            model_name, model_filename, timestamp,
+            metadata_file=metadata_filename,
+            transformer_file=metadata.get('transformer_file'),
+            metadata=metadata,
+            stage=stage,
+            scaler_file=metadata.get('scaler_file')
+        )
+        print(f"Модель сохранена: {model_path} (версия {entry['version']}, стадия {entry['stage']})")
+        return entry
+
+    def _registry_entry(self, model_name, version=None, stage=None):
+        """Запись версии модели в реестре (None, если модели в реестре нет)"""
+        if self.registry.exists():
+            try:
+                return self.registry.get(model_name, version, stage)
+            except KeyError:
+                if version is not None or stage is not None:
+                    raise
+        elif version is not None or stage is not None:
+            raise KeyError(f"Реестр моделей {self.registry.path} не создан")
+        return None
+
+    def _resolve_model_path(self, model_name_or_path, version=None, stage=None):
+        """
+        Путь к файлу модели: сам путь, если файл существует, иначе версия модели из реестра
+        (по умолчанию - последняя). Для каталогов без реестра - последняя модель с таким именем
+        """
+        if os.path.isfile(str(model_name_or_path)):
+            return str(model_name_or_path)
+
+        entry = self._registry_entry(model_name_or_path, version, stage)
+        if entry is not None:
+            return self.registry.path_of(entry)
+
         model_files = [f for f in os.listdir(self.models_dir) 
-                        if f.startswith(model_name_or_path) and f.endswith('.pkl')]
+                        if f.startswith(model_name_or_path) and f.endswith('.pkl')
+                        and not f.endswith(('_transformer.pkl', '_scaler.pkl'))]
             
         model_files.sort(reverse=True)
-        model_path = os.path.join(self.models_dir, model_files[0])
+        return os.path.join(self.models_dir, model_files[0])
+
+    def load_model(self, model_name_or_path, version=None, stage=None):
+        """
+        Загружает модель по имени или пути
+
+        ### Arguments:
+            model_name_or_path: название модели в реестре или путь к файлу модели
+            version(default=None): номер версии модели (по умолчанию - последняя)
+            stage(default=None): стадия версии ('candidate', 'production', 'archived')
+
+        **return**: модель
+        """
+        model_path = self._resolve_model_path(model_name_or_path, version, stage)
         
         model = joblib.load(model_path)
         print(f"Модель загружена: {model_path}")
         return model
     
-    def get_model_metadata(self, model_name):
-        """Возвращает метаданные модели"""
+    def get_model_metadata(self, model_name, version=None, stage=None):
+        """Возвращает метаданные модели (по умолчанию - последней версии)"""
+        entry = self._registry_entry(model_name, version, stage)
+        if entry is not None:
+            if entry['metadata_file'] is None:
+                return {}
+            with open(self.registry.path_of(entry, 'metadata_file'), 'r') as f:
+                return json.load(f)
+
         metadata_files = [f for f in os.listdir(self.models_dir) 
                          if f.startswith(model_name) and f.endswith('_metadata.json')]
         
@@ -55,3 +129,79 @@ class ModelManager:
             metadata = json.load(f)
         
         return metadata
+
+    def promote_model(self, model_name, version=None, stage='production'):
+        """
+        Переводит версию модели в стадию stage (по умолчанию - в production,
+        предыдущая production-версия переводится в archived)
+
+        **return**: запись версии модели в реестре
+        """
+        entry = self.registry.set_stage(model_name, version, stage)
+        print(f"Модель {model_name} версии {entry['version']} переведена в стадию {stage}")
+        return entry
+
+    def get_production_model_path(self, model_name=None):
+        """
+        Путь к production-модели из реестра: model_name или, если имя не указано,
+        последняя продвинутая в production модель
+
+        **return**: путь к файлу модели или None, если production-модели нет
+        """
+        entry = self.registry.get_production(model_name)
+        return self.registry.path_of(entry) if entry is not None else None
+
+    def rebuild_registry(self):
+        """
+        Регистрирует в реестре модели, сохранённые в models_dir до его появления
+
+        **return**: количество добавленных версий
+        """
+        return self.registry.rebuild()
+
+    @staticmethod
+    def get_transformer_path(model_path):
+        """Путь к ChurnFeatureTransformer, сохранённому рядом с моделью"""
+        root, _ = os.path.splitext(str(model_path))
+        return f"{root}_transformer.pkl"
+
+    @staticmethod
+    def get_scaler_path(model_path):
+        """Путь к scaler'у признаков, сохранённому рядом с моделью"""
+        root, _ = os.path.splitext(str(model_path))
+        return f"{root}_scaler.pkl"
+
+    def load_transformer(self, model_name_or_path):
+        """Загружает ChurnFeatureTransformer модели (None, если он не сохранялся)"""
+        model_path = self._resolve_model_path(model_name_or_path)
+
+        transformer_path = self.get_transformer_path(model_path)
+        if not os.path.exists(transformer_path):
+            return None
+        return joblib.load(transformer_path)
+
+    def export_native(self, model_name_or_path, export_format='cbm'):
+        """
+        Экспортирует CatBoost-модель в нативный формат CatBoost (.cbm), в ONNX (.onnx)
+        или в каталог .trees с массивами ObliviousTreeModel в .npy.
+        Файл сохраняется рядом с .pkl, поэтому ChurnFeatureTransformer модели находится по тому же имени.
+        .cbm-модель можно передать в CustomerChurnPredictor для лёгкого инференса на NumPy,
+        .trees-модель загружается отображением в память, и все процессы API используют одну копию весов
+
+        **return**: путь к экспортированной модели
+        """
+        extensions = {'cbm': '.cbm', 'onnx': '.onnx', 'trees': '.trees'}
+        if export_format not in extensions:
+            raise ValueError(f"Неподдерживаемый формат экспорта: {export_format}")
+
+        model_path = self._resolve_model_path(model_name_or_path)
+        model = joblib.load(model_path)
+
+        export_path = os.path.splitext(model_path)[0] + extensions[export_format]
+        if export_format == 'trees':
+            ObliviousTreeModel.from_catboost(model).save(export_path)
+        else:
+            model.save_model(export_path, format=export_format)
+
+        print(f"Модель экспортирована: {export_path}")
+        return export_path
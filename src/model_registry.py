@@ -0,0 +1,339 @@
+import fcntl
+import json
+import os
+import re
+import tempfile
+from datetime import datetime
+
+# Имя файла модели, сохранённой ModelManager.save_model: <model_name>_<YYYYmmdd_HHMMSS>.pkl
+MODEL_FILE_PATTERN = re.compile(r'^(?P<name>.+)_(?P<saved_at>\d{8}_\d{6})\.pkl$')
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+
+class ModelRegistry:
+    """
+    Реестр моделей: JSON-манифест models_dir/registry.json.
+
+    Для каждого имени модели хранятся её версии (файлы модели, метаданных и
+    ChurnFeatureTransformer, время сохранения, стадия и числовые метрики) и
+    номер последней и production-версии, поэтому поиск модели не требует
+    сканирования каталога, а production-модель находится за O(1).
+
+    Манифест перезаписывается атомарно (временный файл + os.replace), читатели
+    никогда не видят частично записанный файл. Изменения выполняются под эксклюзивной
+    блокировкой файла registry.json.lock: манифест перечитывается с диска, изменяется
+    и записывается, и версии, добавленные другим процессом, не теряются.
+
+    Стадии версий:
+        - **candidate**: новая версия (по умолчанию);
+        - **production**: обслуживаемая версия (одна на имя модели, последняя
+        продвинутая становится production-моделью реестра);
+        - **archived**: версия, снятая с production
+    """
+    FILENAME = 'registry.json'
+    STAGES = ('candidate', 'production', 'archived')
+
+    def __init__(self, models_dir):
+        """
+        - **models_dir**: каталог с моделями, в котором хранится registry.json
+        """
+        self.models_dir = str(models_dir)
+        self.path = os.path.join(self.models_dir, self.FILENAME)
+        self.lock_path = self.path + '.lock'
+        self._manifest = None
+        self._mtime = None
+
+    def exists(self):
+        """Создан ли манифест реестра"""
+        return os.path.exists(self.path)
+
+    def _empty(self):
+        return {'format_version': 1, 'production': None, 'models': {}}
+
+    def _read(self):
+        """Манифест реестра (перечитывается только при изменении файла)"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self._manifest, self._mtime = self._empty(), None
+            return self._manifest
+
+        if mtime != self._mtime:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self._manifest = json.load(file)
+            self._mtime = mtime
+        return self._manifest
+
+    def _write(self, manifest):
+        """Атомарная запись манифеста"""
+        descriptor, tmp_path = tempfile.mkstemp(dir=self.models_dir, prefix='.registry_', suffix='.json')
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+                json.dump(manifest, file, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._manifest = manifest
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def _update(self, change):
+        """
+        Перечитывает манифест, применяет к нему change(manifest) и атомарно записывает.
+        Чтение, изменение и запись выполняются под блокировкой registry.json.lock,
+        поэтому одновременные изменения из разных процессов не перезаписывают друг друга
+        """
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._mtime = None
+                manifest = self._read()
+                result = change(manifest)
+                self._write(manifest)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return result
+
+    @staticmethod
+    def _extract_metrics(metadata):
+        """Числовые метрики из метаданных модели (верхний уровень и performance_metrics)"""
+        metrics = {}
+        for source in (metadata, metadata.get('performance_metrics') or {}):
+            for name, value in source.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metrics[name] = float(value)
+        return metrics
+
+    def register(self, model_name, model_file, saved_at, metadata_file=None, transformer_file=None,
+                 metadata=None, stage='candidate', scaler_file=None):
+        """
+        Добавляет новую версию модели в реестр
+
+        ### Arguments:
+            model_name: название модели
+            model_file: имя файла модели в models_dir
+            saved_at: время сохранения в формате YYYYmmdd_HHMMSS
+            metadata_file(default=None): имя файла метаданных
+            transformer_file(default=None): имя файла ChurnFeatureTransformer
+            metadata(default=None): метаданные модели, из которых берутся числовые метрики
+            stage(default='candidate'): стадия версии
+            scaler_file(default=None): имя файла scaler'а признаков модели
+
+        **return**: запись версии
+        """
+        if stage not in self.STAGES:
+            raise ValueError(f"Неизвестная стадия модели: {stage}")
+
+        def change(manifest):
+            model = manifest['models'].setdefault(model_name, {'latest': None, 'production': None, 'versions': {}})
+            version = max(map(int, model['versions']), default=0) + 1
+            entry = {
+                'model_name': model_name,
+                'version': version,
+                'model_file': model_file,
+                'metadata_file': metadata_file,
+                'transformer_file': transformer_file,
+                'scaler_file': scaler_file,
+                'saved_at': saved_at,
+                'stage': 'candidate',
+                'metrics': self._extract_metrics(metadata or {})
+            }
+            model['versions'][str(version)] = entry
+
+            latest = model['versions'].get(str(model['latest']))
+            if latest is None or self._saved_at(entry) >= self._saved_at(latest):
+                model['latest'] = version
+            if stage != 'candidate':
+                self._set_stage(manifest, model_name, version, stage)
+            return entry
+
+        return self._update(change)
+
+    @staticmethod
+    def _saved_at(entry):
+        return datetime.strptime(entry['saved_at'], TIMESTAMP_FORMAT)
+
+    def _set_stage(self, manifest, model_name, version, stage):
+        model = manifest['models'][model_name]
+        entry = model['versions'][str(version)]
+
+        if stage == 'production':
+            previous = model['production']
+            if previous is not None and previous != version:
+                model['versions'][str(previous)]['stage'] = 'archived'
+            model['production'] = version
+            manifest['production'] = {'model_name': model_name, 'version': version}
+        elif entry['stage'] == 'production':
+            model['production'] = None
+            if manifest['production'] == {'model_name': model_name, 'version': version}:
+                manifest['production'] = None
+
+        entry['stage'] = stage
+        return entry
+
+    def set_stage(self, model_name, version=None, stage='production'):
+        """
+        Переводит версию модели в другую стадию. При переводе в production
+        предыдущая production-версия этой модели переводится в archived
+
+        ### Arguments:
+            model_name: название модели
+            version(default=None): номер версии (по умолчанию - последняя)
+            stage(default='production'): новая стадия
+
+        **return**: запись версии
+        """
+        if stage not in self.STAGES:
+            raise ValueError(f"Неизвестная стадия модели: {stage}")
+
+        def change(manifest):
+            entry = self._get(manifest, model_name, version)
+            return self._set_stage(manifest, model_name, entry['version'], stage)
+
+        return self._update(change)
+
+    def _get(self, manifest, model_name, version=None, stage=None):
+        model = manifest['models'].get(model_name)
+        if model is None:
+            raise KeyError(f"Модель {model_name} не найдена в реестре {self.path}")
+
+        if version is None:
+            version = model['production'] if stage == 'production' else model['latest']
+            if stage not in (None, 'production'):
+                candidates = [entry for entry in model['versions'].values() if entry['stage'] == stage]
+                version = max(candidates, key=self._saved_at)['version'] if candidates else None
+
+        entry = model['versions'].get(str(version))
+        if entry is None or (stage is not None and entry['stage'] != stage):
+            raise KeyError(f"Версия {version} модели {model_name} (стадия {stage}) не найдена в реестре")
+        return entry
+
+    def get(self, model_name, version=None, stage=None):
+        """
+        Запись версии модели
+
+        ### Arguments:
+            model_name: название модели
+            version(default=None): номер версии (по умолчанию - последняя с учётом stage)
+            stage(default=None): стадия версии
+
+        **return**: запись версии (KeyError, если её нет)
+        """
+        return self._get(self._read(), model_name, version, stage)
+
+    def get_production(self, model_name=None):
+        """
+        Production-версия модели model_name или, если имя не указано, последняя
+        продвинутая в production модель реестра
+
+        **return**: запись версии или None
+        """
+        manifest = self._read()
+        if model_name is None:
+            pointer = manifest['production']
+            if pointer is None:
+                return None
+            model_name = pointer['model_name']
+
+        model = manifest['models'].get(model_name)
+        if model is None or model['production'] is None:
+            return None
+        return model['versions'][str(model['production'])]
+
+    def find(self, model_name=None, stage=None, metric=None, min_value=None, max_value=None):
+        """
+        Поиск версий моделей
+
+        ### Arguments:
+            model_name(default=None): название модели
+            stage(default=None): стадия версий
+            metric(default=None): метрика, по убыванию которой сортируется результат
+            (версии без этой метрики не возвращаются)
+            min_value(default=None), max_value(default=None): допустимый диапазон метрики
+
+        **return**: список записей версий (по убыванию metric или от новых к старым)
+        """
+        manifest = self._read()
+        names = [model_name] if model_name is not None else list(manifest['models'])
+
+        entries = []
+        for name in names:
+            model = manifest['models'].get(name)
+            if model is None:
+                continue
+            for entry in model['versions'].values():
+                if stage is not None and entry['stage'] != stage:
+                    continue
+                if metric is not None:
+                    value = entry['metrics'].get(metric)
+                    if value is None:
+                        continue
+                    if (min_value is not None and value < min_value) or (max_value is not None and value > max_value):
+                        continue
+                entries.append(entry)
+
+        if metric is not None:
+            entries.sort(key=lambda entry: entry['metrics'][metric], reverse=True)
+        else:
+            entries.sort(key=self._saved_at, reverse=True)
+        return entries
+
+    def best(self, metric, model_name=None, stage=None, higher_is_better=True):
+        """
+        Версия с лучшим значением метрики
+
+        **return**: запись версии или None
+        """
+        entries = self.find(model_name, stage=stage, metric=metric)
+        if not entries:
+            return None
+        return entries[0] if higher_is_better else entries[-1]
+
+    def path_of(self, entry, key='model_file'):
+        """Полный путь к файлу версии (model_file, metadata_file, transformer_file или scaler_file)"""
+        return os.path.join(self.models_dir, entry[key]) if entry.get(key) else None
+
+    def rebuild(self):
+        """
+        Строит реестр по файлам моделей в models_dir (однократная миграция каталога,
+        сохранённого до появления реестра). Стадии уже зарегистрированных версий сохраняются
+
+        **return**: количество зарегистрированных версий
+        """
+        known = {entry['model_file'] for model in self._read()['models'].values()
+                 for entry in model['versions'].values()}
+
+        found = []
+        for filename in os.listdir(self.models_dir):
+            match = MODEL_FILE_PATTERN.match(filename)
+            if match is None or filename.endswith(('_transformer.pkl', '_scaler.pkl')) or filename in known:
+                continue
+
+            root = filename[:-len('.pkl')]
+            metadata_file = f"{root}_metadata.json"
+            transformer_file = f"{root}_transformer.pkl"
+            scaler_file = f"{root}_scaler.pkl"
+
+            metadata = {}
+            if os.path.exists(os.path.join(self.models_dir, metadata_file)):
+                with open(os.path.join(self.models_dir, metadata_file), 'r') as file:
+                    metadata = json.load(file)
+            else:
+                metadata_file = None
+
+            found.append({
+                'model_name': metadata.get('model_name', match['name']),
+                'model_file': filename,
+                'saved_at': match['saved_at'],
+                'metadata_file': metadata_file,
+                'transformer_file': transformer_file if os.path.exists(os.path.join(self.models_dir, transformer_file)) else None,
+                'scaler_file': scaler_file if os.path.exists(os.path.join(self.models_dir, scaler_file)) else None,
+                'metadata': metadata
+            })
+
+        found.sort(key=lambda item: item['saved_at'])
+        for item in found:
+            self.register(**item)
+        return len(found)
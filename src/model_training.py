@@ -10,15 +10,75 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from model_manager import ModelManager
+from dataset_store import DatasetStore
 from datetime import datetime
+from joblib import Parallel, delayed, effective_n_jobs, parallel_backend
 import os
+import time
+
+
+def _fit_model(model, X, y):
+    """Обучение одной модели в процессе пула, возвращает модель и время обучения"""
+    started = time.perf_counter()
+    model.fit(X, y)
+    return model, time.perf_counter() - started
+
+
+def threshold_curve(y_true, y_score, thresholds=None, cost_fn=1.0, cost_fp=1.0):
+    """
+    Метрики классификации для всех порогов за один векторный проход.
+
+    Клиент считается уходящим при y_score >= порог. Вероятности положительного и
+    отрицательного классов сортируются один раз, после чего TP и FP для всех порогов
+    находятся бинарным поиском (searchsorted), без пересчёта confusion matrix на каждый порог.
+
+    ### Arguments:
+        y_true: истинные метки классов (1 - отток)
+        y_score: вероятности положительного класса
+        thresholds(default=None): пороги; None - все уникальные значения y_score (точная кривая)
+        cost_fn(default=1.0): стоимость пропущенного уходящего клиента (FN)
+        cost_fp(default=1.0): стоимость напрасного контакта с лояльным клиентом (FP)
+
+    **return**: pd.DataFrame со столбцами threshold, tp, fp, fn, tn, precision, recall, f1, cost
+    """
+    y_true = np.asarray(y_true) == 1
+    y_score = np.asarray(y_score, dtype=np.float64)
+    thresholds = np.unique(y_score) if thresholds is None else np.asarray(thresholds, dtype=np.float64)
+
+    positive_scores = np.sort(y_score[y_true])
+    negative_scores = np.sort(y_score[~y_true])
+
+    tp = len(positive_scores) - np.searchsorted(positive_scores, thresholds, side='left')
+    fp = len(negative_scores) - np.searchsorted(negative_scores, thresholds, side='left')
+    fn = len(positive_scores) - tp
+    tn = len(negative_scores) - fp
+
+    # При нулевом знаменателе метрика равна 0, как у sklearn с zero_division по умолчанию
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+
+    return pd.DataFrame({
+        'threshold': thresholds,
+        'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'cost': cost_fn * fn + cost_fp * fp
+    })
+
 
 class TrainModels:
     """
     Класс, который позволяет обучить модели и сохраняют лучшую из них. Доступны следующие методы:
 
-    - **fit_models()**: обучает базовые и продвинутые модели без подобранных гиперпараметров;
+    - **from_dataset()**: создаёт TrainModels по выборкам из DatasetStore (отображение в память без копирования);
+    - **build_base_models()**: создаёт базовые модели без подобранных гиперпараметров;
+    - **fit_models()**: обучает базовые и продвинутые модели без подобранных гиперпараметров, в том числе параллельно;
     - **add_tuned_models()**: добавляет к общему списку моделей наши продвинутые модели;
+    - **cache_predictions()**: один раз считает предсказания всех моделей, их используют все методы оценки;
+    - **invalidate_predictions()**: сбрасывает закэшированные предсказания модели после переобучения;
     - **evaluate_models()**: метод, предназначенный для оценки модели, с помощью метрик ML;
     - **compare_models_performance()**: cравнивает производительность всех моделей;
     - **get_best_model()**: выбирает наилучшую модель по указанной метрике;
@@ -32,6 +92,10 @@ class TrainModels:
     - **plot_feature_importance()**: визуализирует важность признаков;
     """
 
+    # Порядок постановки базовых моделей в пул при параллельном обучении (от самой долгой)
+    SLOWEST_FIRST = ['CatBoostClassifier', 'RandomForestClassifier', 'XGBClassifier', 'LGBMClassifier',
+                     'KNeighborsClassifier', 'LogisticRegression', 'DecisionTreeClassifier']
+
     def __init__(self, X_train, X_test, y_train, y_test):
         self.X_train = X_train
         self.X_test = X_test
@@ -40,40 +104,91 @@ class TrainModels:
         self.models = {}
         self.predictions = {}
         self.model_manager = ModelManager()
-    
-    def fit_models(self):
-        """ 
-        Обучает модели 
-        
-        **return**: словарь с обученными моделями
+        # Scaler признаков выборок (сохраняется вместе с моделью в save_model)
+        self.scaler = None
+        # Вероятности положительного класса: (имя модели, 'train' | 'test') -> np.ndarray
+        self._proba_cache = {}
+
+    @classmethod
+    def from_dataset(cls, directory='../data/processed/dataset', columns=None, mmap=True):
         """
-        logistic_regression = LogisticRegression(random_state=42, max_iter=1000)
-        logistic_regression.fit(self.X_train, self.y_train)
-        self.models['LogisticRegression'] = logistic_regression
+        Создание TrainModels по выборкам, сохранённым PrepareData.save_dataset
 
-        knn = KNeighborsClassifier()
-        knn.fit(self.X_train, self.y_train)
-        self.models['KNeighborsClassifier'] = knn
+        ### Arguments:
+            directory(default='../data/processed/dataset'): каталог DatasetStore
+            columns(default=None): признаки, которые нужно загрузить (по умолчанию - все)
+            mmap(default=True): отобразить выборки в память только для чтения без копирования
 
-        decision_tree = DecisionTreeClassifier(random_state=42)
-        decision_tree.fit(self.X_train, self.y_train)
-        self.models['DecisionTreeClassifier'] = decision_tree
+        **return**: TrainModels
+        """
+        store = DatasetStore(directory)
+        trainer = cls(*store.load_splits(columns=columns, mmap=mmap))
+        if 'scaler' in store.manifest['objects']:
+            trainer.scaler = store.load_object('scaler')
+        return trainer
 
-        random_forest = RandomForestClassifier(random_state=42)
-        random_forest.fit(self.X_train, self.y_train)
-        self.models['RandomForestClassifier'] = random_forest
+    def build_base_models(self, n_threads=None):
+        """
+        Создаёт базовые модели без подобранных гиперпараметров
 
-        xgboost = XGBClassifier(random_state=42)
-        xgboost.fit(self.X_train, self.y_train)
-        self.models['XGBClassifier'] = xgboost
-        
-        lightgbm = LGBMClassifier(random_state=42, verbose=0)
-        lightgbm.fit(self.X_train, self.y_train)
-        self.models['LGBMClassifier'] = lightgbm
+        ### Arguments:
+            n_threads(default=None): количество потоков для моделей с внутренним параллелизмом
+            (None - значения по умолчанию библиотек)
+
+        **return**: словарь необученных моделей
+        """
+        threads = {} if n_threads is None else {'n_jobs': n_threads}
+
+        return {
+            'LogisticRegression': LogisticRegression(random_state=42, max_iter=1000),
+            'KNeighborsClassifier': KNeighborsClassifier(**threads),
+            'DecisionTreeClassifier': DecisionTreeClassifier(random_state=42),
+            'RandomForestClassifier': RandomForestClassifier(random_state=42, **threads),
+            'XGBClassifier': XGBClassifier(random_state=42, **threads),
+            'LGBMClassifier': LGBMClassifier(random_state=42, verbose=0, **threads),
+            'CatBoostClassifier': CatBoostClassifier(
+                random_state=42, verbose=0, allow_writing_files=False,
+                **({} if n_threads is None else {'thread_count': n_threads})
+            ),
+        }
+
+    def fit_models(self, n_jobs=1):
+        """ 
+        Обучает модели 
 
-        catboost = CatBoostClassifier(random_state=42, verbose=0)
-        catboost.fit(self.X_train, self.y_train)
-        self.models['CatBoostClassifier'] = catboost
+        ### Arguments:
+            n_jobs(default=1): количество ядер для параллельного обучения (-1 - все ядра).
+            При n_jobs > 1 модели обучаются одновременно в пуле процессов joblib, а ядра делятся
+            между ними: каждая модель получает n_jobs // количество процессов потоков, чтобы
+            внутренние потоки бустингов не конкурировали за одни и те же ядра
+        
+        **return**: словарь с обученными моделями
+        """
+        n_cores = effective_n_jobs(n_jobs)
+        if n_cores == 1:
+            for name, model in self.build_base_models().items():
+                model.fit(self.X_train, self.y_train)
+                self.models[name] = model
+                self.invalidate_predictions(name)
+            return self.models
+
+        n_workers = min(n_cores, len(self.SLOWEST_FIRST))
+        n_threads = max(1, n_cores // n_workers)
+        models = self.build_base_models(n_threads)
+
+        # Самые долгие модели ставятся в очередь первыми, чтобы время обучения определялось самой медленной
+        with parallel_backend('loky', inner_max_num_threads=n_threads):
+            fitted = Parallel(n_jobs=n_workers)(
+                delayed(_fit_model)(models[name], self.X_train, self.y_train)
+                for name in self.SLOWEST_FIRST
+            )
+
+        fitted = dict(zip(self.SLOWEST_FIRST, fitted))
+        for name in models:
+            model, fit_time = fitted[name]
+            self.models[name] = model
+            self.invalidate_predictions(name)
+            print(f"{name}: обучена за {fit_time:.1f} сек")
 
         return self.models
     
@@ -86,34 +201,114 @@ class TrainModels:
         for name, model in tuned_models_dict.items():
             model.fit(self.X_train, self.y_train)
             self.models[name] = model
+            self.invalidate_predictions(name)
         print(f"Добавлено {len(tuned_models_dict)} настроенных моделей")
         return self.models
     
-    def evaluate_models(self):
+    def invalidate_predictions(self, model_name=None):
+        """
+        Сбрасывает закэшированные предсказания модели (или всех моделей) после переобучения
+
+        ### Arguments:
+            model_name(default=None): имя модели, None - все модели
+        """
+        if model_name is None:
+            self._proba_cache.clear()
+            return
+        for key in [key for key in self._proba_cache if key[0] == model_name]:
+            del self._proba_cache[key]
+
+    def _dataset(self, dataset):
+        if dataset == 'test':
+            return self.X_test
+        if dataset == 'train':
+            return self.X_train
+        raise ValueError(f"Неизвестная выборка: {dataset}. Доступны: 'train', 'test'")
+
+    def cache_predictions(self, datasets=('test', 'train'), n_jobs=None):
+        """
+        Один раз считает вероятности для всех моделей и выборок, которых ещё нет в кэше
+
+        ### Arguments:
+            datasets(default=('test', 'train')): выборки, для которых считаются предсказания
+            n_jobs(default=None): количество потоков, в которых параллельно считаются предсказания разных моделей
+            (по умолчанию - поток на модель, но не больше количества ядер; 1 - последовательно)
+        """
+        missing = [(name, dataset) for name in self.models for dataset in datasets
+                   if (name, dataset) not in self._proba_cache]
+        if not missing:
+            return
+        if n_jobs is None:
+            n_jobs = min(len(self.models), os.cpu_count() or 1)
+
+        # predict_proba библиотек отпускает GIL, поэтому потоков достаточно и модели не копируются
+        probas = Parallel(n_jobs=n_jobs, prefer='threads')(
+            delayed(self.models[name].predict_proba)(self._dataset(dataset)) for name, dataset in missing
+        )
+        for key, proba in zip(missing, probas):
+            self._proba_cache[key] = np.asarray(proba)[:, 1]
+
+    def get_proba(self, model_name, dataset='test'):
+        """
+        Вероятности положительного класса из кэша (считаются при первом обращении)
+
+        ### Arguments:
+            model_name: имя модели
+            dataset(default='test'): выборка 'test' или 'train'
+
+        **return**: np.ndarray вероятностей
+        """
+        key = (model_name, dataset)
+        if key not in self._proba_cache:
+            self._proba_cache[key] = self.models[model_name].predict_proba(self._dataset(dataset))[:, 1]
+        return self._proba_cache[key]
+
+    def get_predictions(self, model_name, dataset='test'):
+        """
+        Метки классов, как у model.predict(), по закэшированным вероятностям
+
+        **return**: np.ndarray меток классов
+        """
+        # Класс с наибольшей вероятностью; при равенстве, как у argmax, побеждает первый класс
+        classes = getattr(self.models[model_name], 'classes_', np.array([0, 1]))
+        return np.asarray(classes)[(self.get_proba(model_name, dataset) > 0.5).astype(int)]
+
+    def evaluate_models(self, n_jobs=None):
         """
         Считает предсказания и метрики.
 
+        ### Arguments:
+            n_jobs(default=None): количество потоков для параллельного расчёта предсказаний моделей
+            (по умолчанию - поток на модель, см. cache_predictions)
+
         **return**: словарь с метриками для каждой модели  
         """
-        for name_model, model in self.models.items():
-            y_pred_test = model.predict(self.X_test)
-            y_pred_proba_test = model.predict_proba(self.X_test)[:, 1]
+        self.cache_predictions(n_jobs=n_jobs)
+
+        for name_model in self.models:
+            y_pred_test = self.get_predictions(name_model, 'test')
+            y_pred_proba_test = self.get_proba(name_model, 'test')
 
-            y_pred_train = model.predict(self.X_train)
-            y_pred_proba_train = model.predict_proba(self.X_train)[:, 1]
+            y_pred_train = self.get_predictions(name_model, 'train')
+            y_pred_proba_train = self.get_proba(name_model, 'train')
+
+            test_roc_auc = roc_auc_score(self.y_test, y_pred_proba_test)
+            test_f1 = f1_score(self.y_test, y_pred_test)
+            train_roc_auc = roc_auc_score(self.y_train, y_pred_proba_train)
+            train_f1 = f1_score(self.y_train, y_pred_train)
             self.predictions[name_model] = {
-                "test_roc_auc": roc_auc_score(self.y_test, y_pred_proba_test),
-                "test_f1_score": f1_score(self.y_test, y_pred_test),
+                "test_roc_auc": test_roc_auc,
+                "test_f1_score": test_f1,
                 "test_precision": precision_score(self.y_test, y_pred_test),
                 "test_recall": recall_score(self.y_test, y_pred_test),
                 
-                "train_roc_auc": roc_auc_score(self.y_train, y_pred_proba_train),
-                "train_f1_score": f1_score(self.y_train, y_pred_train),
+                "train_roc_auc": train_roc_auc,
+                "train_f1_score": train_f1,
                 "train_precision": precision_score(self.y_train, y_pred_train),
                 "train_recall": recall_score(self.y_train, y_pred_train),
 
-                "roc_auc_diff": roc_auc_score(self.y_train, y_pred_proba_train) - roc_auc_score(self.y_test, y_pred_proba_test),
-                "f1_diff": f1_score(self.y_train, y_pred_train) - f1_score(self.y_test, y_pred_test),
+                "roc_auc_diff": train_roc_auc - test_roc_auc,
+                "f1_diff": train_f1 - test_f1,
                 
                 "classification_report": classification_report(self.y_test, y_pred_test)
             }
@@ -165,8 +360,9 @@ class TrainModels:
     
     def plot_roc_curve(self):
         """ Отображает графики roc-auc кривых """
-        for name_model, model in self.models.items():
-            y_pred_proba = model.predict_proba(self.X_test)[:,1]
+        self.cache_predictions(datasets=('test',))
+        for name_model in self.models:
+            y_pred_proba = self.get_proba(name_model)
         
             fpr, tpr, _ = roc_curve(self.y_test, y_pred_proba)
             roc_auc = auc(fpr, tpr)
@@ -182,41 +378,51 @@ class TrainModels:
             plt.grid(True)
             plt.show()
 
-    def optimize_classification_threshold(self, model_name, metric='f1'):
+    def optimize_classification_threshold(self, model_name, metric='f1', thresholds=None,
+                                          cost_fn=1.0, cost_fp=1.0, return_curve=False):
         """
         Находит оптимальный порог классификации для выбранной метрики
         
         ### Arguments: 
             model_name: имя модели
             metric(default='f1'): метрика для которой будем подбирать оптимальный порог
+            ('f1', 'precision', 'recall' или 'cost' - минимизация cost_fn * FN + cost_fp * FP)
+            thresholds(default=None): сетка порогов, по умолчанию np.arange(0.1, 0.9, 0.01);
+            'all' - все уникальные вероятности модели
+            cost_fn(default=1.0): стоимость пропущенного уходящего клиента для metric='cost'
+            cost_fp(default=1.0): стоимость ложного срабатывания для metric='cost'
+            return_curve(default=False): дополнительно вернуть метрики для всех порогов
 
         **return**: Возвращает наилучший порог классификации и наилучший score
+        (и pd.DataFrame кривой, если return_curve=True)
         """
-        
-        model = self.models[model_name]
-        y_pred_proba = model.predict_proba(self.X_test)[:, 1]
-        
-        thresholds = np.arange(0.1, 0.9, 0.01)
-        best_threshold = 0.5
-        best_score = 0
-        
-        for threshold in thresholds:
-            y_pred = (y_pred_proba >= threshold).astype(int)
-            
-            if metric == 'f1':
-                score = f1_score(self.y_test, y_pred)
-            elif metric == 'precision':
-                score = precision_score(self.y_test, y_pred)
-            elif metric == 'recall':
-                score = recall_score(self.y_test, y_pred)
-            
-            if score > best_score:
-                best_score = score
-                best_threshold = threshold
+        if metric not in ('f1', 'precision', 'recall', 'cost'):
+            raise ValueError(f"Неизвестная метрика: {metric}. Доступны: 'f1', 'precision', 'recall', 'cost'")
+
+        y_pred_proba = self.get_proba(model_name)
+
+        if thresholds is None:
+            thresholds = np.arange(0.1, 0.9, 0.01)
+        elif isinstance(thresholds, str) and thresholds == 'all':
+            thresholds = None
+
+        curve = threshold_curve(self.y_test, y_pred_proba, thresholds, cost_fn=cost_fn, cost_fp=cost_fp)
+        scores = curve[metric].to_numpy()
+
+        if metric == 'cost':
+            best = int(np.argmin(scores))
+            best_threshold, best_score = float(curve['threshold'].iloc[best]), float(scores[best])
+        elif scores.max() > 0:
+            best = int(np.argmax(scores))
+            best_threshold, best_score = float(curve['threshold'].iloc[best]), float(scores[best])
+        else:
+            best_threshold, best_score = 0.5, 0
         
         print(f"Оптимальный порог для {model_name}: {best_threshold:.3f}")
         print(f"   {metric.capitalize()} с оптимальным порогом: {best_score:.4f}")
-        
+
+        if return_curve:
+            return best_threshold, best_score, curve
         return best_threshold, best_score
     
     def evaluate_with_optimal_threshold(self, model_name, threshold):
@@ -230,8 +436,7 @@ class TrainModels:
 
         **return**: словарь с результатами подсчитанных метрик
         """
-        model = self.models[model_name]
-        y_pred_proba = model.predict_proba(self.X_test)[:, 1]
+        y_pred_proba = self.get_proba(model_name)
         y_pred_optimal = (y_pred_proba >= threshold).astype(int)
         
         optimal_metrics = {
@@ -247,7 +452,7 @@ class TrainModels:
         
         return optimal_metrics
     
-    def save_model(self, model_name, metrics=None):
+    def save_model(self, model_name, metrics=None, transformer=None, stage='candidate', scaler=None):
         """
         Сохраняет модель по указанному имени, с возможностью сохранения метрик.
 
@@ -255,8 +460,13 @@ class TrainModels:
 
             model_name: название модели
             metrics(default=None): метрики, которые будем хранить вместе с моделью
+            transformer(default=None): ChurnFeatureTransformer, который сохраняется рядом с моделью для API
+            stage(default='candidate'): стадия версии в реестре моделей ('candidate' или 'production')
+            scaler(default=None): scaler, на признаках которого обучена модель (PrepareData.scaling);
+            по умолчанию - scaler выборок из DatasetStore (from_dataset). Сохраняется рядом с моделью,
+            CustomerChurnPredictor применяет его к признакам перед вызовом модели
 
-        **return**: сохраненную модель
+        **return**: запись сохранённой версии модели в реестре
         """
         model = self.models[model_name]
         metadata = {
@@ -268,7 +478,10 @@ class TrainModels:
         if metrics:
             metadata.update(metrics)
 
-        return self.model_manager.save_model(model, model_name, metadata)
+        if scaler is None:
+            scaler = self.scaler
+        return self.model_manager.save_model(model, model_name, metadata, transformer=transformer, stage=stage,
+                                             scaler=scaler)
     
     def load_model_in_trainer(self, model_name_or_path, new_name=None):
         """
@@ -288,6 +501,7 @@ class TrainModels:
             model_name = os.path.basename(model_name_or_path).split('_')[0]
 
         self.models[model_name] = model
+        self.invalidate_predictions(model_name)
         print(f"Модель {model_name} загружена в trainer")
         return model
 
@@ -302,9 +516,7 @@ class TrainModels:
 
         **return**: словарь, содержащий метрики модели, а также порог классификации
         """
-        model = self.models[model_name]
-        
-        y_pred_proba = model.predict_proba(self.X_test)[:, 1]
+        y_pred_proba = self.get_proba(model_name)
         y_pred = (y_pred_proba >= threshold).astype(int)
 
         report = {
@@ -328,8 +540,7 @@ class TrainModels:
             model_name: название модели
             threshold(default=0.5): порог классификации
         """        
-        model = self.models[model_name]
-        y_pred_proba = model.predict_proba(self.X_test)[:, 1]
+        y_pred_proba = self.get_proba(model_name)
         y_pred = (y_pred_proba >= threshold).astype(int)
         
         fig, ax = plt.subplots(figsize=(8, 6))
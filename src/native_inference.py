@@ -0,0 +1,227 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from versioned_directory import create_version, publish_version
+
+
+def process_memory() -> dict:
+    """
+    Потребление памяти текущим процессом по /proc (Linux), МБ:
+
+        - **rss**: резидентная память процесса;
+        - **rss_anon**: частная (анонимная) память процесса - то, что каждый процесс держит отдельно;
+        - **rss_file**: страницы файлов, отображённых в память (в том числе веса модели, загруженной
+        через ObliviousTreeModel.load), общие для всех процессов, отображающих тот же файл;
+        - **pss**: пропорциональная доля процесса (общие страницы делятся на количество процессов)
+
+    Отсутствующие в системе показатели не возвращаются
+    """
+    fields = {'VmRSS': 'rss', 'RssAnon': 'rss_anon', 'RssFile': 'rss_file'}
+    memory = {}
+    for path, names in (('/proc/self/status', fields), ('/proc/self/smaps_rollup', {'Pss': 'pss'})):
+        try:
+            with open(path, 'r') as file:
+                for line in file:
+                    key, _, value = line.partition(':')
+                    if key in names:
+                        memory[names[key]] = int(value.split()[0]) / 1024
+        except OSError:
+            continue
+    return memory
+
+
+class ObliviousTreeModel:
+    """
+    Лёгкий бэкенд инференса CatBoost-модели (бинарная классификация, числовые признаки).
+
+    Симметричные деревья из .cbm-файла разворачиваются в плоские массивы NumPy
+    (признак и порог каждого сплита, значения листьев), а предсказание считается
+    векторно по непрерывной float32-матрице без построения pd.DataFrame и без
+    вызова библиотеки CatBoost. Интерфейс совместим с predict_proba sklearn-обёртки.
+    """
+    # Количество строк, обрабатываемых за один проход (ограничивает промежуточную матрицу сплитов)
+    BLOCK_SIZE = 1024
+    # Массивы модели, сохраняемые в .npy (см. save/load)
+    ARRAYS = ('split_features', 'split_borders', 'leaf_offsets', 'leaf_values',
+              'nan_fill', '_flat_features', '_flat_borders')
+
+    def __init__(self, feature_names, split_features, split_borders,
+                 leaf_offsets, leaf_values, nan_fill, scale=1.0, bias=0.0):
+        """
+        - **feature_names**: признаки в порядке столбцов входной матрицы;
+        - **split_features**, **split_borders**: матрицы (количество деревьев x глубина) с признаком
+        и порогом каждого сплита; деревья меньшей глубины дополнены сплитами с порогом +inf;
+        - **leaf_offsets**: начало листьев каждого дерева в leaf_values;
+        - **leaf_values**: значения листьев всех деревьев подряд;
+        - **nan_fill**: значение, которым заменяется NaN для каждого признака (-inf или +inf);
+        - **scale**, **bias**: масштаб и сдвиг итоговой суммы
+        """
+        self.feature_names_ = list(feature_names)
+        self.split_features = np.asarray(split_features, dtype=np.int32)
+        self.split_borders = np.asarray(split_borders, dtype=np.float32)
+        self.leaf_offsets = np.asarray(leaf_offsets, dtype=np.int64)
+        self.leaf_values = np.asarray(leaf_values, dtype=np.float64)
+        self.nan_fill = np.asarray(nan_fill, dtype=np.float32)
+        self.scale = float(scale)
+        self.bias = float(bias)
+
+        # Плоские представления (сначала уровень, затем дерево) для одного прохода по всем сплитам
+        self.n_trees, self.depth = self.split_features.shape
+        self._flat_features = np.ascontiguousarray(self.split_features.T).ravel()
+        self._flat_borders = np.ascontiguousarray(self.split_borders.T).ravel()
+        self._bit_weights = (1 << np.arange(self.depth)).astype(np.uint8 if self.depth <= 8 else np.uint16)
+
+    def save(self, directory) -> str:
+        """
+        Сохранение модели в каталог: каждый массив - отдельный .npy-файл, остальное - model.json.
+        Такой каталог загружается через load отображением файлов в память.
+
+        Файлы пишутся в новый каталог версии, а directory - символическая ссылка, которая
+        атомарно переключается на него (см. versioned_directory.publish_version): путь существует
+        всё время перезаписи, загрузка видит целиком старую или новую версию
+
+        **return**: путь к каталогу модели
+        """
+        directory = str(directory)
+        version_dir = create_version(directory)
+        try:
+            for name in self.ARRAYS:
+                np.save(os.path.join(version_dir, f"{name.lstrip('_')}.npy"), getattr(self, name))
+            with open(os.path.join(version_dir, 'model.json'), 'w') as file:
+                json.dump({'feature_names': self.feature_names_, 'scale': self.scale, 'bias': self.bias}, file)
+            publish_version(directory, version_dir)
+        except BaseException:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+        return directory
+
+    @classmethod
+    def load(cls, directory, mmap: bool = True) -> 'ObliviousTreeModel':
+        """
+        Загрузка модели из каталога, сохранённого через save
+
+        ### Arguments:
+            directory: каталог модели
+            mmap(default=True): отобразить массивы в память только для чтения вместо чтения в память процесса.
+            Страницы весов берутся из page cache и общие для всех процессов (воркеров uvicorn,
+            процессов пакетного скоринга), загрузивших ту же модель
+
+        **return**: ObliviousTreeModel
+        """
+        # Все файлы читаются из одной версии, даже если save переключит ссылку во время загрузки
+        directory = os.path.realpath(str(directory))
+        with open(os.path.join(directory, 'model.json'), 'r') as file:
+            meta = json.load(file)
+
+        model = cls.__new__(cls)
+        model.feature_names_ = meta['feature_names']
+        model.scale = float(meta['scale'])
+        model.bias = float(meta['bias'])
+        for name in cls.ARRAYS:
+            path = os.path.join(directory, f"{name.lstrip('_')}.npy")
+            setattr(model, name, np.load(path, mmap_mode='r' if mmap else None))
+
+        model.n_trees, model.depth = model.split_features.shape
+        model._bit_weights = (1 << np.arange(model.depth)).astype(np.uint8 if model.depth <= 8 else np.uint16)
+        return model
+
+    @property
+    def mapped_bytes(self) -> int:
+        """Размер массивов модели, отображённых в память из файлов (0 при обычной загрузке)"""
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS
+                   if isinstance(getattr(self, name), np.memmap))
+
+    @classmethod
+    def from_catboost(cls, model) -> 'ObliviousTreeModel':
+        """Построение бэкенда из обученной CatBoost-модели (CatBoost или CatBoostClassifier)"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = os.path.join(tmp_dir, 'model.json')
+            model.save_model(json_path, format='json')
+            with open(json_path, 'r') as file:
+                model_json = json.load(file)
+
+        return cls._from_json(model_json)
+
+    @classmethod
+    def from_cbm(cls, model_path) -> 'ObliviousTreeModel':
+        """Построение бэкенда из модели в нативном формате CatBoost (.cbm)"""
+        from catboost import CatBoost
+
+        model = CatBoost()
+        model.load_model(str(model_path), format='cbm')
+        return cls.from_catboost(model)
+
+    @classmethod
+    def _from_json(cls, model_json: dict) -> 'ObliviousTreeModel':
+        features_info = model_json['features_info']
+        unsupported = [key for key, value in features_info.items() if key != 'float_features' and value]
+        loss = model_json['model_info'].get('params', {}).get('loss_function', {}).get('type')
+        if unsupported or loss not in ('Logloss', 'CrossEntropy'):
+            raise ValueError(
+                "Поддерживаются только модели бинарной классификации на числовых признаках"
+            )
+
+        float_features = sorted(features_info['float_features'], key=lambda f: f['flat_feature_index'])
+        feature_names = [f['feature_id'] or str(f['flat_feature_index']) for f in float_features]
+        nan_fill = [np.inf if f.get('nan_value_treatment') == 'AsTrue' else -np.inf for f in float_features]
+        position = {f['feature_index']: i for i, f in enumerate(float_features)}
+
+        trees = model_json['oblivious_trees']
+        depth = max((len(tree['splits']) for tree in trees), default=0)
+        split_features = np.zeros((len(trees), depth), dtype=np.int32)
+        split_borders = np.full((len(trees), depth), np.inf, dtype=np.float32)
+        leaf_offsets, leaf_values = [], []
+
+        for i, tree in enumerate(trees):
+            if len(tree['leaf_values']) != 2 ** len(tree['splits']):
+                raise ValueError("Поддерживаются только модели с одним выходом")
+            for j, split in enumerate(tree['splits']):
+                split_features[i, j] = position[split['float_feature_index']]
+                split_borders[i, j] = split['border']
+            leaf_offsets.append(len(leaf_values))
+            leaf_values.extend(tree['leaf_values'])
+
+        scale, bias = model_json.get('scale_and_bias', [1.0, [0.0]])
+        bias = bias[0] if isinstance(bias, list) else bias
+
+        return cls(feature_names, split_features, split_borders,
+                   leaf_offsets, leaf_values, nan_fill, scale, bias)
+
+    def _raw_block(self, X: np.ndarray) -> np.ndarray:
+        # Бит j индекса листа - результат j-го сплита дерева (X > порог)
+        bits = (X[:, self._flat_features] > self._flat_borders).view(np.uint8)
+        bits = bits.reshape(X.shape[0], self.depth, self.n_trees)
+        leaf_index = np.einsum('ndt,d->nt', bits, self._bit_weights)
+
+        return self.leaf_values[self.leaf_offsets + leaf_index].sum(axis=1)
+
+    def predict_raw(self, X) -> np.ndarray:
+        """Сырое значение формулы (логит) для каждой строки матрицы признаков"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if np.isnan(X).any():
+            X = np.where(np.isnan(X), self.nan_fill, X)
+
+        raw = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], self.BLOCK_SIZE):
+            raw[start:start + self.BLOCK_SIZE] = self._raw_block(X[start:start + self.BLOCK_SIZE])
+
+        return self.scale * raw + self.bias
+
+    def predict_proba(self, X) -> np.ndarray:
+        """
+        Вероятности классов в порядке [0, 1], как у CatBoostClassifier.predict_proba
+
+        ### Arguments:
+            X: float32-матрица признаков в порядке feature_names_ (или pd.DataFrame с этими столбцами)
+        """
+        if hasattr(X, 'columns'):
+            X = X[self.feature_names_].to_numpy(dtype=np.float32)
+
+        positive = 1.0 / (1.0 + np.exp(-self.predict_raw(X)))
+        return np.column_stack([1.0 - positive, positive])
@@ -0,0 +1,94 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import pandas as pd
+
+
+class PipelineProfiler:
+    """
+    Структурированные события шагов пайплайна (препроцессинг, подготовка данных).
+
+    Для каждого шага записывается событие-словарь:
+
+        {'step': 'handle_missing_values', 'wall_time_s': 0.012, 'peak_memory_mb': 1.4,
+         'rows_in': 10000, 'rows_out': 10000, 'skipped': False}
+
+    Пиковая память - прирост памяти, выделенной Python и NumPy за время шага (tracemalloc),
+    относительно памяти в начале шага. Пропущенные шаги (например, диагностические
+    в производственном режиме) записываются с skipped=True.
+    """
+    def __init__(self, trace_memory: bool = True, on_event: Optional[Callable[[dict], None]] = None):
+        """
+        - **trace_memory(default=True)**: измерять пиковую память шагов через tracemalloc
+        (замедляет выделение памяти; False - только время и строки);
+        - **on_event(default=None)**: функция, вызываемая с каждым событием (например, запись в журнал)
+        """
+        self.trace_memory = trace_memory
+        self.on_event = on_event
+        self.events = []
+        self._stack = []
+
+    def _emit(self, event: dict):
+        self.events.append(event)
+        if self.on_event is not None:
+            self.on_event(event)
+
+    @contextmanager
+    def step(self, name: str, rows_in: Optional[int] = None):
+        """
+        Измерение шага. Количество строк на выходе шаг записывает в event['rows_out']
+
+        ### Arguments:
+            name: название шага
+            rows_in(default=None): количество строк на входе шага
+
+        **return**: контекстный менеджер, возвращающий событие шага
+        """
+        event = {'step': name, 'wall_time_s': None, 'peak_memory_mb': None,
+                 'rows_in': rows_in, 'rows_out': None, 'skipped': False}
+
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            # Пик внешнего шага до начала вложенного, иначе reset_peak его потеряет
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame = {'start': current, 'peak': current}
+        else:
+            frame = None
+        self._stack.append(frame)
+
+        started = time.perf_counter()
+        try:
+            yield event
+        finally:
+            event['wall_time_s'] = time.perf_counter() - started
+            self._stack.pop()
+            if frame is not None:
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                event['peak_memory_mb'] = (peak - frame['start']) / 2 ** 20
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+                if started_tracing:
+                    tracemalloc.stop()
+            self._emit(event)
+
+    def skip(self, name: str, rows_in: Optional[int] = None):
+        """Запись пропущенного шага"""
+        self._emit({'step': name, 'wall_time_s': 0.0, 'peak_memory_mb': None,
+                    'rows_in': rows_in, 'rows_out': rows_in, 'skipped': True})
+
+    def summary(self) -> pd.DataFrame:
+        """События шагов в виде таблицы"""
+        return pd.DataFrame(self.events, columns=['step', 'wall_time_s', 'peak_memory_mb',
+                                                  'rows_in', 'rows_out', 'skipped'])
+
+    def reset(self):
+        """Очистка записанных событий"""
+        self.events = []
@@ -1,33 +1,98 @@
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Union
+import numpy as np
 import pandas as pd
 import joblib
 import yaml
-import operator
+from catboost import CatBoost
+from rule_engine import RiskFactorPlan, RecommendationPlan
+from model_manager import ModelManager
+from native_inference import ObliviousTreeModel
 
 class CustomerChurnPredictor:
-    def __init__(self, model_path: str = None):
+    # Пороги вероятности оттока (по убыванию) и соответствующие им уровни риска
+    RISK_LEVELS = [
+        (0.6, "🚨 Критический риск", "Немедленное вмешательство", "red"),
+        (0.4, "🟡 Высокий риск", "Приоритетное удержание", "orange"),
+        (0.2, "🟠 Средний риск", "Активный мониторинг", "yellow"),
+    ]
+    DEFAULT_RISK_LEVEL = ("🟢 Низкий риск", "Стандартное обслуживание", "green")
+
+    KEY_METRICS = ['NumOfProducts', 'IsActiveMember', 'Age', 'Balance']
+
+    # Модель по умолчанию для каталога models без реестра или без production-модели
+    LEGACY_MODEL_FILE = "catboost_tuned_20251010_190010.pkl"
+
+    def __init__(self, model_path: str = None, transformer_path: str = None, scaler_path: str = None,
+                 thread_count: int = -1):
         """
-        Инициализация прогнозировщика с конфигурационными файлами
+        Инициализация прогнозировщика с конфигурационными файлами.
+
+        Модель в нативном формате CatBoost (.cbm, см. ModelManager.export_native)
+        обслуживается бэкендом ObliviousTreeModel, который считает предсказания
+        по float32-матрице NumPy без построения pd.DataFrame. Каталог .trees
+        (ModelManager.export_native(export_format='trees')) загружается тем же
+        бэкендом с отображением весов в память: процессы, загрузившие одну модель,
+        используют одну копию весов из page cache.
+
+        Если model_path не указан, используется production-модель из реестра моделей
+        (см. default_model_path).
+
+        ChurnFeatureTransformer загружается из transformer_path или, если путь
+        не указан, из файла <model_file>_transformer.pkl рядом с моделью
+        (self.transformer = None, если такого файла нет).
+
+        Scaler признаков, на которых обучена модель (PrepareData.scaling), загружается
+        из scaler_path или из файла <model_file>_scaler.pkl рядом с моделью и применяется
+        только к входу модели: факторы риска и рекомендации считаются по исходным значениям
+        (self.scaler = None, если модель обучена без масштабирования).
+
+        thread_count - количество потоков CatBoost при предсказании (-1 - все ядра);
+        в пуле процессов задаётся так, чтобы процессы не делили ядра между собой
         """
         project_root = Path(__file__).parent.parent
 
         if model_path is None:
-            model_path = project_root / "models" / "catboost_tuned_20251010_190010.pkl"
+            model_path = self.default_model_path()
+
+        if str(model_path).endswith('.trees'):
+            self.model = ObliviousTreeModel.load(model_path, mmap=True)
+        elif str(model_path).endswith('.cbm'):
+            self.model = ObliviousTreeModel.from_cbm(model_path)
+        else:
+            self.model = joblib.load(model_path)
+
+        if transformer_path is None:
+            transformer_path = ModelManager.get_transformer_path(model_path)
+        self.transformer = joblib.load(transformer_path) if Path(transformer_path).exists() else None
 
-        self.model = joblib.load(model_path)
+        if scaler_path is None:
+            scaler_path = ModelManager.get_scaler_path(model_path)
+        self.scaler = joblib.load(scaler_path) if Path(scaler_path).exists() else None
+        self.thread_count = thread_count
 
         self.risk_factors_config = self._load_config(project_root / "config" / "risk_factors.yaml")
         self.recommendations_config = self._load_config(project_root / "config" / "recommendations.yaml")
 
-        self.operators = {
-            '>': operator.gt,
-            '>=': operator.ge,
-            '<': operator.lt,
-            '<=': operator.le,
-            '==': operator.eq,
-            '!=': operator.ne
-        }
+        self.risk_factor_plan = RiskFactorPlan(self.risk_factors_config)
+        self.recommendation_plan = RecommendationPlan(self.recommendations_config)
+
+    @classmethod
+    def default_model_path(cls, model_name: str = None) -> str:
+        """
+        Путь к обслуживаемой модели: production-версия model_name (или последняя
+        продвинутая в production модель) из реестра models/registry.json.
+        Если реестра или production-модели нет - LEGACY_MODEL_FILE
+        """
+        models_dir = Path(__file__).parent.parent / "models"
+
+        model_path = ModelManager(models_dir=str(models_dir)).get_production_model_path(model_name)
+        if model_path is None:
+            if model_name is not None:
+                raise KeyError(f"В реестре {models_dir} нет production-версии модели {model_name}")
+            print(f"В реестре моделей нет production-модели, используется {cls.LEGACY_MODEL_FILE}")
+            model_path = str(models_dir / cls.LEGACY_MODEL_FILE)
+        return model_path
 
     def _load_config(self, config_path: str) -> dict:
         """Загрузка конфигурационного файла"""
@@ -35,94 +100,29 @@ class CustomerChurnPredictor:
         with open(config_path, 'r', encoding='utf-8') as file:
             return yaml.safe_load(file)
 
-    def _check_condition(self, value, condition_value) -> bool:
-        """Проверка условия с поддержкой операторов"""
-        if value is None:
-            return False
-            
-        if isinstance(condition_value, str):
-            for op_symbol, op_func in self.operators.items():
-                if condition_value.startswith(op_symbol):
-                    try:
-                        compare_value = float(condition_value[len(op_symbol):])
-                        return op_func(value, compare_value)
-                    except ValueError:
-                        # Если не получается конвертировать в число, пробуем как строку
-                        return op_func(str(value), condition_value[len(op_symbol):])
-            
-            # Если нет оператора, просто сравниваем как строки
-            return str(value) == condition_value
-        else:
-            return value == condition_value
-
-    
     def analyze_risk_factors(self, customer_data: dict, probability: float) -> list:
         """
         Универсальный анализ факторов риска на основе конфига
         """
-        factors = []
-
-        for feature, config in self.risk_factors_config.get('risk_factors', {}).items():
-            value = customer_data.get(feature)
-
-            for condition in config.get('conditions', []):
-                if self._check_condition(value, condition['value']):
-                    factors.append(condition['message'])
-                    break
-            
-        return factors
+        return self.risk_factor_plan.evaluate(customer_data)
     
     def generate_recommendations(self, customer_data: dict, probability: float) -> list:
         """
         Универсальная генерация рекомендаций на основе конфига
         """
-        recommendations = []
-
-        for feature, config in self.recommendations_config.get('recommendations', {}).items():
-            if feature == 'probability':
-                continue
-
-            value = customer_data.get(feature)
-
-            for condition in config.get('conditions', []):
-                if self._check_condition(value, condition['value']):
-                    recommendations.extend(condition.get('messages', []))
-
-        prob_config = self.recommendations_config.get('recommendations', {}).get('probability', {})
-        for condition in prob_config.get('conditions', []):
-            if self._check_condition(probability, condition['value']):
-                recommendations.extend(condition.get('messages', []))
-
-        if not recommendations:
-            default_config = self.recommendations_config.get('recommendations', {}).get('default', {})
-            recommendations.extend(default_config.get('messages', []))
-            
-        return recommendations
+        return self.recommendation_plan.evaluate(customer_data, probability)
     
     def predict_churn(self, customer_data: dict) -> Dict[str, Any]:
         """
         Основной метод для предсказания оттока
         """        
-        test_data = pd.DataFrame([customer_data])
+        test_data = self.scale_features(pd.DataFrame([customer_data]))
+        if isinstance(self.model, ObliviousTreeModel):
+            test_data = test_data[self.model.feature_names_].to_numpy(dtype=np.float32)[0]
         
-        probability = self.model.predict_proba(test_data)[0, 0]
+        probability = self._predict_proba(test_data)[0, 0]
         
-        if probability > 0.6:
-            risk_level = "🚨 Критический риск"
-            action = "Немедленное вмешательство"
-            color = "red"
-        elif probability > 0.4:
-            risk_level = "🟡 Высокий риск"
-            action = "Приоритетное удержание" 
-            color = "orange"
-        elif probability > 0.2:
-            risk_level = "🟠 Средний риск"
-            action = "Активный мониторинг"
-            color = "yellow"
-        else:
-            risk_level = "🟢 Низкий риск"
-            action = "Стандартное обслуживание"
-            color = "green"
+        risk_level, action, color = self._get_risk_level(probability)
         
         risk_factors = self.analyze_risk_factors(customer_data, probability)
         
@@ -143,3 +143,149 @@ class CustomerChurnPredictor:
                 'Balance': customer_data.get('Balance', 'N/A')
             }
         }
+
+    def predict_churn_batch(self, customers: Union[List[dict], pd.DataFrame, np.ndarray],
+                            chunk_size: int = 100_000, as_frame: bool = False):
+        """
+        Пакетное предсказание оттока для множества клиентов.
+
+        Модель вызывается один раз на чанк, уровни риска, факторы риска и
+        рекомендации назначаются векторно для всего батча.
+
+        ### Arguments:
+            customers: список словарей, pd.DataFrame или матрица np.ndarray
+                (столбцы в порядке признаков модели)
+            chunk_size(default=100_000): количество клиентов в одном вызове predict_proba
+            as_frame(default=False): вернуть pd.DataFrame вместо списка словарей
+
+        **return**: результаты в порядке входных данных, в том же формате, что и predict_churn
+        """
+        data = self._to_frame(customers)
+        n_customers = len(data)
+
+        probabilities = self._predict_proba_chunked(self.scale_features(data), chunk_size)
+
+        tier_idx = self._get_risk_level_indices(probabilities)
+        tiers = self.RISK_LEVELS + [(None, *self.DEFAULT_RISK_LEVEL)]
+        levels = np.array([tier[1] for tier in tiers], dtype=object)[tier_idx]
+        actions = np.array([tier[2] for tier in tiers], dtype=object)[tier_idx]
+        colors = np.array([tier[3] for tier in tiers], dtype=object)[tier_idx]
+
+        risk_factors = self.analyze_risk_factors_batch(data)
+        recommendations = self.generate_recommendations_batch(data, probabilities)
+
+        key_metrics = {
+            name: data[name].tolist() if name in data.columns else ['N/A'] * n_customers
+            for name in self.KEY_METRICS
+        }
+
+        result = pd.DataFrame({
+            'success': np.ones(n_customers, dtype=bool),
+            'churn_probability': np.round(probabilities, 4),
+            'risk_level': levels,
+            'color': colors,
+            'recommended_action': actions,
+            'risk_factors': risk_factors,
+            'recommendations': recommendations,
+        })
+
+        if as_frame:
+            for name, values in key_metrics.items():
+                result[name] = values
+            return result
+
+        records = result.to_dict(orient='records')
+        for i, record in enumerate(records):
+            record['key_metrics'] = {name: values[i] for name, values in key_metrics.items()}
+        return records
+
+    def prepare_features(self, customers: Union[List[dict], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Векторное преобразование сырых данных клиентов (как в исходном датасете)
+        в признаки модели с помощью ChurnFeatureTransformer
+
+        **return**: pd.DataFrame с признаками модели
+        """
+        if self.transformer is None:
+            raise RuntimeError("Для модели не сохранён ChurnFeatureTransformer")
+        return self.transformer.transform(self._to_frame(customers))
+
+    def scale_features(self, features: pd.DataFrame) -> pd.DataFrame:
+        """
+        Масштабирование признаков модели scaler'ом, с которым она обучалась
+        (float32, как в PrepareData.scaling). Исходный pd.DataFrame не изменяется
+
+        **return**: pd.DataFrame с масштабированными признаками (features, если scaler'а нет)
+        """
+        if self.scaler is None:
+            return features
+
+        columns = list(self.scaler.feature_names_in_)
+        scaled = features.copy()
+        scaled[columns] = self.scaler.transform(features[columns]).astype(np.float32)
+        return scaled
+
+    def _to_frame(self, customers) -> pd.DataFrame:
+        """Приведение входных данных батча к pd.DataFrame"""
+        if isinstance(customers, pd.DataFrame):
+            return customers
+
+        if isinstance(customers, np.ndarray):
+            feature_names = getattr(self.model, 'feature_names_', None)
+            if feature_names is None or customers.ndim != 2 or customers.shape[1] != len(feature_names):
+                raise ValueError(
+                    "Матрица признаков должна быть двумерной и содержать столбцы в порядке признаков модели"
+                )
+            return pd.DataFrame(customers, columns=feature_names)
+
+        return pd.DataFrame.from_records(list(customers))
+
+    def _predict_proba_chunked(self, data: pd.DataFrame, chunk_size: int) -> np.ndarray:
+        """Вероятность оттока по чанкам: один вызов predict_proba на чанк"""
+        feature_names = getattr(self.model, 'feature_names_', None)
+        if feature_names is not None and set(feature_names).issubset(data.columns):
+            features = data[feature_names]
+        else:
+            features = data
+
+        probabilities = np.empty(len(features), dtype=np.float64)
+        for start in range(0, len(features), chunk_size):
+            chunk = features.iloc[start:start + chunk_size]
+            probabilities[start:start + len(chunk)] = self._predict_proba(chunk)[:, 0]
+
+        return probabilities
+
+    def _predict_proba(self, features):
+        """predict_proba модели с ограничением потоков для CatBoost"""
+        if isinstance(self.model, CatBoost):
+            return self.model.predict_proba(features, thread_count=self.thread_count)
+        return self.model.predict_proba(features)
+
+    def _get_risk_level(self, probability: float) -> tuple:
+        """Уровень риска, рекомендуемое действие и цвет для вероятности оттока"""
+        for threshold, risk_level, action, color in self.RISK_LEVELS:
+            if probability > threshold:
+                return risk_level, action, color
+        return self.DEFAULT_RISK_LEVEL
+
+    def _get_risk_level_indices(self, probabilities: np.ndarray) -> np.ndarray:
+        """Векторное определение индекса уровня риска (индекс len(RISK_LEVELS) - низкий риск)"""
+        conditions = [probabilities > threshold for threshold, *_ in self.RISK_LEVELS]
+        choices = list(range(len(self.RISK_LEVELS)))
+        return np.select(conditions, choices, default=len(self.RISK_LEVELS))
+
+    def analyze_risk_factors_batch(self, data: pd.DataFrame) -> list:
+        """
+        Векторный анализ факторов риска для батча клиентов
+
+        **return**: список факторов риска для каждого клиента
+        """
+        return self.risk_factor_plan.evaluate_batch(data)
+
+    def generate_recommendations_batch(self, data: pd.DataFrame, probabilities: np.ndarray) -> list:
+        """
+        Векторная генерация рекомендаций для батча клиентов
+
+        **return**: список рекомендаций для каждого клиента
+        """
+        return self.recommendation_plan.evaluate_batch(data, probabilities)
@@ -1,37 +1,86 @@
+import time
 import numpy as np
-import pandas as pd
+import pyarrow.parquet as pq
+from joblib import Parallel, delayed
+from chunked_io import ParquetChunkWriter, read_chunks
+from pipeline_profiler import PipelineProfiler
+from feature_transformer import (ChurnFeatureTransformer, ChurnStatistics, TECHNICAL_COLUMNS,
+                                 add_engineered_features, apply_dtype_plan)
 
 class ProprocessingData:
-    def __init__(self, df):
+    # Шаги preprocessing(): (метод, диагностический ли шаг)
+    STEPS = [
+        ('fit_transformer', False),
+        ('handle_missing_values', False),
+        ('remove_technical_columns', False),
+        ('handle_outliers_robust', False),
+        ('create_new_features', False),
+        ('check_new_features_correlation', True),
+        ('encode_categorical_features', False)
+    ]
+
+    def __init__(self, df, sketch_k=None, diagnostics=True, profiler=None):
         """
         Класс предназначен для обработки пропусков, удаления технических столбцов,
         генерации новых фичей и обработки категориальных признаков.
 
+        Статистики (медианы, мода, границы выбросов, категории) выучиваются
+        ChurnFeatureTransformer по исходному датасету и доступны в self.transformer,
+        чтобы те же преобразования применялись в API.
+
         Arguments:
             df: датасет, который мы будем обрабатывать 
+            sketch_k(default=None): считать медианы и квантили по KLL-скетчам с этим
+            параметром точности за один проход без сортировки столбцов (None - точно)
+            diagnostics(default=True): печатать таблицы пропусков, ход обработки и выполнять
+            диагностические шаги (корреляции новых признаков). False - производственный режим:
+            диагностические шаги пропускаются, вывод отключён
+            profiler(default=None): PipelineProfiler для событий шагов (время, пиковая память,
+            количество строк); по умолчанию создаётся новый (пиковая память через tracemalloc
+            измеряется только при diagnostics=True), события доступны в self.profiler
         """
         self.df = df.copy()
+        self.sketch_k = sketch_k
+        self.diagnostics = diagnostics
+        self.profiler = profiler if profiler is not None else PipelineProfiler(trace_memory=diagnostics)
+        self.transformer = ChurnFeatureTransformer()
+
+    def fit_transformer(self):
+        """
+        Обучение ChurnFeatureTransformer на текущем датасете
+
+        **return**: обученный transformer
+        """
+        self.transformer.fit_statistics(ChurnStatistics(sketch_k=self.sketch_k).update(self.df))
+        return self.transformer
+
+    def _print(self, *args):
+        if self.diagnostics:
+            print(*args)
+
+    def _fitted_transformer(self):
+        if not hasattr(self.transformer, 'feature_names_out_'):
+            self.fit_transformer()
+        return self.transformer
     
     def handle_missing_values(self):
         """
         Метод для обработки пропусков в датасете (с помощью медианы и моды)
         """
-        print("Пропуски до обработки:\n")
-        print(self.df.isna().sum())
-                
-        categorical_col = 'Geography'
-        mode_val = self.df[categorical_col].mode()[0]
-        self.df[categorical_col] = self.df[categorical_col].fillna(mode_val)
-        print(f"\nЗаполнены пропуски в {categorical_col} значением: {mode_val}")
-        
-        numerical_col = ['Age', 'HasCrCard', 'IsActiveMember']
-        for col in numerical_col:
-            median_val = self.df[col].median()
-            self.df[col] = self.df[col].fillna(median_val)
-            print(f"Заполнены пропуски в {col} значением: {median_val}")
-        
-        print("\nПропуски после обработки:")
-        print(self.df.isnull().sum())
+        if self.diagnostics:
+            print("Пропуски до обработки:\n")
+            print(self.df.isna().sum())
+
+        transformer = self._fitted_transformer()
+        transformer.fill_missing(self.df)
+
+        if self.diagnostics:
+            print(f"\nЗаполнены пропуски в Geography значением: {transformer.geography_mode_}")
+            for col, median_val in transformer.fill_values_.items():
+                print(f"Заполнены пропуски в {col} значением: {median_val}")
+
+            print("\nПропуски после обработки:")
+            print(self.df.isnull().sum())
         
         return self.df
 
@@ -39,12 +88,12 @@ class ProprocessingData:
         """
         Метод для удаления технических столбцов
         """
-        columns_to_drop = ['RowNumber', 'CustomerId', 'Surname']
+        columns_to_drop = TECHNICAL_COLUMNS
         
         self.df = self.df.drop(columns=columns_to_drop)
         
-        print(f"\nУдалены столбцы: {columns_to_drop}")
-        print(f"Оставшееся количество признаков: {self.df.shape[1]}")
+        self._print(f"\nУдалены столбцы: {columns_to_drop}")
+        self._print(f"Оставшееся количество признаков: {self.df.shape[1]}")
         
         return self.df
 
@@ -52,17 +101,7 @@ class ProprocessingData:
         """
         Метод для обработки выбросов
         """
-        df_clean = self.df
-        
-        lower_bound = df_clean['Age'].quantile(0.01)
-        upper_bound = df_clean['Age'].quantile(0.99)
-        
-        df_clean['Age'] = np.clip(df_clean['Age'], lower_bound, upper_bound)
-        
-        balance_upper = df_clean['Balance'].quantile(0.99)
-        df_clean['Balance'] = np.clip(df_clean['Balance'], 0, balance_upper)
-
-        self.df = df_clean
+        self._fitted_transformer().clip_outliers(self.df)
         
         return self.df
 
@@ -71,35 +110,20 @@ class ProprocessingData:
         """
         Метод для создания новых фичей
         """
-        print("\nСоздание новых признаков...")
-        
-        self.df['Is_Senior_Active'] = ((self.df['Age'] > 40) & 
-                                    (self.df['IsActiveMember'] == 1)).astype(int)
-        
-        self.df['Active_With_Multiple_Products'] = ((self.df['IsActiveMember'] == 1) & 
-                                                (self.df['NumOfProducts'] > 1)).astype(int)
-        
-        self.df['Value_Client'] = ((self.df['Balance'] > self.df['Balance'].median()) &
-                                (self.df['NumOfProducts'] >= 2)).astype(int)
-                
-        self.df['New_HighRisk'] = ((self.df['Tenure'] < 2) & 
-                                (self.df['NumOfProducts'] == 1)).astype(int)
-        
-        self.df['German_Female_Risk'] = ((self.df['Geography'] == 'Germany') & 
-                                        (self.df['Gender'] == 'Female')).astype(int)
+        self._print("\nСоздание новых признаков...")
         
-        self.df['AgeGroup'] = pd.cut(self.df['Age'], 
-                                    bins=[0, 30, 40, 50, 60, 100],
-                                    labels=['18-30', '31-40', '41-50', '51-60', '60+'])
+        add_engineered_features(self.df, self._fitted_transformer().balance_median_)
         
-        print("   Созданы: Is_Senior_Active, Active_With_Multiple_Products, Value_Client")
-        print("   New_HighRisk, German_Female_Risk, AgeGroup")
+        self._print("   Созданы: Is_Senior_Active, Active_With_Multiple_Products, Value_Client")
+        self._print("   New_HighRisk, German_Female_Risk, AgeGroup")
         return self.df
 
 
     def check_new_features_correlation(self):
         """
-        Метод для проверки корреляции новых признаков с другими признаками
+        Метод для проверки корреляции новых признаков с другими признаками.
+        Диагностический шаг: ранговая корреляция Спирмена сортирует каждый числовой
+        столбец, поэтому в производственном режиме (diagnostics=False) preprocessing() его пропускает
         """
         numeric_cols = self.df.select_dtypes(include=[np.number]).columns.tolist()
         
@@ -121,31 +145,136 @@ class ProprocessingData:
 
     def encode_categorical_features(self):
         """
-        Метод для преобразования категориальных признаков в числовые
+        Метод для преобразования категориальных признаков в числовые и приведения
+        признаков к компактным типам (флаги и one-hot - uint8, целочисленные - int16,
+        денежные - float32, см. apply_dtype_plan)
         """
-        geography_dummies = pd.get_dummies(self.df['Geography'], prefix='Geo').astype('int32')
-        self.df = pd.concat([self.df, geography_dummies], axis=1)
+        transformer = self._fitted_transformer()
+        transformer.encode_categorical(self.df)
         
-        self.df['Gender'] = self.df['Gender'].map({"Female": 0, "Male": 1})
+        self.df = self.df[[col for col in transformer.columns_out_ if col in self.df.columns]]
         
-        age_dummies = pd.get_dummies(self.df['AgeGroup'], prefix='AgeGroup').astype('int32')
-        self.df = pd.concat([self.df, age_dummies], axis=1)
-        
-        self.df = self.df.drop(['Geography', 'AgeGroup'], axis=1)
-        
-        print("\nЗакодированы категориальные признаки!")
+        self._print("\nЗакодированы категориальные признаки!")
+
+        if self.diagnostics:
+            memory_before = self.df.memory_usage(deep=True).sum() / 2 ** 20
+        self.df = apply_dtype_plan(self.df.copy(), transformer)
+        if self.diagnostics:
+            memory_after = self.df.memory_usage(deep=True).sum() / 2 ** 20
+            print(f"Типы признаков приведены к компактным: {memory_before:.2f} МБ -> {memory_after:.2f} МБ")
         
         return self.df
     
     def preprocessing(self):
         """
-        Препроцессинг. Последовательное применение методов, написанных выше
+        Препроцессинг. Последовательное применение методов, написанных выше (STEPS).
+        Для каждого шага в self.profiler записывается событие; диагностические шаги
+        при diagnostics=False пропускаются
         """
-        self.handle_missing_values()
-        self.remove_technical_columns()
-        self.handle_outliers_robust()
-        self.create_new_features()
-        self.check_new_features_correlation()
-        self.encode_categorical_features()
-        print("\nПредобработка завершена!")
+        for name, diagnostic in self.STEPS:
+            if diagnostic and not self.diagnostics:
+                self.profiler.skip(name, rows_in=len(self.df))
+                continue
+            with self.profiler.step(name, rows_in=len(self.df)) as event:
+                getattr(self, name)()
+                event['rows_out'] = len(self.df)
+        self._print("\nПредобработка завершена!")
         return self.df
+
+    @staticmethod
+    def _row_group_statistics(input_path, row_groups, sketch_k, random_state):
+        """Статистики группы row group'ов Parquet-файла (выполняется в процессе пула)"""
+        parquet_file = pq.ParquetFile(input_path)
+        statistics = ChurnStatistics(sketch_k=sketch_k, random_state=random_state)
+        for row_group in row_groups:
+            statistics.update(parquet_file.read_row_group(row_group).to_pandas())
+        return statistics
+
+    @staticmethod
+    def collect_statistics(input_path, chunk_size=100_000, sketch_k=2000, n_jobs=1):
+        """
+        Статистики для обучения ChurnFeatureTransformer за один проход по файлу.
+        Parquet-файл делится по row group'ам между n_jobs процессами, статистики
+        процессов объединяются (ChurnStatistics.merge). CSV читается последовательно чанками.
+
+        ### Arguments:
+            input_path: путь к CSV или Parquet с сырыми данными
+            chunk_size(default=100_000): количество строк в чанке CSV
+            sketch_k(default=2000): параметр точности KLL-скетчей (None - точные статистики)
+            n_jobs(default=1): количество процессов для Parquet
+
+        **return**: ChurnStatistics
+        """
+        input_path = str(input_path)
+        if input_path.endswith('.parquet') and n_jobs != 1:
+            n_row_groups = pq.ParquetFile(input_path).num_row_groups
+            parts = [part.tolist() for part in np.array_split(np.arange(n_row_groups), n_jobs) if len(part)]
+            results = Parallel(n_jobs=n_jobs)(
+                delayed(ProprocessingData._row_group_statistics)(input_path, part, sketch_k, 42 + i)
+                for i, part in enumerate(parts)
+            )
+            statistics = results[0]
+            for part_statistics in results[1:]:
+                statistics.merge(part_statistics)
+            return statistics
+
+        statistics = ChurnStatistics(sketch_k=sketch_k)
+        for chunk in read_chunks(input_path, chunk_size):
+            statistics.update(chunk)
+        return statistics
+
+    @staticmethod
+    def preprocess_file(input_path, output_path, chunk_size=100_000, sketch_k=2000, n_jobs=1, statistics=None,
+                        profiler=None, diagnostics=True):
+        """
+        Потоковый препроцессинг файла, который не помещается в память, в два прохода:
+
+            1. по чанкам накапливаются статистики (частоты Geography, KLL-скетчи для медиан
+            и квантилей 1%/99%), по ним обучается ChurnFeatureTransformer;
+            2. каждый чанк преобразуется обученным transformer'ом и дописывается в Parquet.
+
+        Одновременно в памяти находится один чанк и скетчи статистик, поэтому
+        потребление памяти не зависит от размера файла. Проверка корреляций новых
+        признаков в этом режиме не выполняется.
+
+        ### Arguments:
+            input_path: путь к CSV или Parquet с сырыми данными
+            output_path: путь к выходному Parquet-файлу
+            chunk_size(default=100_000): количество строк в чанке
+            sketch_k(default=2000): параметр точности KLL-скетчей (None - точные статистики, как в preprocessing())
+            n_jobs(default=1): количество процессов для первого прохода по Parquet
+            statistics(default=None): накопленные ранее статистики (например, по истории до нового
+            дневного инкремента), к которым добавляются статистики файла; история повторно не читается,
+            переданный объект не изменяется
+            profiler(default=None): PipelineProfiler для событий проходов ('collect_statistics', 'transform_file')
+            (по умолчанию - без измерения памяти tracemalloc)
+            diagnostics(default=True): печатать ход проходов; False - производственный режим без вывода
+            (время проходов остаётся в событиях profiler)
+
+        **return**: обученный ChurnFeatureTransformer и статистики, по которым он обучен (новый объект)
+        """
+        profiler = profiler if profiler is not None else PipelineProfiler(trace_memory=False)
+        started = time.perf_counter()
+
+        with profiler.step('collect_statistics') as event:
+            file_statistics = ProprocessingData.collect_statistics(input_path, chunk_size, sketch_k, n_jobs)
+            if statistics is not None:
+                statistics = statistics.copy().merge(file_statistics)
+            else:
+                statistics = file_statistics
+            transformer = ChurnFeatureTransformer().fit_statistics(statistics)
+            event['rows_in'] = event['rows_out'] = file_statistics.n_rows
+        if diagnostics:
+            print(f"Проход 1: статистики собраны по {file_statistics.n_rows} строкам "
+                  f"за {time.perf_counter() - started:.1f} сек (всего в статистиках {statistics.n_rows} строк)")
+
+        with profiler.step('transform_file', rows_in=file_statistics.n_rows) as event, \
+                ParquetChunkWriter(output_path) as writer:
+            for chunk in read_chunks(input_path, chunk_size):
+                writer.write(transformer.transform(chunk))
+            event['rows_out'] = writer.rows_written
+        if diagnostics:
+            print(f"Проход 2: преобразовано {writer.rows_written} строк, результат: {output_path} "
+                  f"({time.perf_counter() - started:.1f} сек)")
+
+        return transformer, statistics
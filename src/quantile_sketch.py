@@ -0,0 +1,166 @@
+import copy
+import math
+
+import numpy as np
+
+
+class KLLSketch:
+    """
+    KLL-скетч для приближённых квантилей числового столбца за один потоковый проход.
+
+    Значения хранятся в уровнях-компакторах: элемент уровня h представляет 2^h
+    исходных значений. Когда уровень переполняется, он сортируется, и каждый второй
+    элемент (со случайным сдвигом) переходит на уровень выше. Вместимость уровней
+    убывает геометрически от верхнего к нижнему, поэтому память - O(k) значений
+    независимо от количества строк, а ошибка ранга квантиля - порядка 1.7 / k
+    от количества значений (k=2000 - около 0.1%).
+
+    Скетчи, построенные по разным частям данных (чанки, процессы, дневные
+    инкременты), объединяются через merge с той же гарантией ошибки, поэтому
+    квантили по всей истории не требуют повторного прохода по данным.
+
+    Пока ни один уровень не сжимался (значений меньше k), скетч хранит все значения,
+    и quantile совпадает с pd.Series.quantile (линейная интерполяция). При k=None
+    скетч никогда не сжимается и всегда считает точные квантили.
+    """
+    C = 2 / 3
+
+    def __init__(self, k=2000, random_state=42):
+        """
+        - **k(default=2000)**: вместимость верхнего уровня, определяет точность и память (None - точный режим);
+        - **random_state(default=42)**: сид случайных сдвигов при сжатии
+        """
+        self.k = k
+        self.n = 0
+        self.n_nan = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(random_state)
+
+    @property
+    def exact(self) -> bool:
+        """Скетч хранит все значения (сжатий не было)"""
+        return len(self.levels) == 1
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * self.C ** depth)), 2)
+
+    def update(self, values) -> 'KLLSketch':
+        """
+        Добавление значений (NaN не учитываются в квантилях и считаются в n_nan)
+
+        **return**: self
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        nan_mask = np.isnan(values)
+        if nan_mask.any():
+            self.n_nan += int(nan_mask.sum())
+            values = values[~nan_mask]
+
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def update_weighted(self, value: float, weight: int) -> 'KLLSketch':
+        """
+        Добавление weight копий значения value за O(log weight)
+        (копия помещается на уровень h для каждого единичного бита weight)
+
+        **return**: self
+        """
+        weight = int(weight)
+        if weight <= 0:
+            return self
+        if self.k is None:
+            return self.update(np.full(weight, value, dtype=np.float64))
+
+        self.n += weight
+        level = 0
+        while weight:
+            if weight & 1:
+                while len(self.levels) <= level:
+                    self.levels.append(np.empty(0))
+                self.levels[level] = np.append(self.levels[level], value)
+            weight >>= 1
+            level += 1
+        self._compress()
+        return self
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """
+        Объединение со скетчем другой части данных (other не изменяется)
+
+        **return**: self
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+
+        self.n += other.n
+        self.n_nan += other.n_nan
+        self._compress()
+        return self
+
+    def _compress(self):
+        if self.k is None:
+            return
+
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # При нечётном количестве один элемент остаётся на уровне
+                keep = items[:len(items) % 2]
+                promoted = items[len(keep) + self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def _weighted_items(self):
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        return values[order], weights[order]
+
+    def quantile(self, q):
+        """
+        Приближённый квантиль (или массив квантилей для массива q)
+
+        **return**: значение квантиля (NaN для пустого скетча)
+        """
+        if self.n == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else float('nan')
+        if self.exact:
+            result = np.quantile(self.levels[0], q)
+            return result if np.ndim(q) else float(result)
+
+        values, weights = self._weighted_items()
+        cumulative = np.cumsum(weights)
+        index = np.searchsorted(cumulative, np.asarray(q) * cumulative[-1], side='left')
+        result = values[np.minimum(index, len(values) - 1)]
+        return result if np.ndim(q) else float(result)
+
+    def rank(self, value: float) -> float:
+        """Приближённая доля значений, не превосходящих value"""
+        if self.n == 0:
+            return float('nan')
+        values, weights = self._weighted_items()
+        return float(weights[:np.searchsorted(values, value, side='right')].sum() / weights.sum())
+
+    def copy(self) -> 'KLLSketch':
+        """Независимая копия скетча (состояние генератора копируется, исходный скетч не изменяется)"""
+        sketch = KLLSketch(self.k)
+        sketch.n, sketch.n_nan = self.n, self.n_nan
+        sketch.levels = [items.copy() for items in self.levels]
+        sketch._rng = copy.deepcopy(self._rng)
+        return sketch
+
+    @property
+    def size(self) -> int:
+        """Количество хранимых значений"""
+        return sum(len(items) for items in self.levels)
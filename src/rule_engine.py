@@ -0,0 +1,238 @@
+import operator
+from typing import Any, Callable, List
+
+import numpy as np
+import pandas as pd
+
+# Операторы упорядочены по длине, чтобы ">=3" не распознавался как ">" и "=3"
+OPERATORS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt
+}
+
+
+class CompiledCondition:
+    """
+    Условие из конфига, разобранное один раз при загрузке.
+
+    Строки вида ">=3" превращаются в оператор и числовой порог, остальные значения
+    сравниваются на равенство (числа - как числа, строки - как строки).
+    """
+    __slots__ = ('raw', 'op', 'threshold', 'numeric')
+
+    def __init__(self, raw: Any, op: Callable, threshold: Any, numeric: bool):
+        self.raw = raw
+        self.op = op
+        self.threshold = threshold
+        self.numeric = numeric
+
+    @classmethod
+    def compile(cls, condition_value: Any) -> 'CompiledCondition':
+        """Разбор значения условия из конфига"""
+        if isinstance(condition_value, str):
+            for op_symbol, op_func in OPERATORS.items():
+                if condition_value.startswith(op_symbol):
+                    raw_threshold = condition_value[len(op_symbol):].strip()
+                    try:
+                        return cls(condition_value, op_func, float(raw_threshold), True)
+                    except ValueError:
+                        return cls(condition_value, op_func, raw_threshold, False)
+
+            return cls(condition_value, operator.eq, condition_value, False)
+
+        if isinstance(condition_value, (int, float, np.number)):
+            return cls(condition_value, operator.eq, float(condition_value), True)
+
+        return cls(condition_value, operator.eq, condition_value, False)
+
+    def evaluate(self, value: Any) -> bool:
+        """Проверка условия для одного значения"""
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return False
+
+        if self.numeric:
+            try:
+                return bool(self.op(float(value), self.threshold))
+            except (TypeError, ValueError):
+                return False
+
+        return bool(self.op(str(value), self.threshold))
+
+    def mask(self, column: 'FeatureColumn') -> np.ndarray:
+        """Векторная проверка условия для столбца батча"""
+        if self.numeric:
+            values = column.numeric
+            with np.errstate(invalid='ignore'):
+                return column.present & self.op(values, self.threshold)
+
+        return column.present & self.op(column.strings, self.threshold)
+
+
+class FeatureColumn:
+    """
+    Столбец признака батча с лениво вычисляемыми числовым и строковым представлениями,
+    чтобы все условия одного признака использовали одно преобразование
+    """
+    def __init__(self, values: Any, n_rows: int):
+        if values is None:
+            self._series = None
+            self.present = np.zeros(n_rows, dtype=bool)
+        else:
+            self._series = values if isinstance(values, pd.Series) else pd.Series(values)
+            self.present = self._series.notna().to_numpy()
+        self.n_rows = n_rows
+        self._numeric = None
+        self._strings = None
+
+    @property
+    def numeric(self) -> np.ndarray:
+        if self._numeric is None:
+            if self._series is None:
+                self._numeric = np.full(self.n_rows, np.nan)
+            elif pd.api.types.is_numeric_dtype(self._series) and not pd.api.types.is_bool_dtype(self._series):
+                self._numeric = self._series.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                self._numeric = pd.to_numeric(self._series, errors='coerce').to_numpy(dtype=np.float64)
+        return self._numeric
+
+    @property
+    def strings(self) -> np.ndarray:
+        if self._strings is None:
+            if self._series is None:
+                self._strings = np.full(self.n_rows, '', dtype=object)
+            else:
+                self._strings = self._series.astype(str).to_numpy(dtype=object)
+        return self._strings
+
+
+def _messages_by_combination(codes: np.ndarray, build_messages: Callable) -> List[list]:
+    """
+    Сборка списков сообщений по уникальным комбинациям сработавших условий
+    (строкам codes), чтобы не формировать список отдельно для каждого клиента.
+
+    Каждый клиент получает собственную копию списка, поэтому изменение результата
+    одного клиента не затрагивает остальных.
+    """
+    _, first_rows, inverse = np.unique(codes, axis=0, return_index=True, return_inverse=True)
+    messages = [build_messages(codes[row]) for row in first_rows]
+    return [list(messages[i]) for i in inverse.ravel().tolist()]
+
+
+def _feature_column(data: pd.DataFrame, feature: str) -> FeatureColumn:
+    return FeatureColumn(data[feature] if feature in data.columns else None, len(data))
+
+
+class RiskFactorPlan:
+    """
+    План вычисления факторов риска (config/risk_factors.yaml).
+
+    Для каждого признака срабатывает первое выполненное условие.
+    """
+    def __init__(self, config: dict):
+        """
+        - **config**: содержимое risk_factors.yaml
+        """
+        self.rules = [
+            (feature, [(CompiledCondition.compile(condition['value']), condition['message'])
+                       for condition in feature_config.get('conditions', [])])
+            for feature, feature_config in config.get('risk_factors', {}).items()
+        ]
+
+    def evaluate(self, customer_data: dict) -> list:
+        """Факторы риска одного клиента"""
+        factors = []
+        for feature, conditions in self.rules:
+            value = customer_data.get(feature)
+            for condition, message in conditions:
+                if condition.evaluate(value):
+                    factors.append(message)
+                    break
+        return factors
+
+    def evaluate_batch(self, data: pd.DataFrame) -> list:
+        """Факторы риска для каждого клиента батча"""
+        # codes[i, j] - номер сработавшего условия признака j плюс один (0 - ни одно не сработало)
+        codes = np.zeros((len(data), len(self.rules)), dtype=np.int64)
+
+        for j, (feature, conditions) in enumerate(self.rules):
+            column = _feature_column(data, feature)
+            unmatched = np.ones(len(data), dtype=bool)
+            for k, (condition, _) in enumerate(conditions):
+                hit = unmatched & condition.mask(column)
+                codes[hit, j] = k + 1
+                unmatched &= ~hit
+
+        def build_messages(combination):
+            return [self.rules[j][1][k - 1][1] for j, k in enumerate(combination) if k > 0]
+
+        return _messages_by_combination(codes, build_messages)
+
+
+class RecommendationPlan:
+    """
+    План генерации рекомендаций (config/recommendations.yaml).
+
+    Срабатывают все выполненные условия признаков и вероятности оттока, если
+    ни одно не выполнено - возвращаются рекомендации по умолчанию.
+    """
+    def __init__(self, config: dict):
+        """
+        - **config**: содержимое recommendations.yaml
+        """
+        recommendations = config.get('recommendations', {})
+
+        self.rules = [
+            (feature, CompiledCondition.compile(condition['value']), condition.get('messages', []))
+            for feature, feature_config in recommendations.items()
+            if feature not in ('probability', 'default')
+            for condition in feature_config.get('conditions', [])
+        ]
+        self.probability_rules = [
+            (CompiledCondition.compile(condition['value']), condition.get('messages', []))
+            for condition in recommendations.get('probability', {}).get('conditions', [])
+        ]
+        self.default_messages = recommendations.get('default', {}).get('messages', [])
+
+    def evaluate(self, customer_data: dict, probability: float) -> list:
+        """Рекомендации для одного клиента"""
+        recommendations = []
+
+        for feature, condition, messages in self.rules:
+            if condition.evaluate(customer_data.get(feature)):
+                recommendations.extend(messages)
+
+        for condition, messages in self.probability_rules:
+            if condition.evaluate(probability):
+                recommendations.extend(messages)
+
+        if not recommendations:
+            recommendations.extend(self.default_messages)
+
+        return recommendations
+
+    def evaluate_batch(self, data: pd.DataFrame, probabilities: np.ndarray) -> list:
+        """Рекомендации для каждого клиента батча"""
+        all_messages = [messages for _, _, messages in self.rules]
+        all_messages += [messages for _, messages in self.probability_rules]
+        codes = np.zeros((len(data), len(all_messages)), dtype=np.int64)
+
+        columns = {}
+        for i, (feature, condition, _) in enumerate(self.rules):
+            if feature not in columns:
+                columns[feature] = _feature_column(data, feature)
+            codes[:, i] = condition.mask(columns[feature])
+
+        probability_column = FeatureColumn(np.asarray(probabilities, dtype=np.float64), len(data))
+        for i, (condition, _) in enumerate(self.probability_rules, start=len(self.rules)):
+            codes[:, i] = condition.mask(probability_column)
+
+        def build_messages(combination):
+            messages = [message for i, matched in enumerate(combination) if matched
+                        for message in all_messages[i]]
+            return messages or list(self.default_messages)
+
+        return _messages_by_combination(codes, build_messages)
@@ -0,0 +1,139 @@
+"""
+Пакетный скоринг файла с сырыми данными клиентов.
+
+Файл CSV или Parquet читается чанками, каждый чанк проходит предобработку
+(ChurnFeatureTransformer модели) и скоринг в пуле процессов, результаты
+потоково пишутся в Parquet. В работе одновременно не больше 2 * workers
+чанков, поэтому память не зависит от размера входного файла.
+
+Пример запуска:
+
+    python src/score_file.py data/customers.parquet reports/scores.parquet --workers 8
+"""
+import argparse
+import os
+import time
+from collections import deque
+from multiprocessing import Pool
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from threadpoolctl import threadpool_limits
+
+from chunked_io import ParquetChunkWriter, read_chunks
+from predict_churn import CustomerChurnPredictor
+
+OUTPUT_COLUMNS = ['churn_probability', 'risk_level', 'recommended_action', 'risk_factors', 'recommendations']
+
+# Схема результатов: списки объявлены явно, иначе чанк, в котором у всех клиентов
+# нет факторов риска, задал бы тип list<null> для всего файла
+OUTPUT_SCHEMA = pa.schema([
+    ('churn_probability', pa.float64()),
+    ('risk_level', pa.string()),
+    ('recommended_action', pa.string()),
+    ('risk_factors', pa.list_(pa.string())),
+    ('recommendations', pa.list_(pa.string()))
+])
+
+_worker_predictor = None
+
+
+def _init_worker(model_path, transformer_path, scaler_path, thread_count):
+    """
+    Загрузка модели один раз на процесс пула. Модель и библиотеки OpenMP/BLAS процесса
+    ограничиваются thread_count потоками, чтобы процессы пула не делили ядра между собой
+    """
+    global _worker_predictor
+    threadpool_limits(limits=thread_count)
+    _worker_predictor = CustomerChurnPredictor(model_path=model_path, transformer_path=transformer_path,
+                                               scaler_path=scaler_path, thread_count=thread_count)
+
+
+def _output_schema(input_path: str, id_column: str) -> pa.Schema:
+    """Схема выходного файла; тип столбца-идентификатора известен заранее только для Parquet"""
+    if str(input_path).endswith('.parquet'):
+        input_schema = pq.read_schema(input_path)
+        if id_column in input_schema.names:
+            return pa.schema([input_schema.field(id_column)] + list(OUTPUT_SCHEMA))
+    return OUTPUT_SCHEMA
+
+
+def _score_chunk(chunk: pd.DataFrame, id_column: str) -> pd.DataFrame:
+    """Предобработка и скоринг одного чанка в процессе пула"""
+    features = _worker_predictor.prepare_features(chunk)
+    result = _worker_predictor.predict_churn_batch(features, chunk_size=len(chunk), as_frame=True)[OUTPUT_COLUMNS]
+
+    if id_column in chunk.columns:
+        result.insert(0, id_column, chunk[id_column].to_numpy())
+    return result
+
+
+def score_file(input_path: str, output_path: str, model_path: str = None, transformer_path: str = None,
+               chunk_size: int = 100_000, workers: int = None, id_column: str = 'CustomerId',
+               scaler_path: str = None) -> int:
+    """
+    Скоринг файла клиентов с записью результатов в Parquet
+
+    ### Arguments:
+        input_path: путь к CSV или Parquet с сырыми данными клиентов
+        output_path: путь к выходному Parquet-файлу
+        model_path(default=None): путь к модели (по умолчанию - модель CustomerChurnPredictor)
+        transformer_path(default=None): путь к ChurnFeatureTransformer (по умолчанию - рядом с моделью)
+        chunk_size(default=100_000): количество строк в чанке
+        workers(default=None): количество процессов (по умолчанию - количество ядер)
+        id_column(default='CustomerId'): столбец-идентификатор, который переносится в результат
+        scaler_path(default=None): путь к scaler'у признаков модели (по умолчанию - рядом с моделью)
+
+    **return**: количество обработанных строк
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = 2 * workers
+    thread_count = max((os.cpu_count() or 1) // workers, 1)
+
+    writer = ParquetChunkWriter(output_path, schema=_output_schema(input_path, id_column))
+    started = time.perf_counter()
+
+    def write(result: pd.DataFrame):
+        writer.write(result)
+        elapsed = time.perf_counter() - started
+        print(f"Обработано {writer.rows_written} строк, {writer.rows_written / elapsed:,.0f} строк/сек")
+
+    with Pool(workers, initializer=_init_worker, initargs=(model_path, transformer_path, scaler_path, thread_count)) as pool, writer:
+        in_flight = deque()
+        for chunk in read_chunks(input_path, chunk_size):
+            if chunk.empty:
+                continue
+            in_flight.append(pool.apply_async(_score_chunk, (chunk, id_column)))
+            if len(in_flight) >= max_in_flight:
+                write(in_flight.popleft().get())
+
+        while in_flight:
+            write(in_flight.popleft().get())
+
+    rows_done = writer.rows_written
+    elapsed = time.perf_counter() - started
+    print(f"\nГотово: {rows_done} строк за {elapsed:.1f} сек "
+          f"({rows_done / max(elapsed, 1e-9):,.0f} строк/сек). Результаты: {output_path}")
+    return rows_done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный скоринг оттока клиентов из CSV/Parquet в Parquet")
+    parser.add_argument('input_path', help="CSV или Parquet с сырыми данными клиентов")
+    parser.add_argument('output_path', help="выходной Parquet-файл")
+    parser.add_argument('--model', dest='model_path', default=None, help="путь к модели (.pkl или .cbm)")
+    parser.add_argument('--transformer', dest='transformer_path', default=None,
+                        help="путь к ChurnFeatureTransformer (по умолчанию - рядом с моделью)")
+    parser.add_argument('--scaler', dest='scaler_path', default=None,
+                        help="путь к scaler'у признаков модели (по умолчанию - рядом с моделью)")
+    parser.add_argument('--chunk-size', type=int, default=100_000, help="строк в чанке")
+    parser.add_argument('--workers', type=int, default=None, help="количество процессов")
+    parser.add_argument('--id-column', default='CustomerId', help="столбец-идентификатор клиента")
+    args = parser.parse_args()
+
+    score_file(**vars(args))
+
+
+if __name__ == '__main__':
+    main()
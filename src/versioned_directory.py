@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+
+
+def create_version(directory) -> str:
+    """
+    Новый пустой каталог версии .<имя>.v* рядом с directory, в который записывается
+    содержимое перед публикацией через publish_version
+
+    **return**: путь к каталогу версии
+    """
+    parent, name = os.path.split(os.path.abspath(str(directory)))
+    os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(dir=parent, prefix=f'.{name}.v')
+
+
+def publish_version(directory, version_dir):
+    """
+    Атомарное переключение directory на каталог версии version_dir (см. create_version).
+
+    directory - символическая ссылка на каталог версии, которая заменяется через os.replace:
+    путь существует всё время замены, а читатели видят целиком старую или новую версию.
+    Каталог directory без версий (сохранённый раньше) переименовывается в версию: при этой
+    однократной миграции каталог нельзя атомарно заменить ссылкой, и между переименованием
+    и созданием ссылки путь ненадолго отсутствует.
+    Предыдущая версия остаётся для уже начатых чтений, более старые удаляются
+
+    ### Arguments:
+        directory: путь, по которому читатели открывают содержимое
+        version_dir: полностью записанный каталог версии
+    """
+    path = os.path.abspath(str(directory))
+    parent, name = os.path.split(path)
+    version_prefix = f'.{name}.v'
+    link_tmp = os.path.join(parent, f'.{name}.link_{os.getpid()}')
+
+    if os.path.lexists(link_tmp):
+        os.remove(link_tmp)
+    os.symlink(os.path.basename(version_dir), link_tmp)
+
+    legacy_dir = None
+    try:
+        if os.path.islink(path):
+            previous = os.path.basename(os.readlink(path))
+        elif os.path.isdir(path):
+            # Каталог без версий переименовывается в версию на месте пустого каталога
+            legacy_dir = tempfile.mkdtemp(dir=parent, prefix=version_prefix)
+            os.replace(path, legacy_dir)
+            previous = os.path.basename(legacy_dir)
+        else:
+            previous = None
+        os.replace(link_tmp, path)
+    except BaseException:
+        if os.path.lexists(link_tmp):
+            os.remove(link_tmp)
+        if legacy_dir is not None and not os.path.lexists(path):
+            os.replace(legacy_dir, path)
+        raise
+
+    for entry in os.listdir(parent):
+        if entry.startswith(version_prefix) and entry not in (os.path.basename(version_dir), previous):
+            shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
@@ -0,0 +1,117 @@
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from dataset_store import DatasetStore
+
+
+def make_splits(seed, n_rows=1000):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({'Age': rng.integers(18, 90, n_rows).astype(np.int16),
+                      'Balance': rng.random(n_rows).astype(np.float32)},
+                     index=pd.RangeIndex(n_rows) * 2)
+    y = pd.Series(rng.integers(0, 2, n_rows), index=X.index, name='Exited')
+    return {'X_train': X, 'y_train': y}
+
+
+def versions(directory):
+    parent, name = os.path.split(os.path.abspath(directory))
+    return [entry for entry in os.listdir(parent) if entry.startswith(f'.{name}.v')]
+
+
+def assert_store_equals(store, splits):
+    pd.testing.assert_frame_equal(store.load('X_train', mmap=False), splits['X_train'])
+    pd.testing.assert_series_equal(store.load('y_train', mmap=False), splits['y_train'])
+
+
+def test_overwrite_replaces_store(tmp_path):
+    directory = tmp_path / 'dataset'
+    first, second = make_splits(0), make_splits(1, n_rows=500)
+
+    DatasetStore(directory).save(first, objects={'scaler': {'version': 1}})
+    DatasetStore(directory).save(second, objects={'scaler': {'version': 2}})
+
+    store = DatasetStore(directory)
+    assert_store_equals(store, second)
+    assert store.load_object('scaler') == {'version': 2}
+    assert os.path.islink(directory)
+    # Хранятся только текущая и предыдущая версии
+    assert len(versions(directory)) == 2
+
+
+def test_open_store_reads_new_version_after_overwrite(tmp_path):
+    directory = tmp_path / 'dataset'
+    first, second = make_splits(0), make_splits(1, n_rows=500)
+    DatasetStore(directory).save(first)
+
+    reader = DatasetStore(directory)
+    mapped = reader.load('X_train')
+    DatasetStore(directory).save(second)
+
+    # Отображённые в память данные прежней версии остаются доступны
+    pd.testing.assert_frame_equal(mapped.copy(), first['X_train'])
+    # Манифест перечитывается, файлы читаются из той же версии
+    assert_store_equals(reader, second)
+
+
+def test_overwrite_of_directory_without_versions(tmp_path):
+    directory = tmp_path / 'dataset'
+    first, second = make_splits(0), make_splits(1)
+    DatasetStore(directory).save(first)
+    # Хранилище, сохранённое обычным каталогом до перехода на версии
+    target = os.path.realpath(directory)
+    os.remove(directory)
+    os.rename(target, directory)
+
+    DatasetStore(directory).save(second)
+
+    assert os.path.islink(directory)
+    assert_store_equals(DatasetStore(directory), second)
+
+
+def test_failed_overwrite_keeps_previous_version(tmp_path):
+    directory = tmp_path / 'dataset'
+    first = make_splits(0)
+    DatasetStore(directory).save(first)
+    before = sorted(versions(directory))
+
+    with pytest.raises(Exception):
+        DatasetStore(directory).save(make_splits(1), objects={'bad': threading.Lock()})
+
+    assert sorted(versions(directory)) == before
+    assert_store_equals(DatasetStore(directory), first)
+
+
+def test_manifest_is_never_missing_during_overwrites(tmp_path):
+    directory = tmp_path / 'dataset'
+    DatasetStore(directory).save(make_splits(0, n_rows=10))
+    manifest_path = os.path.join(directory, DatasetStore.MANIFEST)
+
+    stop = threading.Event()
+    missing = []
+
+    def read_manifest():
+        while not stop.is_set():
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as file:
+                    json.load(file)
+            except FileNotFoundError:
+                missing.append(True)
+
+    reader = threading.Thread(target=read_manifest)
+    reader.start()
+    try:
+        for seed in range(1, 30):
+            DatasetStore(directory).save(make_splits(seed, n_rows=10))
+    finally:
+        stop.set()
+        reader.join()
+
+    assert not missing
@@ -0,0 +1,106 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from quantile_sketch import KLLSketch
+
+QUANTILES = np.linspace(0.01, 0.99, 99)
+
+
+def rank_error(sketch, data):
+    """
+    Максимальное отклонение запрошенных долей от диапазона рангов квантилей скетча
+    (у повторяющегося значения ранг - отрезок от первого до последнего вхождения)
+    """
+    data = np.sort(data)
+    values = sketch.quantile(QUANTILES)
+    low = np.searchsorted(data, values, side='left') / len(data)
+    high = np.searchsorted(data, values, side='right') / len(data)
+    return float(np.max(np.maximum(low - QUANTILES, QUANTILES - high).clip(min=0)))
+
+
+@pytest.fixture
+def data():
+    return np.random.default_rng(0).lognormal(mean=10, sigma=1, size=200_000)
+
+
+@pytest.mark.parametrize('k', [None, 10_000])
+def test_exact_quantiles_match_numpy(k):
+    values = np.random.default_rng(1).normal(size=5000)
+    sketch = KLLSketch(k).update(values)
+
+    assert sketch.exact
+    np.testing.assert_allclose(sketch.quantile(QUANTILES), np.quantile(values, QUANTILES))
+
+
+def test_compressed_quantiles_within_rank_error(data):
+    sketch = KLLSketch(k=500)
+    for chunk in np.array_split(data, 40):
+        sketch.update(chunk)
+
+    assert not sketch.exact
+    assert sketch.size < len(data) // 50
+    assert rank_error(sketch, data) < 0.01
+
+
+def test_nan_values_are_counted_separately():
+    sketch = KLLSketch(k=None).update([1.0, np.nan, 3.0, np.nan])
+
+    assert (sketch.n, sketch.n_nan) == (2, 2)
+    assert sketch.quantile(0.5) == np.quantile([1.0, 3.0], 0.5)
+
+
+def test_merge_matches_numpy_on_concatenated_data(data):
+    parts = np.array_split(data, 4)
+    sketches = [KLLSketch(k=500, random_state=i).update(part) for i, part in enumerate(parts)]
+    other_levels = [items.copy() for items in sketches[1].levels]
+
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+
+    assert merged.n == len(data)
+    assert rank_error(merged, data) < 0.01
+    # other не изменяется
+    assert all(np.array_equal(a, b) for a, b in zip(sketches[1].levels, other_levels))
+
+
+def test_merge_of_exact_sketches_is_exact():
+    rng = np.random.default_rng(2)
+    left, right = rng.normal(size=300), rng.normal(size=700)
+    merged = KLLSketch(k=None).update(left).merge(KLLSketch(k=None).update(right))
+
+    np.testing.assert_allclose(merged.quantile(QUANTILES), np.quantile(np.concatenate([left, right]), QUANTILES))
+
+
+@pytest.mark.parametrize('k', [None, 500])
+def test_update_weighted_matches_repeated_values(data, k):
+    value, weight = float(np.quantile(data, 0.3)), 123_457
+    expected = np.concatenate([data, np.full(weight, value)])
+
+    sketch = KLLSketch(k).update(data).update_weighted(value, weight)
+
+    assert sketch.n == len(expected)
+    if k is None:
+        np.testing.assert_allclose(sketch.quantile(QUANTILES), np.quantile(expected, QUANTILES))
+    else:
+        assert rank_error(sketch, expected) < 0.01
+
+
+def test_copy_is_independent_and_does_not_change_original(data):
+    original = KLLSketch(k=500).update(data[:100_000])
+    twin = KLLSketch(k=500).update(data[:100_000])
+
+    copied = original.copy()
+    copied.update(data[100_000:])
+    original.update(data[100_000:])
+    twin.update(data[100_000:])
+
+    # copy не сдвигает генератор исходного скетча: его сжатия совпадают со скетчем без копирования
+    assert all(np.array_equal(a, b) for a, b in zip(original.levels, twin.levels))
+    assert all(np.array_equal(a, b) for a, b in zip(copied.levels, original.levels))
+    assert copied.levels[0] is not original.levels[0]